@@ -0,0 +1 @@
+'''Offline benchmarks for the parser and formatting code of mensa_ukon.'''
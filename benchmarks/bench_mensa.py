@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+
+"""Offline benchmarks for parsing and formatting canteen plans.
+
+Run ``python -m benchmarks.bench_mensa`` to time all benchmarks and compare them against
+``benchmarks/baseline.json``; ``--save`` records a new baseline.
+"""
+import json
+import logging
+import os
+import sys
+import timeit
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import click
+import pendulum
+from requests_html import HTML
+
+from benchmarks import fixtures
+from mensa_ukon import parsers
+from mensa_ukon.constants import CANTEENS, FORMATTERS, Language
+from mensa_ukon.emojize import Emojize
+from mensa_ukon.mensa import Mensa, Plan
+
+BASELINE = os.path.join(fixtures.BENCH_DIR, 'baseline.json')
+# a benchmark regresses when it is slower than its baseline by this factor
+THRESHOLD = 1.5
+
+# name -> function returning the callable to time (all setup happens in the outer function)
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _parsed_days(html=None):
+    return Mensa('giessberg')._retrieve_plan(html=html or fixtures.reference_page())
+
+
+def _plans(days):
+    return [Plan(CANTEENS['giessberg'], day) for day in days]
+
+
+@benchmark('tabs')
+def _bench_tabs():
+    html = fixtures.reference_page()
+    return lambda: list(Mensa._tabs(html))
+
+
+@benchmark('tabs[large]')
+def _bench_tabs_large():
+    html = fixtures.large_page()
+    return lambda: list(Mensa._tabs(html))
+
+
+def _bench_retrieve_plan(canteen, language):
+    def setup():
+        m = Mensa(canteen)
+        html = fixtures.page(canteen, language)
+        return lambda: m._retrieve_plan(html=html, language=language)
+    return setup
+
+
+for _canteen, _language, _ in fixtures.pages():
+    benchmark(f'retrieve_plan[{_canteen}-{_language.name}]')(_bench_retrieve_plan(_canteen, _language))
+
+
+@benchmark('retrieve_plan[large]')
+def _bench_retrieve_plan_large():
+    m = Mensa('giessberg')
+    html = fixtures.large_page()
+    return lambda: m._retrieve_plan(html=html)
+
+
+def _bench_parser(parser):
+    def setup():
+        m = Mensa('giessberg', parser=parser)
+        html = fixtures.reference_page()
+        return lambda: m._retrieve_plan(html=html)
+    return setup
+
+
+for _parser in parsers.available():
+    benchmark(f'retrieve_plan[parser={_parser}]')(_bench_parser(_parser))
+
+
+@benchmark('retrieve[warm]')
+def _bench_retrieve_warm():
+    # repeated lookups of an unchanged page, e.g. served from the HTTP cache
+    m = Mensa('giessberg')
+    html = HTML(html=fixtures.reference_page())
+    m.do_request = lambda language: html
+    date = pendulum.date(2018, 8, 24)
+    m.retrieve(date)
+    return lambda: m.retrieve(date)
+
+
+@benchmark('retrieve[fragment]')
+def _bench_retrieve_fragment():
+    # a cold single-day lookup only has to parse the fragment of that day
+    m = Mensa('giessberg', source='fragment')
+    fragment = fixtures.day_fragments(fixtures.reference_page())['24.08.']
+    m.source.request = lambda day, language: fragment
+    date = pendulum.date(2018, 8, 24)
+    return lambda: m.retrieve(date)
+
+
+@benchmark('clean_text')
+def _bench_clean_text():
+    html = fixtures.reference_page()
+    parser = parsers.get()
+    titles = [Mensa._meal_title(meal) for tab in Mensa._tabs(html) for meal in parser.meals(tab)]
+    return lambda: [Mensa._clean_text(t) for t in titles]
+
+
+@benchmark('replace_type')
+def _bench_replace_type():
+    html = fixtures.reference_page()
+    parser = parsers.get()
+    classes = [c for tab in Mensa._tabs(html) for meal in parser.meals(tab)
+               for c in parser.meal_icon_classes(meal) if c != 'speiseplanTagKatIcon']
+    # also exercise the miss path, which has to look at every token
+    classes += ['unknown'] * len(classes)
+    return lambda: [Emojize.replace_type(c) for c in classes]
+
+
+def _bench_day_index(language):
+    def setup():
+        date_labels = Mensa._date_labels(fixtures.page(language=language))
+        last = pendulum.date(2018, 8, 24)
+        missing = pendulum.date(2018, 8, 25)
+        return lambda: (Mensa._get_requested_day_index(date_labels, last, language),
+                        Mensa._get_requested_day_index(date_labels, missing, language))
+    return setup
+
+
+for _language in Language:
+    benchmark(f'get_requested_day_index[{_language.name}]')(_bench_day_index(_language))
+
+
+def _bench_formatter(key):
+    def setup():
+        plans = _plans(_parsed_days())
+        formatter = FORMATTERS[key]
+        return lambda: [formatter(plan) for plan in plans]
+    return setup
+
+
+for _key in FORMATTERS:
+    benchmark(f'formatter[{_key}]')(_bench_formatter(_key))
+
+
+@benchmark('msg_text_for_meals')
+def _bench_msg_text_for_meals():
+    from mensa_ukon.mensabot import MensaBot
+    bot = SimpleNamespace(logger=logging.getLogger(__name__))
+    plans = _plans(_parsed_days())
+    date = pendulum.date(2018, 8, 13)
+    return lambda: [MensaBot._msg_text_for_meals(bot, date, plan) for plan in plans]
+
+
+def run(names=None, repeat=5, number=None):
+    """Times the benchmarks and returns the best time per call in seconds, by benchmark name."""
+    results = OrderedDict()
+    for name, setup in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        timer = timeit.Timer(setup())
+        n = number or max(1, timer.autorange()[0])
+        results[name] = min(timer.repeat(repeat=repeat, number=n)) / n
+    return results
+
+
+def load_baseline(path=BASELINE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except IOError:
+        return {}
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Yields ``(name, baseline, result, ratio, regressed)`` for every timed benchmark."""
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = result / base if base else None
+        yield name, base, result, ratio, ratio is not None and ratio > threshold
+
+
+def _ms(seconds):
+    return '-' if seconds is None else '{:.3f}'.format(seconds * 1000)
+
+
+@click.command()
+@click.option('-k', '--filter', 'names', multiple=True, help='only run benchmarks containing this string')
+@click.option('-r', '--repeat', default=5, help='number of timing rounds per benchmark')
+@click.option('-t', '--threshold', default=THRESHOLD, help='slowdown factor that counts as a regression')
+@click.option('--save', is_flag=True, help='store the results as new baseline')
+def main(names, repeat, threshold, save):
+    """Times the parser benchmarks and compares them against the stored baseline."""
+    results = run(names, repeat=repeat)
+    baseline = load_baseline()
+    regressions = 0
+    click.echo('{:<40} {:>12} {:>12} {:>7}'.format('benchmark', 'baseline ms', 'current ms', 'ratio'))
+    for name, base, result, ratio, regressed in compare(results, baseline, threshold):
+        regressions += regressed
+        click.echo('{:<40} {:>12} {:>12} {:>7}{}'.format(name, _ms(base), _ms(result),
+                                                         '-' if ratio is None else '{:.2f}'.format(ratio),
+                                                         '  REGRESSION' if regressed else ''))
+    if save:
+        baseline.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+    sys.exit(1 if regressions and not save else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+
+"""Minimal stand-in for a Redis server, speaking the Redis protocol (RESP).
+
+Implements the commands ``RedisCache`` uses (PING, SELECT, GET, MGET, SET with EX/PX/NX, DEL, FLUSHDB).
+Point the library at it with ``MENSA_CACHE=redis://127.0.0.1:<port>/0``.
+"""
+import socketserver
+import threading
+import time
+
+import click
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # inline command, e.g. from telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _encode(value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(RedisHandler._encode(v) for v in value)
+        if isinstance(value, Exception):
+            return b'-ERR %s\r\n' % str(value).encode('utf-8')
+        if isinstance(value, str):
+            return b'+%s\r\n' % value.encode('utf-8')
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if not args:
+                return
+            name = args[0].decode('utf-8').upper()
+            method = getattr(self.server, 'cmd_' + name.lower(), None)
+            self.server.commands += 1
+            try:
+                reply = Exception(f"unknown command '{name}'") if method is None else method(*args[1:])
+            except (TypeError, ValueError) as e:
+                reply = Exception(f"wrong arguments for '{name}': {e}")
+            self.wfile.write(self._encode(reply))
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super(FakeRedis, self).__init__(address, RedisHandler)
+        # key -> (expires or None, value); all databases share the keys
+        self.data = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+            del self.data[key]
+            return None
+        return None if entry is None else entry[1]
+
+    def cmd_ping(self):
+        return 'PONG'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def cmd_mget(self, *keys):
+        with self._lock:
+            return [self._get(k) for k in keys]
+
+    def cmd_set(self, key, value, *options):
+        options = [o.upper() for o in options]
+        expires, nx = None, b'NX' in options
+        for unit, factor in ((b'EX', 1.0), (b'PX', 0.001)):
+            if unit in options:
+                expires = time.monotonic() + int(options[options.index(unit) + 1]) * factor
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self.data[key] = (expires, value)
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        with self._lock:
+            return sum(1 for k in keys if self._get(k) is not None and self.data.pop(k))
+
+    def cmd_flushdb(self):
+        with self._lock:
+            self.data.clear()
+        return 'OK'
+
+    def start(self):
+        """Serves requests on a daemon thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+@click.command()
+@click.option('-p', '--port', default=6379, help='port to listen on')
+def main(port):
+    """Serves a minimal in-memory Redis stand-in."""
+    server = FakeRedis(('127.0.0.1', port))
+    click.echo(f'Serving Redis protocol on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
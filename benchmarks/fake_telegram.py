@@ -0,0 +1,148 @@
+#! /usr/bin/env python
+
+"""Minimal stand-in for the Telegram Bot API.
+
+Only the methods ``MensaBot`` needs are implemented. Updates are queued with ``push`` and handed out by
+``getUpdates``; every message the bot sends is recorded with its arrival time, so that reply latencies can
+be measured. Point the bot at it with ``PTB_BASE_URL=http://127.0.0.1:<port>/bot``.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Mensa', 'username': 'mensa_test_bot'}
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length else b''
+        if not body:
+            return {}
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body)
+        return dict(parse_qsl(body.decode('utf-8')))
+
+    def _reply(self, result, ok=True):
+        body = json.dumps({'ok': ok, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # /bot<token>/<method>
+        method = self.path.rstrip('/').rsplit('/', 1)[-1]
+        params = self._params()
+        handler = getattr(self.server, 'api_' + method.lower(), None)
+        self._reply(True if handler is None else handler(params))
+
+    do_GET = do_POST
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    daemon_threads = True
+    # the asyncio bot opens many connections at once
+    request_queue_size = 128
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super(FakeTelegram, self).__init__(address, TelegramHandler)
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._cond = threading.Condition()
+        # chat id -> [(arrival time, text)]
+        self.sent = defaultdict(list)
+        self.chat_actions = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/bot'
+
+    def start(self):
+        """Serves requests on a daemon thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    @staticmethod
+    def command_update(update_id, chat_id, text):
+        command = text.split(' ', 1)[0]
+        return {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Load'},
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}],
+            },
+        }
+
+    def make_update(self, chat_id, text):
+        return self.command_update(next(self._update_ids), chat_id, text)
+
+    def push(self, update):
+        with self._cond:
+            self._updates.append(update)
+            self._cond.notify_all()
+
+    def wait_for_replies(self, chat_ids, timeout):
+        """Waits until every chat got a reply; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not all(self.sent.get(c) for c in chat_ids):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    # Bot API methods
+
+    def api_getme(self, params):
+        return BOT_USER
+
+    def api_getupdates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._updates = [u for u in self._updates if u['update_id'] >= offset]
+                if self._updates or time.monotonic() >= deadline:
+                    return self._updates[:limit]
+                self._cond.wait(deadline - time.monotonic())
+
+    def api_sendchataction(self, params):
+        self.chat_actions += 1
+        return True
+
+    def api_sendmessage(self, params):
+        now = time.monotonic()
+        chat_id = int(params['chat_id'])
+        with self._cond:
+            self.sent[chat_id].append((now, params.get('text')))
+            self._cond.notify_all()
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', ''),
+        }
+
+    def api_getwebhookinfo(self, params):
+        return {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+
+"""Menu pages the benchmarks run on.
+
+Pages recorded with ``python -m benchmarks.fixtures --record`` are stored in ``benchmarks/pages`` as
+``<canteen>_<language>.html``. As long as a canteen/language pair has not been recorded, its page is
+derived from the recorded giessberg page in ``tests/`` (with the date tabs relabeled for English).
+"""
+import functools
+import os
+import re
+from datetime import date, timedelta
+
+import click
+
+from mensa_ukon.constants import CANTEENS, Language
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGES_DIR = os.path.join(BENCH_DIR, 'pages')
+TESTS_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'tests')
+REFERENCE_PAGE = os.path.join(TESTS_DIR, 'giessberg.html')
+# the first day of the reference page; it has tabs for monday to friday of this and the next week
+MONDAY = date(2018, 8, 13)
+
+# date tabs look like ' Mo. 13.08.' on the german and ' Mon 13.08.' on the english page
+_TAB_LABEL = re.compile(r'<span> (\w+)\. (\d{2}\.\d{2}\.)</span>')
+_ANY_TAB_LABEL = re.compile(r'<span> (\w+)\.? (\d{2})\.(\d{2})\.</span>')
+_WEEKDAYS_DE = ['Mo.', 'Di.', 'Mi.', 'Do.', 'Fr.', 'Sa.', 'So.']
+_WEEKDAYS_EN = {'Mo': 'Mon', 'Di': 'Tue', 'Mi': 'Wed', 'Do': 'Thu', 'Fr': 'Fri', 'Sa': 'Sat', 'So': 'Sun'}
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def reference_page():
+    return _read(REFERENCE_PAGE)
+
+
+@functools.lru_cache()
+def reference_plans():
+    """The (german) plans of the reference page by date, parsed with the default parser backend."""
+    from requests_html import HTML
+    from mensa_ukon import Mensa
+    from mensa_ukon.constants import Plan
+
+    m = Mensa('giessberg')
+    _, days = m._parse_page(HTML(html=reference_page()), Language.DE)
+    dates = [MONDAY + timedelta(days=week + day) for week in (0, 7) for day in range(5)]
+    return {d: Plan(m.location, meals, d) for d, meals in zip(dates, days)}
+
+
+def page_path(canteen, language):
+    return os.path.join(PAGES_DIR, f'{canteen}_{language.name.lower()}.html')
+
+
+def _derive(html, language):
+    if language == Language.EN:
+        return _TAB_LABEL.sub(lambda m: f'<span> {_WEEKDAYS_EN[m.group(1)]} {m.group(2)}</span>', html)
+    return html
+
+
+def shift_dates(html, language, monday=None):
+    """Relabels the date tabs so that the plan starts on ``monday`` (default: this week's monday).
+
+    The weekdays of the tabs are kept, only the weeks are moved.
+    """
+    if monday is None:
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+    labels = _ANY_TAB_LABEL.findall(html)
+    if not labels:
+        return html
+    # the recorded year is unknown, so only the distance to the first tab (and its weekday) is used
+    weekdays = {w: i for i, (de, en) in enumerate(_WEEKDAYS_EN.items()) for w in (de, en)}
+    first_weekday = weekdays[labels[0][0]]
+    first = date(2001, int(labels[0][2]), int(labels[0][1]))
+    start = monday + timedelta(days=first_weekday)
+
+    def relabel(match):
+        day = date(2001, int(match.group(3)), int(match.group(2)))
+        if day < first:
+            day = day.replace(year=2002)
+        day = start + (day - first)
+        weekday = _WEEKDAYS_DE[day.weekday()]
+        if language == Language.EN:
+            weekday = _WEEKDAYS_EN[weekday[:2]]
+        return '<span> {} {:%d.%m.}</span>'.format(weekday, day)
+
+    return _ANY_TAB_LABEL.sub(relabel, html)
+
+
+def page(canteen='giessberg', language=Language.DE):
+    """Returns the recorded page for the canteen and language, or one derived from the reference page."""
+    path = page_path(canteen, language)
+    if os.path.exists(path):
+        return _read(path)
+    return _derive(reference_page(), language)
+
+
+def pages():
+    """Yields ``(canteen, language, html)`` for every canteen and language."""
+    for canteen in CANTEENS:
+        for language in Language:
+            yield canteen, language, page(canteen, language)
+
+
+def _split(html):
+    """Splits a page into the part before the tabs, the tab links, the tab contents and the part after them."""
+    tabs_start = html.index('<div class="tabs">')
+    first_content = html.index('<div class="contents')
+    legend = html.index('<div class="tabIcon')
+    legend_start = html.rindex('<div', first_content, legend)
+    tab_links = re.findall(r'<a href="".*?</a>', html[tabs_start:first_content])
+    contents = re.split(r'(?=<div class="contents)', html[first_content:legend_start])
+    contents = [c for c in contents if c.strip()]
+    return html[:tabs_start], tab_links, contents, html[legend_start:]
+
+
+def day_fragments(html):
+    """Maps the ``DD.MM.`` of each date tab of the page to the markup of its meals (as the AJAX endpoint sends it)."""
+    _, _, contents, _ = _split(html)
+    return {f'{day}.{month}.': c for (_, day, month), c in zip(_ANY_TAB_LABEL.findall(html), contents)}
+
+
+def large_page(factor=10):
+    """Builds a synthetic page with ``factor`` times the tabs (and meals) of the reference page."""
+    header, tab_links, contents, footer = _split(reference_page())
+
+    links, bodies = [], []
+    for n in range(len(contents) * factor):
+        link = tab_links[n % len(tab_links)]
+        links.append(re.sub(r'rel="\d+"', f'rel="{n + 1}"', link))
+        body = contents[n % len(contents)]
+        bodies.append(re.sub(r'id="tab\d+"', f'id="tab{n + 1}"', body))
+    return (header + '<div class="tabs">\n' + '\n'.join(links) + '\n  </div>\n'
+            + ''.join(bodies) + footer)
+
+
+@click.command()
+@click.option('--record', is_flag=True, help='download the live pages of all canteens and languages')
+def main(record):
+    """Lists (and optionally records) the pages used by the benchmarks."""
+    if record:
+        from mensa_ukon import Mensa
+        os.makedirs(PAGES_DIR, exist_ok=True)
+        for canteen in CANTEENS:
+            m = Mensa(canteen)
+            for language in Language:
+                html = m.do_request(language).html
+                with open(page_path(canteen, language), 'w', encoding='utf-8') as f:
+                    f.write(html)
+    for canteen in CANTEENS:
+        for language in Language:
+            path = page_path(canteen, language)
+            click.echo('{:<12} {}  {}'.format(canteen, language.name,
+                                              path if os.path.exists(path) else 'derived from ' + REFERENCE_PAGE))
+
+
+if __name__ == '__main__':
+    main()
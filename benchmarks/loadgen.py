@@ -0,0 +1,156 @@
+#! /usr/bin/env python
+
+"""Load generator for ``MensaBot``, running entirely offline.
+
+Starts the seezeit stand-in and the fake Telegram Bot API, points a ``MensaBot`` (or, with ``--asyncio``, an
+``AsyncMensaBot``) at both and sends ``N`` concurrent ``/mensa``, ``/teller`` and ``/mensaEN`` updates, either
+through polling or the webhook. Reports reply latency percentiles and throughput.
+"""
+import json
+import asyncio
+import math
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.seezeit_server import ETAG_MODES, SeezeitServer
+from mensa_ukon import settings
+
+COMMANDS = ('/mensa', '/teller', '/mensaEN')
+TOKEN = '123456:LOAD-TEST-TOKEN'
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of the (unsorted) values."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _make_bot(seezeit, telegram, workers, use_asyncio=False):
+    """Creates a bot talking to the stand-ins; returns it with the settings it replaced."""
+    overrides = {'TOKEN': TOKEN, 'BASE_URL': telegram.base_url, 'SEEZEIT_URL': seezeit.url, 'WORKERS': workers,
+                 'PREFERENCES': ':memory:'}
+    previous = {k: getattr(settings, k) for k in overrides}
+    for k, v in overrides.items():
+        setattr(settings, k, v)
+    if use_asyncio:
+        from mensa_ukon.aiobot import AsyncMensaBot
+        return AsyncMensaBot(), previous
+    from mensa_ukon.mensabot import MensaBot
+    return MensaBot(), previous
+
+
+def _start_async(bot, webhook_port=None):
+    """Runs the event loop of an ``AsyncMensaBot`` on a thread; returns the thread once updates are received."""
+    receive = bot.run_polling(timeout=1) if webhook_port is None else bot.run_webhook('127.0.0.1', webhook_port, TOKEN)
+    thread = threading.Thread(target=asyncio.run, args=(receive,), daemon=True)
+    thread.start()
+    if not bot.running.wait(10):
+        raise RuntimeError('Bot did not start')
+    return thread
+
+
+def _post(url, update):
+    req = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    urllib.request.urlopen(req).close()
+
+
+def run(requests=100, workers=settings.WORKERS, webhook=False, latency=0.0, jitter=0.0, error_rate=0.0,
+        etag='strong', commands=COMMANDS, timeout=60.0, use_asyncio=False):
+    """Runs one load test and returns a dict with the measured statistics."""
+    seezeit = SeezeitServer(latency=latency, jitter=jitter, error_rate=error_rate, etag=etag).start()
+    telegram = FakeTelegram().start()
+    bot, previous = _make_bot(seezeit, telegram, workers, use_asyncio)
+
+    port = _free_port() if webhook else None
+    webhook_url = f'http://127.0.0.1:{port}/{TOKEN}'
+    if use_asyncio:
+        thread = _start_async(bot, port)
+    elif webhook:
+        bot.updater.start_webhook(listen='127.0.0.1', port=port, url_path=TOKEN)
+    else:
+        bot.updater.start_polling(poll_interval=0.0, timeout=1)
+
+    # one chat per update, so that every reply can be matched to its request
+    chat_ids = list(range(1, requests + 1))
+    updates = [telegram.make_update(c, commands[i % len(commands)]) for i, c in enumerate(chat_ids)]
+    sent = {}
+    try:
+        if webhook:
+            with ThreadPoolExecutor(max_workers=min(32, requests)) as pool:
+                for u in updates:
+                    sent[u['message']['chat']['id']] = time.monotonic()
+                    pool.submit(_post, webhook_url, u)
+        else:
+            for u in updates:
+                sent[u['message']['chat']['id']] = time.monotonic()
+                telegram.push(u)
+        completed = telegram.wait_for_replies(chat_ids, timeout)
+    finally:
+        if use_asyncio:
+            bot.stop()
+            thread.join()
+        else:
+            bot.updater.stop()
+        seezeit.shutdown()
+        telegram.shutdown()
+        for k, v in previous.items():
+            setattr(settings, k, v)
+
+    latencies = [telegram.sent[c][0][0] - sent[c] for c in chat_ids if telegram.sent.get(c)]
+    if not latencies:
+        return {'requests': requests, 'replies': 0, 'completed': False}
+    duration = max(telegram.sent[c][0][0] for c in chat_ids if telegram.sent.get(c)) - min(sent.values())
+    return {
+        'requests': requests,
+        'replies': len(latencies),
+        'completed': completed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+        'throughput': len(latencies) / duration if duration > 0 else float('inf'),
+        'upstream_requests': seezeit.requests,
+        'upstream_errors': seezeit.errors,
+        'upstream_not_modified': seezeit.not_modified,
+    }
+
+
+@click.command()
+@click.option('-n', '--requests', default=100, help='number of concurrent updates')
+@click.option('-w', '--workers', default=settings.WORKERS, help='bot worker threads')
+@click.option('--webhook', is_flag=True, help='deliver updates through the webhook instead of polling')
+@click.option('--latency', default=0.0, help='upstream response latency in seconds')
+@click.option('--jitter', default=0.0, help='maximal random deviation from the upstream latency')
+@click.option('--error-rate', default=0.0, help='fraction of upstream requests answered with 503')
+@click.option('--etag', type=click.Choice(ETAG_MODES), default='strong', help='upstream ETag behaviour')
+@click.option('-c', '--command', 'commands', multiple=True, default=COMMANDS, help='commands to send (round robin)')
+@click.option('--timeout', default=60.0, help='seconds to wait for all replies')
+@click.option('--asyncio', 'use_asyncio', is_flag=True, help='run the asyncio bot (AsyncMensaBot)')
+def main(requests, workers, webhook, latency, jitter, error_rate, etag, commands, timeout, use_asyncio):
+    """Measures reply latency and throughput of the bot under load."""
+    stats = run(requests, workers, webhook, latency, jitter, error_rate, etag, commands, timeout, use_asyncio)
+    click.echo('mode:        {}{}'.format('webhook' if webhook else 'polling', ', asyncio' if use_asyncio else ''))
+    click.echo('replies:     {replies}/{requests}'.format(**stats))
+    if stats['replies']:
+        click.echo('p50:         {:.1f} ms'.format(stats['p50'] * 1000))
+        click.echo('p99:         {:.1f} ms'.format(stats['p99'] * 1000))
+        click.echo('max:         {:.1f} ms'.format(stats['max'] * 1000))
+        click.echo('throughput:  {:.1f} replies/s'.format(stats['throughput']))
+        click.echo('upstream:    {upstream_requests} requests, {upstream_errors} errors, '
+                   '{upstream_not_modified} not modified'.format(**stats))
+
+
+if __name__ == '__main__':
+    main()
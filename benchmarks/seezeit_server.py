@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+
+"""Local stand-in for seezeit.com that replays the benchmark pages.
+
+Point the library at it with ``MENSA_SEEZEIT_URL=http://127.0.0.1:<port>``. It also answers the per-day
+AJAX endpoint of max-manager.de with the tabs of the pages (``MENSA_MAX_MANAGER_URL``, same url).
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import click
+
+from benchmarks import fixtures
+from mensa_ukon.constants import CANTEENS, Language
+from mensa_ukon.sources import FRAGMENT_PATH
+
+ETAG_MODES = ('none', 'strong', 'weak', 'changing')
+
+_DE_PATH = re.compile(r'^/essen/speiseplaene/([\w-]+)/?$')
+_EN_PATH = re.compile(r'^/en/food/menus/([\w-]+)-canteen/?$')
+
+
+def _pages():
+    """Maps request paths of both languages to ``(canteen, language)``."""
+    paths = {}
+    for canteen, location in CANTEENS.items():
+        paths[location.key] = (canteen, Language.DE)
+        paths[location.key.replace('mensa-', '')] = (canteen, Language.EN)
+    return paths
+
+
+def _locs():
+    """Maps the ``loc`` parameter of the AJAX endpoint to the canteen."""
+    return {location.key.replace('-', '_'): canteen for canteen, location in CANTEENS.items()}
+
+
+class SeezeitHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _page_for_path(self):
+        path = self.path.split('?', 1)[0]
+        for pattern in (_DE_PATH, _EN_PATH):
+            match = pattern.match(path)
+            if match and match.group(1) in self.server.paths:
+                return self.server.page(*self.server.paths[match.group(1)])
+        return None
+
+    def _send(self, code, body=b'', headers=None):
+        if self.command != 'HEAD':
+            self.server.bytes_sent += len(body)
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        server.delay()
+        if random.random() < server.error_rate:
+            server.errors += 1
+            return self._send(503, b'Service Unavailable', {'Content-Type': 'text/plain'})
+
+        body = self._page_for_path()
+        if body is None:
+            return self._send(404, b'Not Found', {'Content-Type': 'text/plain'})
+
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        etag = server.etag(body)
+        if etag:
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                server.not_modified += 1
+                return self._send(304, headers={'ETag': etag})
+        self._send(200, body, headers)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        server = self.server
+        params = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        server.requests += 1
+        server.delay()
+        if random.random() < server.error_rate:
+            server.errors += 1
+            return self._send(503, b'Service Unavailable', {'Content-Type': 'text/plain'})
+
+        try:
+            canteen = server.locs[params['loc'][0]]
+            language = Language[params['lang'][0].upper()]
+            year, month, day = params['date'][0].split('-')
+        except (KeyError, ValueError):
+            return self._send(404, b'Not Found', {'Content-Type': 'text/plain'})
+        if self.path.split('?', 1)[0] != FRAGMENT_PATH or params.get('func') != ['make_spl']:
+            return self._send(404, b'Not Found', {'Content-Type': 'text/plain'})
+        # closed days are answered with an empty fragment
+        body = server.fragments(canteen, language).get(f'{day}.{month}.', b'')
+        self._send(200, body, {'Content-Type': 'text/html; charset=utf-8'})
+
+
+class SeezeitServer(ThreadingHTTPServer):
+    """Replays the benchmark pages with configurable latency, error rate and ETag behaviour.
+
+    ``etag`` is one of ``ETAG_MODES``: no ETag, a strong or weak ETag of the page content, or an ETag that
+    changes on every request (as if the menu was edited all the time). With ``shift_dates`` the plans are
+    relabeled to start this week, so that lookups for today find a plan.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0, etag='strong',
+                 shift_dates=True):
+        super(SeezeitServer, self).__init__(address, SeezeitHandler)
+        if etag not in ETAG_MODES:
+            raise ValueError(f'Unknown ETag mode: {etag}')
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etag_mode = etag
+        self.shift_dates = shift_dates
+        self.paths = _pages()
+        self.locs = _locs()
+        self._cache = {}
+        self._fragments = {}
+        self.requests = self.errors = self.not_modified = self.bytes_sent = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def page(self, canteen, language):
+        key = (canteen, language)
+        if key not in self._cache:
+            html = fixtures.page(canteen, language)
+            if self.shift_dates:
+                html = fixtures.shift_dates(html, language)
+            self._cache[key] = html.encode('utf-8')
+        return self._cache[key]
+
+    def fragments(self, canteen, language):
+        key = (canteen, language)
+        if key not in self._fragments:
+            html = self.page(canteen, language).decode('utf-8')
+            self._fragments[key] = {d: f.encode('utf-8') for d, f in fixtures.day_fragments(html).items()}
+        return self._fragments[key]
+
+    def delay(self):
+        latency = self.latency + random.uniform(-self.jitter, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+    def etag(self, body):
+        if self.etag_mode == 'none':
+            return None
+        if self.etag_mode == 'changing':
+            return '"{}"'.format(self.requests)
+        digest = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        return 'W/' + digest if self.etag_mode == 'weak' else digest
+
+    def start(self):
+        """Serves requests on a daemon thread and returns the server."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+@click.command()
+@click.option('-p', '--port', default=8080, help='port to listen on')
+@click.option('--latency', default=0.0, help='response latency in seconds')
+@click.option('--jitter', default=0.0, help='maximal random deviation from the latency in seconds')
+@click.option('--error-rate', default=0.0, help='fraction of requests answered with 503')
+@click.option('--etag', type=click.Choice(ETAG_MODES), default='strong', help='ETag behaviour')
+@click.option('--recorded-dates', is_flag=True, help='keep the dates of the recorded pages')
+def main(port, latency, jitter, error_rate, etag, recorded_dates):
+    """Serves the recorded menu pages like seezeit.com."""
+    server = SeezeitServer(('127.0.0.1', port), latency, jitter, error_rate, etag, not recorded_dates)
+    click.echo(f'Serving seezeit pages on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -5,14 +5,21 @@ import logging
 from enum import Enum, unique
 
 from logging import DEBUG, INFO, WARN, ERROR, NullHandler
-from logging.config import dictConfig
 
 
-from .mensa import Mensa
 from .version import __version__  # flake8: noqa
 
 logging.getLogger(__name__).addHandler(NullHandler())
 
+
+def __getattr__(name):
+    # Mensa pulls in requests_html, bs4, cachecontrol and pendulum,
+    # so it is only imported once it is actually used (keeps `mensa --help` fast)
+    if name == 'Mensa':
+        from .mensa import Mensa
+        return Mensa
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 __all__ = [
     'Mensa', 'MensaBot'
 ]
@@ -61,6 +68,16 @@ logging_config = dict(
             'level': 'WARN',
             'propagate': False
         },
+        'mensa_ukon.daemon': {
+            'handlers': ['h'],
+            'level': 'WARN',
+            'propagate': False
+        },
+        'mensa_ukon.api': {
+            'handlers': ['h'],
+            'level': 'WARN',
+            'propagate': False
+        },
         'scripts.mensa_cli': {
             'handlers': ['h'],
             'level': 'WARN',
@@ -71,6 +88,11 @@ logging_config = dict(
             'level': 'WARN',
             'propagate': False
         },
+        'scripts.api': {
+            'handlers': ['h'],
+            'level': 'WARN',
+            'propagate': False
+        },
         'telegram': {
             'handlers': ['h'],
             'level': 'WARN',
@@ -96,12 +118,17 @@ logging_config = dict(
 
 
 def setup_logging(verbosity):
+    # logging.config pulls in logging.handlers, socket and pickle
+    from logging.config import dictConfig
     level = Verbosity.getLoglevelForCount(verbosity)
     name =  logging.getLevelName(level)
     logging_config['loggers']['scripts.mensa_cli']['level'] = name
     logging_config['loggers']['scripts.bot']['level'] = name
+    logging_config['loggers']['scripts.api']['level'] = name
     logging_config['loggers']['mensa_ukon.mensa']['level'] = name
     logging_config['loggers']['mensa_ukon.mensabot']['level'] = name
+    logging_config['loggers']['mensa_ukon.daemon']['level'] = name
+    logging_config['loggers']['mensa_ukon.api']['level'] = name
     dictConfig(logging_config)
     logging.getLogger(__name__).debug('Verbosity has set the logging level to %s', name)
 
@@ -0,0 +1,70 @@
+#! /usr/bin/env python
+
+"""Admission of the bot's commands: duplicate suppression and load shedding.
+
+- The same command with the same arguments from the same chat within ``window`` seconds is answered once: double taps
+  and a shortcut fired by several members of a group chat cause a single reply.
+- While more than ``max_backlog`` admitted commands are waiting or running, low-priority commands (e.g. ``/help``)
+  are shed, so that the workers are left to the plan lookups.
+
+Both bots ask ``admit`` before a command is handed to a worker and call ``done`` when it was handled.
+"""
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DUPLICATE = 'duplicate'
+SHED = 'shed'
+
+
+class Admission(object):
+
+    def __init__(self, window, max_backlog, low_priority=()):
+        self.window = window
+        self.max_backlog = max_backlog
+        self.low_priority = frozenset(c.lower() for c in low_priority)
+        # admitted commands that are not done yet
+        self.backlog = 0
+        # reason -> number of commands that were not admitted
+        self.rejected = Counter()
+        # (chat id, command, args) -> time it was admitted, oldest first
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def admit(self, chat_id, command, args=()):
+        """Returns ``None`` if the command is to be handled, otherwise why not (``DUPLICATE`` or ``SHED``).
+
+        Every admitted command must be followed by a call of ``done``.
+        """
+        command = command.lower()
+        key = (chat_id, command, tuple(args))
+        now = time.monotonic()
+        with self._lock:
+            while self._recent:
+                oldest, admitted = next(iter(self._recent.items()))
+                if admitted > now - self.window:
+                    break
+                del self._recent[oldest]
+            if key in self._recent:
+                reason = DUPLICATE
+            elif command in self.low_priority and self.backlog >= self.max_backlog:
+                reason = SHED
+            else:
+                self._recent[key] = now
+                self.backlog += 1
+                return None
+            self.rejected[reason] += 1
+        logger.debug(f'Not handling /{command} of chat {chat_id}: {reason}')
+        return reason
+
+    def done(self):
+        with self._lock:
+            self.backlog -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'backlog': self.backlog, DUPLICATE: self.rejected[DUPLICATE], SHED: self.rejected[SHED]}
@@ -0,0 +1,375 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Asyncio variant of ``MensaBot``, enabled with ``PTB_ASYNCIO=True``.
+
+Updates are handled by coroutines on a single event loop, and all requests to the Telegram Bot API are sent
+with tornado's non-blocking HTTP client (tornado is a dependency of python-telegram-bot). Only the retrieval of
+plans still blocks; it runs on ``settings.WORKERS`` threads, and identical lookups in flight share one retrieval.
+Preferences that are not cached are read on a thread of their own, so that neither the event loop nor they wait.
+Up to ``settings.MAX_UPDATES`` updates are processed at a time, further ones wait until a slot is free.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pendulum
+import telegram
+from telegram import ChatAction
+from telegram.error import (Conflict, NetworkError, TelegramError, TimedOut,
+                            Unauthorized)
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.simple_httpclient import HTTPTimeoutError
+from tornado.web import Application, RequestHandler
+
+from mensa_ukon import settings
+from mensa_ukon.constants import Language
+from mensa_ukon.mensabot import ArgumentError, MensaReplies, NoMealError
+from mensa_ukon.upstream import UpstreamError
+
+DEFAULT_BASE_URL = 'https://api.telegram.org/bot'
+# concurrent requests to the Bot API, further ones are queued by the HTTP client
+API_CONNECTIONS = 64
+
+
+class _WebhookHandler(RequestHandler):
+
+    def initialize(self, bot):
+        self.bot = bot
+
+    async def post(self, *args):
+        # waits for a free slot, so that Telegram holds back further updates while the bot is busy
+        await self.bot._dispatch(json.loads(self.request.body))
+
+
+class AsyncMensaBot(MensaReplies):
+
+    def __init__(self, workers=None, max_updates=None):
+        self.token = self._token()
+        self.base_url = (settings.BASE_URL or DEFAULT_BASE_URL) + self.token
+        self.workers = settings.WORKERS if workers is None else workers
+        self.max_updates = settings.MAX_UPDATES if max_updates is None else max_updates
+        self._setup()
+        # the requests to Telegram do not block a thread, so profiles cover what is run on the worker threads
+        self._reply_text = self._profiled(self._reply_text, 'reply_text')
+
+        # command -> coroutine function(message, args)
+        self.handlers = {}
+        self.username = None
+        # set while the bot receives updates
+        self.running = threading.Event()
+        self._loop = None
+        self._stopping = None
+
+        self._add_bot_command('start', self._start, 'start bot')
+        self._add_bot_command('help', self._bot_help, 'display help message')
+        if self._news_content is not None:
+            self._add_bot_command('news', self._news, 'display bot news')
+        self._add_bot_command('mensa', lambda message, args: self._mensa_plan(message, args), self.DATE_HELP)
+        self._add_bot_command('mensaEN', lambda message, args: self._mensa_plan(message, args, language=Language.EN),
+                              self.DATE_HELP)
+        self._add_bot_command('settings', self._settings, self.SETTINGS_HELP)
+        # not listed in the help, only answered for the maintainers
+        self.handlers['diagnostics'] = self._diagnostics
+        # shortcuts to direct offers for configured locations
+        for cmd in self.SHORTCUTS:
+            if settings.CANTEEN == cmd.location:
+                self._add_meal_command(cmd)
+
+    def _add_bot_command(self, command_text, command, help_info):
+        # commands are matched case-insensitively, like the CommandHandler of python-telegram-bot
+        self.handlers[command_text.lower()] = command
+        self.my_commands.append((command_text, help_info))
+
+    def _add_meal_command(self, cmd_shortcut):
+        self.handlers[cmd_shortcut.command] = \
+            lambda message, args: self._mensa_plan(message, args, filter_meal=cmd_shortcut.meal,
+                                                   canteen=cmd_shortcut.location)
+
+    # Bot API
+
+    async def _call(self, method, request_timeout=None, **params):
+        """Calls a method of the Bot API and returns its result, raising ``TelegramError`` on failure."""
+        body = json.dumps({k: v for k, v in params.items() if v is not None})
+        request = HTTPRequest(f'{self.base_url}/{method}', method='POST', body=body,
+                              headers={'Content-Type': 'application/json'}, request_timeout=request_timeout)
+        try:
+            resp = await self.http.fetch(request, raise_error=False)
+        except OSError as e:
+            raise NetworkError(str(e))
+        if resp.code == 599:
+            if isinstance(resp.error, HTTPTimeoutError):
+                raise TimedOut()
+            raise NetworkError(str(resp.error))
+        try:
+            data = json.loads(resp.body)
+        except ValueError:
+            raise NetworkError(f'Invalid response to {method} (status {resp.code})')
+        if not data.get('ok'):
+            description = data.get('description', f'{method} failed with status {resp.code}')
+            if resp.code in (401, 403):
+                raise Unauthorized(description)
+            if resp.code == 409:
+                raise Conflict(description)
+            raise TelegramError(description)
+        return data['result']
+
+    async def _reply(self, message, text, markdown=True, quote=None):
+        chat = message['chat']
+        # like Message.reply_*: quote the message in group chats only
+        if quote is None:
+            quote = chat.get('type') != 'private'
+        return await self._call('sendMessage', chat_id=chat['id'], text=text,
+                                parse_mode='Markdown' if markdown else None, disable_web_page_preview=True,
+                                reply_to_message_id=message['message_id'] if quote else None)
+
+    async def _send_chat_action(self, chat_id):
+        try:
+            await self._call('sendChatAction', chat_id=chat_id, action=ChatAction.TYPING)
+        except TelegramError as e:
+            self.logger.warning('Could not send chat action: %s', e)
+
+    # Updates
+
+    def _command(self, message):
+        """The (lowercase) command of the message and its arguments, or ``(None, None)`` for other messages."""
+        entities = message.get('entities') or []
+        if not any(e['type'] == 'bot_command' and e['offset'] == 0 for e in entities):
+            return None, None
+        words = message['text'].split()
+        command, _, username = words[0][1:].partition('@')
+        # commands addressed to another bot
+        if username and self.username and username.lower() != self.username.lower():
+            return None, None
+        return command.lower(), words[1:]
+
+    async def _dispatch(self, update):
+        """Processes the update as soon as one of the ``max_updates`` slots is free."""
+        await self._limit.acquire()
+        task = self._loop.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        self._limit.release()
+
+    async def _process(self, update):
+        message = update.get('message') or update.get('edited_message')
+        if not message or not message.get('text'):
+            return
+        command, args = self._command(message)
+        if command is None:
+            return
+        if self.admission.admit(message['chat']['id'], command, args) is not None:
+            return
+        try:
+            await self.handlers.get(command, self._unknown_command)(message, args)
+        except Exception as e:
+            await self._error(message, e)
+        finally:
+            self.admission.done()
+
+    async def _error(self, message, error):
+        """ Error handling."""
+        try:
+            try:
+                raise error
+            except TimedOut:
+                self.logger.error("Request to Telegram API took too long: %s", error)
+                await self._reply(message, 'Unfortunately, it seems that Telegram is not responding to me :(',
+                                  markdown=False, quote=True)
+            except NetworkError:
+                self.logger.error("Error communicating with Telegram API: %s", error)
+            except Unauthorized:
+                self.logger.error("Bot has insufficient rights: %s", error)
+            except TelegramError:
+                self.logger.error("There was an error while communicating with Telegram: %s", error)
+                await self._reply(message, 'Unfortunately, there was an error communicating with Telegram :(',
+                                  markdown=False, quote=True)
+            except Exception as e:
+                self.logger.exception("Some other error (%s) occurred: %s", type(e), e)
+                await self._reply(message, self.ERROR, markdown=False, quote=True)
+        except TelegramError as e:
+            self.logger.error('Could not report error to chat %s: %s', message['chat']['id'], e)
+
+    # Handlers
+
+    async def _unknown_command(self, message, args):
+        self.logger.info('Received unknown command: %s', message['text'])
+        await self._reply(message, self.UNKNOWN_COMMAND, markdown=False, quote=True)
+
+    async def _start(self, message, args):
+        self.logger.debug('Received /start command')
+        await self._reply(message, self.GREETING + '\n\n' + self.INTRO_COMMANDS + self._print_commands()
+                          + self.EXAMPLES)
+
+    async def _bot_help(self, message, args):
+        """Prints help text"""
+        self.logger.debug('Received /help command')
+        await self._reply(message, self.INTRO_HELP + '\n' + self.INTRO_COMMANDS + self._print_commands()
+                          + self.EXAMPLES)
+
+    async def _settings(self, message, args):
+        """Shows or changes the preferences of the chat."""
+        self.logger.debug('Received /settings command')
+        text = await self._loop.run_in_executor(self._store, self._settings_text, message['chat']['id'], args)
+        await self._reply(message, text)
+
+    async def _diagnostics(self, message, args):
+        """Prints the memory report."""
+        self.logger.debug('Received /diagnostics command')
+        text = self._diagnostics_text(message['chat']['id'])
+        if text is None:
+            await self._unknown_command(message, args)
+        else:
+            await self._reply(message, text)
+
+    async def _news(self, message, args):
+        """Prints news for the bot."""
+        self.logger.debug('Received /news command')
+        await self._reply(message, self._news_content)
+
+    async def _preferences(self, chat_id):
+        # only a cache miss reads the database
+        prefs = self.preferences.cached(chat_id)
+        if prefs is None:
+            prefs = await self._loop.run_in_executor(self._store, self.preferences.get, chat_id)
+        return prefs
+
+    async def _retrieve_reply(self, date, language, filter_meal, canteen, prefs):
+        # identical lookups in flight share one retrieval on the worker threads
+        key = (date.to_date_string(), language, filter_meal, canteen, prefs.diet, prefs.exclude)
+        future = self._retrievals.get(key)
+        if future is None:
+            future = self._loop.run_in_executor(self._executor, self._reply_text, date, language, filter_meal,
+                                                canteen, prefs)
+            self._retrievals[key] = future
+            future.add_done_callback(lambda _: self._retrievals.pop(key, None))
+        # a cancelled handler must not cancel the retrieval for the others
+        return await asyncio.shield(future)
+
+    async def _mensa_plan(self, message, args, language=None, filter_meal=None, canteen=None):
+        # /mensa [today|tomorrow|date]
+        # what the command leaves open is taken from the chat's preferences
+        prefs = await self._preferences(message['chat']['id'])
+        if len(args) > 1:
+            await self._reply(message, self.SINGLE_DATE)
+            return
+
+        typing = None
+        try:
+            date, language = self._plan_request(args, language or prefs.language or Language.DE)
+        except pendulum.parsing.exceptions.ParserError:
+            self.logger.info('Got unknown date or date format: %s', args[0])
+            text = self.UNKNOWN_DATE.format(args[0])
+        else:
+            canteen = canteen or prefs.canteen
+            if (canteen or settings.CANTEEN) not in self._mensas:
+                # the first lookup of a canteen sets up its Mensa and HTTP session
+                await self._loop.run_in_executor(self._store, self._mensa_for, canteen or settings.CANTEEN)
+            if not self._without_upstream(date, canteen):
+                # the chat action is sent while the reply is prepared
+                typing = self._loop.create_task(self._send_chat_action(message['chat']['id']))
+            if filter_meal:
+                self.logger.debug('Filter for: %s', filter_meal)
+            try:
+                text = await self._retrieve_reply(date, language, filter_meal, canteen, prefs)
+            except (ValueError, ArgumentError):
+                text = self.USAGE
+            except NoMealError as nme:
+                self.logger.error(nme.message)
+                text = nme.message
+            except UpstreamError as ue:
+                self.logger.error(ue)
+                text = self.UNREACHABLE
+        if typing is not None:
+            await typing
+        await self._reply(message, text)
+
+    # Running
+
+    async def _poll(self, timeout):
+        offset = None
+        while True:
+            try:
+                updates = await self._call('getUpdates', offset=offset, timeout=timeout,
+                                           request_timeout=timeout + 10)
+            except TelegramError as e:
+                self.logger.error('Getting updates failed: %s', e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update['update_id'] + 1
+                await self._dispatch(update)
+
+    async def _serve(self, receive=None):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._limit = asyncio.Semaphore(self.max_updates)
+        self._tasks = set()
+        self._retrievals = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mensa-bot')
+        # the preference store serializes its database access anyway
+        self._store = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mensa-bot-store')
+        self.http = AsyncHTTPClient(force_instance=True, max_clients=API_CONNECTIONS)
+        try:
+            self.username = (await self._call('getMe'))['username']
+            receiver = self._loop.create_task(receive()) if receive else None
+            self.running.set()
+            await self._stopping.wait()
+            if receiver:
+                receiver.cancel()
+            # let the updates in flight finish
+            if self._tasks:
+                await asyncio.wait(self._tasks, timeout=settings.DEADLINE)
+        finally:
+            self.running.clear()
+            self.http.close()
+            self.preferences.flush()
+            self._executor.shutdown(wait=False)
+            self._store.shutdown(wait=False)
+
+    async def run_polling(self, timeout=10):
+        """Receives updates by long polling until ``stop`` is called."""
+        await self._serve(lambda: self._poll(timeout))
+
+    async def run_webhook(self, listen, port, url_path, ssl_options=None):
+        """Receives updates on the webhook until ``stop`` is called; the webhook has to be set already."""
+        app = Application([(rf'/{url_path}/?', _WebhookHandler, {'bot': self})])
+        server = app.listen(port, address=listen, ssl_options=ssl_options)
+        try:
+            await self._serve()
+        finally:
+            server.stop()
+
+    def stop(self):
+        """Stops receiving updates; may be called from any thread."""
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def run(self):
+        # the webhook is (un)set once before the event loop starts, with the blocking client
+        bot = telegram.Bot(self.token, base_url=settings.BASE_URL)
+        if settings.USE_POLLING:
+            self.logger.info('Bot running asynchronously with polling enabled.')
+            bot.delete_webhook()
+            asyncio.run(self.run_polling())
+            return
+
+        ssl_options = None
+        if settings.IS_HEROKU:
+            webhook_url = f'https://{settings.HEROKU_APP_NAME}.herokuapp.com/{settings.TOKEN}'
+            bot.set_webhook(url=webhook_url)
+        else:
+            import ssl
+            webhook_url = f'https://{settings.URL}:{settings.LISTEN_PORT}/{settings.TOKEN}'
+            ssl_options = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_options.load_cert_chain(settings.CERT, settings.CERT_KEY)
+            with open(settings.CERT, 'rb') as cert:
+                bot.set_webhook(url=webhook_url, certificate=cert)
+        # don't leak token into logs
+        self.logger.info('Bot running asynchronously with webhook on %s',
+                         webhook_url.replace(settings.TOKEN, '***TOKEN_OMITTED***'))
+        asyncio.run(self.run_webhook(settings.LISTEN_IP, settings.LISTEN_PORT, settings.TOKEN, ssl_options))
@@ -0,0 +1,192 @@
+#! /usr/bin/env python
+
+"""Archive of collected plans and its columnar export for bulk analytics.
+
+``Archive`` keeps the meals of parsed plans in SQLite, one row per canteen, language, date and meal; recording a day
+again replaces it. ``collect`` records the current and the next week of the canteens (``mensa collect``, e.g. daily).
+
+``Archive.columns`` reads the archive into ``Columns``, typed arrays with one value per meal:
+
+- ``date``: days since 1970-01-01 (int32, the representation of Arrow's ``date32``)
+- ``canteen``, ``language``, ``category``, ``title``: dictionary encoded, int32 codes into ``Columns.dictionaries``
+- ``diet``: bitmask (uint16), bit ``i`` is set if the meal has the diet icon ``DIETS[i]``
+- ``price``: the price for students in cents (int32, see ``Meal``), -1 if the page shows none
+- ``per_100g``: whether ``price`` is per 100g (bool, as for the Wok and Bioessen) instead of per portion
+
+``to_numpy`` and ``to_arrow`` convert them without copying the arrays (except for the dates in NumPy); ``write``
+exports them as Parquet or Arrow IPC (both need pyarrow) or as ``.npz`` (needs numpy). Both libraries are optional.
+"""
+import datetime
+import logging
+import sqlite3
+from array import array
+
+from mensa_ukon.constants import CANTEENS, Language
+from mensa_ukon.emojize import Emojize
+from mensa_ukon.formats import meal_dict
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# bits of the diet column
+DIETS = tuple(Emojize.NAMES.values())
+DICTIONARY_COLUMNS = ('canteen', 'language', 'category', 'title')
+
+_EPOCH = datetime.date(1970, 1, 1)
+# columns of the archive, after the key (canteen, language, date, position)
+_MEAL_COLUMNS = (('category_key', 'TEXT'), ('category', 'TEXT'), ('title', 'TEXT'), ('diet', 'TEXT'),
+                 ('price', 'INTEGER'), ('per_100g', 'INTEGER'))
+_INSERT = 'INSERT INTO meals (canteen, language, date, position, {}) VALUES ({})'.format(
+    ', '.join(name for name, _ in _MEAL_COLUMNS), ', '.join('?' * (4 + len(_MEAL_COLUMNS))))
+
+
+def diet_mask(names) -> int:
+    mask = 0
+    for name in names:
+        if name in DIETS:
+            mask |= 1 << DIETS.index(name)
+    return mask
+
+
+class Columns(object):
+
+    def __init__(self):
+        self.date = array('i')
+        self.diet = array('H')
+        self.price = array('i')
+        self.per_100g = array('B')
+        # column -> codes, and the values the codes refer to
+        self.codes = {c: array('i') for c in DICTIONARY_COLUMNS}
+        self.dictionaries = {c: [] for c in DICTIONARY_COLUMNS}
+        self._index = {c: {} for c in DICTIONARY_COLUMNS}
+
+    def __len__(self):
+        return len(self.date)
+
+    def _encode(self, column, value):
+        index = self._index[column]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self.dictionaries[column])
+            self.dictionaries[column].append(value)
+        self.codes[column].append(code)
+
+    def append(self, canteen, language, date, category, title, diet, price, per_100g):
+        self.date.append((datetime.date.fromisoformat(date) - _EPOCH).days)
+        for column, value in zip(DICTIONARY_COLUMNS, (canteen, language, category, title)):
+            self._encode(column, value)
+        self.diet.append(diet_mask(diet.split(',') if diet else ()))
+        self.price.append(-1 if price is None else price)
+        self.per_100g.append(1 if per_100g else 0)
+
+    def to_numpy(self) -> dict:
+        """The columns as NumPy arrays; dictionary columns as codes, with their values in ``<column>_values``."""
+        import numpy as np
+        columns = {'date': np.frombuffer(self.date, dtype=np.int32).astype('datetime64[D]'),
+                   'diet': np.frombuffer(self.diet, dtype=np.uint16),
+                   'price': np.frombuffer(self.price, dtype=np.int32),
+                   'per_100g': np.frombuffer(self.per_100g, dtype=np.bool_)}
+        for c in DICTIONARY_COLUMNS:
+            columns[c] = np.frombuffer(self.codes[c], dtype=np.int32)
+            columns[c + '_values'] = np.array(self.dictionaries[c], dtype=str)
+        return columns
+
+    def to_arrow(self):
+        """The columns as a ``pyarrow.Table``, with dictionary arrays for the dictionary columns."""
+        import pyarrow as pa
+
+        def wrap(data, type):
+            return pa.Array.from_buffers(type, len(data), [None, pa.py_buffer(data)])
+
+        columns = {'date': wrap(self.date, pa.date32())}
+        for c in DICTIONARY_COLUMNS:
+            columns[c] = pa.DictionaryArray.from_arrays(wrap(self.codes[c], pa.int32()),
+                                                        pa.array(self.dictionaries[c], pa.string()))
+        columns['diet'] = wrap(self.diet, pa.uint16())
+        columns['price'] = wrap(self.price, pa.int32())
+        # Arrow packs booleans into bits
+        columns['per_100g'] = pa.array(self.per_100g.tolist(), pa.bool_())
+        return pa.table(columns)
+
+    def write(self, path):
+        """Writes the columns to ``.parquet``, ``.arrow``/``.feather`` or ``.npz``; raises ``ValueError`` otherwise."""
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            pq.write_table(self.to_arrow(), path)
+        elif path.endswith(('.arrow', '.feather')):
+            import pyarrow.feather as feather
+            feather.write_feather(self.to_arrow(), path)
+        elif path.endswith('.npz'):
+            import numpy as np
+            np.savez_compressed(path, **self.to_numpy())
+        else:
+            raise ValueError(f'Unknown export format: {path}')
+
+
+class Archive(object):
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection as c:
+            c.execute('CREATE TABLE IF NOT EXISTS meals (canteen TEXT, language TEXT, date TEXT, position INTEGER, '
+                      + ''.join(f'{name} {type}, ' for name, type in _MEAL_COLUMNS)
+                      + 'PRIMARY KEY (canteen, language, date, position))')
+            # archives recorded before a column was added
+            existing = {row[1] for row in c.execute('PRAGMA table_info(meals)')}
+            for name, type in _MEAL_COLUMNS:
+                if name not in existing:
+                    c.execute(f'ALTER TABLE meals ADD COLUMN {name} {type}')
+
+    def record(self, plans, language=Language.DE) -> int:
+        """Records the meals of the plans, replacing what was recorded for their days; returns the number of days.
+
+        Stale plans are skipped, days without meals are recorded as such.
+        """
+        days = 0
+        with self._connection as c:
+            for plan in plans:
+                if plan.stale or plan.date is None:
+                    continue
+                key = (plan.location.shortcut, language.name, plan.date.strftime('%Y-%m-%d'))
+                c.execute('DELETE FROM meals WHERE canteen = ? AND language = ? AND date = ?', key)
+                meals = (meal_dict(k, m) for k, m in (plan.meals or {}).items())
+                c.executemany(_INSERT, [key + (i, m['category_key'], m['category'], m['title'], ','.join(m['diet']),
+                                               m['price'], m['per_100g']) for i, m in enumerate(meals)])
+                days += 1
+        return days
+
+    def columns(self) -> Columns:
+        columns = Columns()
+        rows = self._connection.execute('SELECT canteen, language, date, category, title, diet, price, per_100g '
+                                        'FROM meals ORDER BY date, canteen, language, position')
+        for row in rows:
+            columns.append(*row)
+        return columns
+
+    def close(self):
+        self._connection.close()
+
+
+def collect(archive, canteens=None, languages=None, start=None) -> int:
+    """Records the current and the next week of the canteens (default: all) in both languages.
+
+    Returns the number of recorded days; canteens that cannot be retrieved are logged and skipped.
+    """
+    import pendulum
+    from mensa_ukon.mensa import Mensa
+    from mensa_ukon.upstream import UpstreamError
+
+    if start is None:
+        today = datetime.date.today()
+        start = today - datetime.timedelta(days=today.weekday())
+    monday = pendulum.date(start.year, start.month, start.day)
+    days = 0
+    for canteen in canteens or CANTEENS:
+        m = Mensa(canteen)
+        for language in languages or Language:
+            try:
+                days += archive.record(m.retrieve_days(monday, 14, language), language)
+            except UpstreamError as e:
+                logger.error(f'Could not collect the {language.name} plans of {canteen}: {e}')
+    return days
@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+
+"""Read-only HTTP JSON API for the canteen plans.
+
+Endpoints:
+
+- ``/canteens``: all canteens
+- ``/plans/{canteen}/{date}``: the plan of one day (``date`` as ``YYYY-MM-DD``, or ``today``/``tomorrow``)
+- ``/plans/{canteen}?from=&to=``: the plans of a range of days (default: today)
+
+All plan endpoints accept ``language`` (``DE``/``EN``) and ``filter`` query parameters.
+Plans are the documents of ``formats.plan_dict``. Responses carry a strong ETag of their content (with a ``-gzip``
+suffix for the gzipped representation), are gzipped if the client accepts it, and may be cached for ``settings.API_MAX_AGE`` seconds (stale plans, served
+while upstream fails, are not cached). If upstream fails without a plan to fall back to, the status is 503.
+All requests are served from one ``Mensa`` per canteen, so upstream is only fetched once per process.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from mensa_ukon import memory, settings
+from mensa_ukon.constants import CANTEENS, Language
+from mensa_ukon.formats import plan_dict
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# longest range of days a single request may ask for
+MAX_DAYS = 62
+
+
+class ApiError(Exception):
+    """Error that is reported to the client with the given HTTP status."""
+
+    def __init__(self, status, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Response(object):
+    """A rendered response; the gzipped body is created on first use."""
+
+    def __init__(self, status, document, max_age):
+        self.status = status
+        self.body = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        self.etag = '"{}"'.format(hashlib.sha256(self.body).hexdigest()[:32])
+        self.max_age = max_age
+        self.expires = time.monotonic() + max_age
+        self._gzipped = None
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+    @property
+    def gzip_etag(self):
+        # a strong ETag identifies the bytes sent, so each encoding has its own
+        return self.etag[:-1] + '-gzip"'
+
+
+def _response_size(obj):
+    if not isinstance(obj, Response):
+        return memory.sizeof(obj)
+    # the gzipped body is created later; it is estimated as a quarter of the body
+    return memory.sizeof(obj.__dict__) + len(obj.body) // 4
+
+
+def _parse_date(value, today):
+    if value in (None, '', 'today'):
+        return today
+    if value == 'tomorrow':
+        return today + datetime.timedelta(days=1)
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f'Invalid date: {value}')
+
+
+def _etags(value):
+    return [tag.strip() for tag in value.split(',')] if value else []
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'mensa_api'
+    # headers and body are written separately, which stalls keep-alive connections on delayed ACKs otherwise
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def do_GET(self):
+        try:
+            response = self.server.response(self.path)
+        except ApiError as e:
+            response = Response(e.status, {'error': e.message}, 0)
+        except Exception:
+            logger.exception('Could not answer %s', self.path)
+            response = Response(500, {'error': 'Internal server error'}, 0)
+        self._send(response)
+
+    do_HEAD = do_GET
+
+    def _send(self, response):
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        etag = response.gzip_etag if gzipped else response.etag
+        if response.status == 200 and etag in _etags(self.headers.get('If-None-Match')):
+            status, body, headers = 304, b'', {}
+        else:
+            status, body, headers = response.status, response.body, {'Content-Type': 'application/json; charset=utf-8'}
+            if gzipped:
+                body = response.gzipped
+                headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if response.status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', f'public, max-age={response.max_age}')
+        else:
+            self.send_header('Cache-Control', 'no-store')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=None, max_age=None):
+        from mensa_ukon.mensa import Mensa
+
+        address = address or (settings.API_HOST, settings.API_PORT)
+        super(ApiServer, self).__init__(address, ApiRequestHandler)
+        self.max_age = settings.API_MAX_AGE if max_age is None else max_age
+        self.mensas = {canteen: Mensa(canteen) for canteen in CANTEENS}
+        # one lock per canteen, so that concurrent misses do not all fetch and parse upstream
+        self._locks = {canteen: threading.Lock() for canteen in CANTEENS}
+        self._responses = memory.LRUCache('api', settings.API_CACHE_BYTES, sizeof=_response_size)
+
+    def response(self, path):
+        """Returns the (possibly cached) response for the request path."""
+        # relative dates (``today``, the default range) resolve differently after midnight
+        today = datetime.date.today()
+        key = (today, path)
+        cached = self._responses.get(key)
+        if cached is not None and cached.expires > time.monotonic():
+            return cached
+        document = self._document(path, today)
+        plans = document.get('plans', [document]) if isinstance(document, dict) else []
+        stale = any(p.get('stale') for p in plans)
+        response = Response(200, document, 0 if stale else self.max_age)
+        self._responses.set(key, response)
+        return response
+
+    def _document(self, path, today):
+        url = urlsplit(path)
+        parts = [p for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if parts == ['canteens']:
+            return [{'canteen': c, 'canteen_name': l.nice_name} for c, l in CANTEENS.items()]
+
+        if parts and parts[0] == 'plans' and len(parts) in (2, 3):
+            canteen = parts[1]
+            if canteen not in CANTEENS:
+                raise ApiError(404, f'Unknown canteen: {canteen}')
+            language = query.get('language', 'DE').upper()
+            if language not in Language.__members__:
+                raise ApiError(400, f'Unknown language: {language}')
+            language = Language[language]
+
+            if len(parts) == 3:
+                plans = self.plans(canteen, _parse_date(parts[2], today), 1, language, query.get('filter'))
+                return plan_dict(plans[0])
+
+            start = _parse_date(query.get('from'), today)
+            end = _parse_date(query.get('to'), today) if 'to' in query else start
+            days = (end - start).days + 1
+            if not 0 < days <= MAX_DAYS:
+                raise ApiError(400, f'Range must cover 1 to {MAX_DAYS} days')
+            plans = self.plans(canteen, start, days, language, query.get('filter'))
+            return {'canteen': canteen, 'from': start.isoformat(), 'to': end.isoformat(),
+                    'plans': [plan_dict(p) for p in plans]}
+
+        raise ApiError(404, f'Not found: {url.path}')
+
+    def plans(self, canteen, start, days, language, filter_meal):
+        import pendulum
+        from mensa_ukon.upstream import UpstreamError
+        try:
+            with self._locks[canteen]:
+                return list(self.mensas[canteen].retrieve_days(pendulum.date(start.year, start.month, start.day),
+                                                                days, language, filter_meal))
+        except UpstreamError as e:
+            logger.warning('Upstream failed: %s', e)
+            raise ApiError(503, 'Canteen plans are currently unavailable')
@@ -0,0 +1,162 @@
+#! /usr/bin/env python
+
+"""Answers many plan queries at once (``mensa batch``).
+
+Queries are JSON objects, one per line: ``{"date": "2018-08-13", "canteen": "giessberg", "language": "DE",
+"filter": "wok"}``. Every field is optional (default: today, giessberg, DE, no filter); ``date`` may also be ``today``
+or ``tomorrow``.
+
+The queries are grouped by canteen and language. Each group is retrieved once, for all its dates (one run of
+consecutive days at a time), and the groups are retrieved concurrently, so that each page is requested and parsed once
+however many queries need it. The answers are yielded in the order of the queries, each as soon as it and all before
+it are known.
+
+The input is read ``CHUNK`` queries at a time, so that it doesn't have to fit into memory. The chunks share one
+``Mensa`` per group, whose cached page is reused by the later chunks.
+"""
+import datetime
+import itertools
+import json
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from mensa_ukon.constants import CANTEENS, Language, Plan
+from mensa_ukon.formats import plan_dict
+from mensa_ukon.upstream import UpstreamError
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+Query = namedtuple('Query', ['canteen', 'date', 'language', 'filter'])
+
+# groups retrieved at the same time
+WORKERS = 8
+# queries read and answered at a time
+CHUNK = 10000
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _date(value, today):
+    if value in (None, 'today'):
+        return today
+    if value == 'tomorrow':
+        return today + datetime.timedelta(days=1)
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise QueryError(f'Invalid date: {value!r}')
+
+
+def parse_query(line, today=None) -> Query:
+    """Returns the query of the line, raises ``QueryError`` if it is invalid."""
+    try:
+        spec = json.loads(line)
+    except ValueError as e:
+        raise QueryError(f'Invalid JSON: {e}')
+    if not isinstance(spec, dict):
+        raise QueryError('Query must be a JSON object')
+    unknown = set(spec) - set(Query._fields)
+    if unknown:
+        raise QueryError('Unknown fields: ' + ', '.join(sorted(unknown)))
+    for field, value in spec.items():
+        if value is not None and not isinstance(value, str):
+            raise QueryError(f'{field} must be a string: {value!r}')
+    canteen = spec.get('canteen', 'giessberg')
+    if canteen not in CANTEENS:
+        raise QueryError(f'Unknown canteen: {canteen!r}')
+    language = spec.get('language', 'DE')
+    if language not in Language.__members__:
+        raise QueryError(f'Unknown language: {language!r}')
+    return Query(canteen, _date(spec.get('date'), today or datetime.date.today()), Language[language],
+                 spec.get('filter'))
+
+
+def _runs(dates):
+    """Splits the dates into runs of consecutive days, in order."""
+    runs = []
+    for date in sorted(dates):
+        if runs and (date - runs[-1][-1]).days == 1:
+            runs[-1].append(date)
+        else:
+            runs.append([date])
+    return runs
+
+
+def _retrieve_group(mensa, language, dates):
+    """Retrieves the plans of the canteen for the dates, in one go for each run of consecutive days."""
+    import pendulum
+
+    plans = {}
+    for run in _runs(dates):
+        start = pendulum.date(run[0].year, run[0].month, run[0].day)
+        for plan in mensa.retrieve_days(start, len(run), language):
+            plans[datetime.date(plan.date.year, plan.date.month, plan.date.day)] = plan
+    return mensa, plans
+
+
+def _answer(query, group):
+    mensa, plans = group
+    plan = plans.get(query.date) or Plan(mensa.location, None, query.date)
+    record = plan_dict(plan._replace(meals=mensa._filter_meals(plan.meals, query.filter)))
+    record['language'] = query.language.name
+    record['filter'] = query.filter
+    return record
+
+
+def run(lines, workers=None, today=None):
+    """Yields the answer (a dict) to the query of each line, in the order of the lines.
+
+    Invalid queries, and queries whose plans could not be retrieved or answered, are answered with
+    ``{"error": ..., "query": ...}``.
+    Empty lines are skipped.
+    """
+    lines = iter(lines)
+    # (canteen, language) -> Mensa, kept for all chunks
+    mensas = {}
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as executor:
+        while True:
+            chunk = list(itertools.islice(lines, CHUNK))
+            if not chunk:
+                return
+            yield from _run_chunk(chunk, executor, mensas, today)
+
+
+def _run_chunk(lines, executor, mensas, today):
+    from mensa_ukon.mensa import Mensa
+
+    queries = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            queries.append((line.strip(), parse_query(line, today)))
+        except QueryError as e:
+            queries.append((line.strip(), e))
+
+    groups = {}
+    for _, q in queries:
+        if isinstance(q, Query):
+            groups.setdefault((q.canteen, q.language), set()).add(q.date)
+    logger.info(f'{len(queries)} queries need {len(groups)} retrievals')
+
+    futures = {}
+    for key, dates in groups.items():
+        if key not in mensas:
+            mensas[key] = Mensa(key[0])
+        futures[key] = executor.submit(_retrieve_group, mensas[key], key[1], dates)
+    for line, q in queries:
+        if not isinstance(q, Query):
+            yield {'error': str(q), 'query': line}
+            continue
+        try:
+            yield _answer(q, futures[(q.canteen, q.language)].result())
+        except UpstreamError as e:
+            yield {'error': f'Could not retrieve the canteen plan: {e}', 'query': line}
+        except Exception as e:
+            # one broken page (or bug) must not end the whole run
+            logger.exception(f'Could not answer {line}')
+            yield {'error': f'Could not answer the query: {e}', 'query': line}
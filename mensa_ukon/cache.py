@@ -0,0 +1,293 @@
+#! /usr/bin/env python
+
+"""Cache backends for parsed plans and rendered replies, shared between the processes of a deployment.
+
+``open_cache`` takes a spec (``settings.CACHE``):
+
+- ``memory``: an LRU in this process, within ``settings.CACHE_BYTES`` (default)
+- ``sqlite:///cache.db`` (relative) or ``sqlite:////var/cache/mensa.db`` (absolute path): a SQLite database,
+  shared by all processes on one host
+- ``redis://host:port/db``: any server speaking the Redis protocol (only GET, MGET, SET and DEL are used)
+
+Values are bytes. Besides ``get``/``set``, every backend has a lock with expiry (``acquire``/``release``),
+with which the processes agree on who refreshes an entry from upstream.
+"""
+import functools
+import itertools
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from mensa_ukon.memory import LRUCache
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class CacheError(Exception):
+    """Raised when a cache backend cannot be reached; callers treat it like a miss."""
+
+
+class Cache(object):
+    """Interface of a cache backend."""
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys) -> list:
+        """The values of the keys, ``None`` for missing or expired ones."""
+        raise NotImplementedError
+
+    def set(self, key, value: bytes, ttl: float):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: dict, ttl: float):
+        raise NotImplementedError
+
+    def acquire(self, name, ttl: float):
+        """Takes the lock if nobody holds it; returns a token for ``release``, or ``None``."""
+        raise NotImplementedError
+
+    def release(self, name, token):
+        raise NotImplementedError
+
+    def locked(self, name) -> bool:
+        return self.get(name) is not None
+
+    def close(self):
+        pass
+
+
+class MemoryCache(Cache):
+
+    def __init__(self, max_bytes=None):
+        # key -> (expires, value); the least recently used entries are evicted beyond max_bytes
+        self._data = LRUCache('memory', max_bytes)
+        # lock name -> (expires, token), never evicted
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            # unless another thread has set it again in the meantime
+            self._data.pop_if(key, entry)
+            return None
+        return entry[1]
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        return [self._get(k, now) for k in keys]
+
+    def set_many(self, items, ttl):
+        expires = time.monotonic() + ttl
+        for k, v in items.items():
+            self._data.set(k, (expires, v))
+
+    def _lock_token(self, name, now):
+        entry = self._locks.get(name)
+        return entry[1] if entry is not None and entry[0] > now else None
+
+    def acquire(self, name, ttl):
+        now = time.monotonic()
+        token = uuid.uuid4().hex.encode()
+        with self._lock:
+            if self._lock_token(name, now) is not None:
+                return None
+            self._locks[name] = (now + ttl, token)
+        return token
+
+    def release(self, name, token):
+        with self._lock:
+            if self._lock_token(name, time.monotonic()) == token:
+                del self._locks[name]
+
+    def locked(self, name):
+        with self._lock:
+            return self._lock_token(name, time.monotonic()) is not None
+
+
+def _sqlite_errors(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except sqlite3.Error as e:
+            raise CacheError(f'SQLite cache {self.path} failed: {e}') from e
+    return wrapper
+
+
+class SqliteCache(Cache):
+    """Cache in a SQLite database; expiry uses the wall clock, which all processes share.
+
+    Expired rows are deleted when the database is opened and every ``purge_every`` writes, so that the day-keyed
+    entries do not accumulate.
+    """
+
+    def __init__(self, path, purge_every=100):
+        self.path = path
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        with self._connection() as c:
+            c.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)')
+        self.purge()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # every thread gets its own connection; WAL lets readers continue while another process writes
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    @_sqlite_errors
+    def get_many(self, keys):
+        keys = list(keys)
+        rows = self._connection().execute(
+            'SELECT key, value FROM cache WHERE expires > ? AND key IN ({})'.format(', '.join('?' * len(keys))),
+            [time.time()] + keys).fetchall()
+        values = dict(rows)
+        return [values.get(k) for k in keys]
+
+    @_sqlite_errors
+    def set_many(self, items, ttl):
+        expires = time.time() + ttl
+        with self._connection() as c:
+            c.executemany('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                          [(k, v, expires) for k, v in items.items()])
+        if next(self._writes) % self.purge_every == 0:
+            self.purge()
+
+    @_sqlite_errors
+    def purge(self) -> int:
+        """Deletes the expired entries and locks; returns how many."""
+        with self._connection() as c:
+            return c.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),)).rowcount
+
+    @_sqlite_errors
+    def acquire(self, name, ttl):
+        now = time.time()
+        token = uuid.uuid4().hex.encode()
+        with self._connection() as c:
+            # only replaces an expired lock, atomically
+            cursor = c.execute('INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+                               'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+                               'WHERE cache.expires <= ?', (name, token, now + ttl, now))
+        return token if cursor.rowcount == 1 else None
+
+    @_sqlite_errors
+    def release(self, name, token):
+        with self._connection() as c:
+            c.execute('DELETE FROM cache WHERE key = ? AND value = ?', (name, token))
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RedisCache(Cache):
+    """Minimal client for the Redis protocol (RESP), with one connection per thread."""
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, timeout=1.0):
+        self.address = (host, port)
+        self.db = db
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        self._local.sock, self._local.file = sock, sock.makefile('rb')
+        if self.db:
+            self._command_on_connection('SELECT', self.db)
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            self._local.file.close()
+            sock.close()
+        self._local.sock = self._local.file = None
+
+    @staticmethod
+    def _encode(args):
+        out = [b'*%d\r\n' % len(args)]
+        for a in args:
+            a = a if isinstance(a, bytes) else str(a).encode('utf-8')
+            out.append(b'$%d\r\n%s\r\n' % (len(a), a))
+        return b''.join(out)
+
+    def _read(self):
+        line = self._local.file.readline()
+        if not line:
+            raise ConnectionError('Connection closed')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise CacheError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            if int(rest) < 0:
+                return None
+            data = self._local.file.read(int(rest) + 2)
+            return data[:-2]
+        if kind == b'*':
+            return None if int(rest) < 0 else [self._read() for _ in range(int(rest))]
+        raise CacheError(f'Unexpected reply: {line!r}')
+
+    def _command_on_connection(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    def command(self, *args):
+        try:
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            return self._command_on_connection(*args)
+        except OSError as e:
+            self._disconnect()
+            raise CacheError(f'Redis at {self.address} failed: {e}') from e
+
+    def get_many(self, keys):
+        return self.command('MGET', *keys)
+
+    def set_many(self, items, ttl):
+        for k, v in items.items():
+            self.command('SET', k, v, 'PX', int(ttl * 1000))
+
+    def acquire(self, name, ttl):
+        token = uuid.uuid4().hex.encode()
+        return token if self.command('SET', name, token, 'NX', 'PX', int(ttl * 1000)) == b'OK' else None
+
+    def release(self, name, token):
+        # not atomic without scripting, but the lock expires anyway
+        if self.command('GET', name) == token:
+            self.command('DEL', name)
+
+    def close(self):
+        self._disconnect()
+
+
+def open_cache(spec=None) -> Cache:
+    """Opens the cache backend of the spec (default: ``settings.CACHE``)."""
+    from mensa_ukon import settings
+    if spec is None:
+        spec = settings.CACHE
+    url = urlsplit(spec)
+    if spec == 'memory':
+        return MemoryCache(settings.CACHE_BYTES)
+    if url.scheme == 'sqlite':
+        return SqliteCache(url.path[1:])
+    if url.scheme == 'redis':
+        return RedisCache(url.hostname or '127.0.0.1', url.port or 6379, int(url.path.strip('/') or 0))
+    raise ValueError(f'Unknown cache: {spec}')
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+
+"""Content hashes of parsed days and meals, and the differences between two parses of a page.
+
+A meal's hash covers its category, title, icons and price. A day's hash covers the hashes of its meals, in order.
+Both only depend on the content and stay the same across runs, processes and parser backends.
+"""
+import hashlib
+from collections import OrderedDict
+
+from mensa_ukon.constants import DayDiff
+
+
+def meal_hash(meal) -> str:
+    content = '\x1f'.join([meal[0], meal[1]] + list(meal[2])) + f'\x1e{meal[3]}\x1f{meal[4]:d}'
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+class Day(OrderedDict):
+    """The meals of one day by normalized category, with the content hash of each meal and of the day.
+
+    Compares equal to a plain dict of the same meals.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Day, self).__init__(*args, **kwargs)
+        self.hashes = {k: meal_hash(m) for k, m in self.items()}
+        content = '\x1e'.join(f'{k}\x1f{h}' for k, h in self.hashes.items())
+        self.hash = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+def day_hash(meals) -> str:
+    """The content hash of the meals of a day, as the ``hash`` of a ``Day`` of them."""
+    return getattr(meals, 'hash', None) or Day(meals).hash
+
+
+def _hashes(day):
+    return getattr(day, 'hashes', None) or {k: meal_hash(m) for k, m in day.items()}
+
+
+def diff(old_labels, old_days, new_labels, new_days) -> list:
+    """Returns a ``DayDiff`` for every date tab whose meals differ between the old and the new parse.
+
+    Tabs are matched by their date label; tabs that only exist in one of the parses have all meals added or removed.
+    """
+    old = dict(zip(old_labels, old_days))
+    new = dict(zip(new_labels, new_days))
+    diffs = []
+    for label in list(old_labels) + [l for l in new_labels if l not in old]:
+        old_day, new_day = old.get(label, {}), new.get(label, {})
+        if getattr(old_day, 'hash', None) is not None and old_day.hash == getattr(new_day, 'hash', None):
+            continue
+        old_hashes, new_hashes = _hashes(old_day), _hashes(new_day)
+        added = [k for k in new_hashes if k not in old_hashes]
+        removed = [k for k in old_hashes if k not in new_hashes]
+        changed = [k for k in new_hashes if k in old_hashes and new_hashes[k] != old_hashes[k]]
+        if added or removed or changed:
+            diffs.append(DayDiff(label, added, removed, changed))
+    return diffs
@@ -1,10 +1,10 @@
 #! /usr/bin/env python
 
 from collections import OrderedDict
-# from enum import Enum, unique
+from enum import Enum
 from logging import DEBUG, INFO, WARN, ERROR
 from collections import namedtuple as n
-from aenum import Enum
+from mensa_ukon import formats
 from mensa_ukon.emojize import Emojize
 
 # Some minimum headers we need to send in order to get a response
@@ -30,11 +30,22 @@ class Verbosity(Enum):
         return Verbosity(
             Verbosity(ERROR).value - (max(min(len(Verbosity.__members__) - 1, verbosity), 0) * 10)).value
 
-# Plan(Location, dict)
+# Location, dict, date, whether it is the last good plan served because upstream failed, and why there are no meals
+# if that is known without asking upstream (opening.CLOSED, UNPUBLISHED or EXPIRED, see mensa_ukon/opening.py)
+Plan = n('Plan', ['location', 'meals', 'date', 'stale', 'status'], defaults=[None, False, None])
+# category name, cleaned title, list of emoji, price for students in cents (None if the page shows none) and whether
+# it is the price per 100g (as for the Wok and Bioessen)
+Meal = n('Meal', ['category', 'title', 'icons', 'price', 'per_100g'], defaults=[None, False])
+# date tab label, lists of the category keys of added, removed and changed meals
+DayDiff = n('DayDiff', ['label', 'added', 'removed', 'changed'])
+
+# Plan(Location, dict, date)
 FORMATTERS = OrderedDict({
     'plain': lambda plan: '\033[1m# {}\033[0m\n\n'.format(plan.location.nice_name)
                           + '\n'.join(['\033[1m{}{}: \033[0m {}'.format(meal[0], Emojize.as_str(meal[2]), meal[1]) for meal in plan.meals.values()]),
-    # 'json': lambda entries: json.dumps(entries)
+    'json': formats.to_json,
+    'ndjson': formats.to_ndjson,
+    'msgpack': formats.to_msgpack,
 })
 
 Format = n('Enum', FORMATTERS.keys())._make(FORMATTERS.keys())
@@ -42,10 +53,25 @@ Format = n('Enum', FORMATTERS.keys())._make(FORMATTERS.keys())
 
 # Mo. 13.08.
 # Mon. 13.08.
-class Language(Enum, init='date_fmt'):
+class Language(Enum):
     DE = 'dd DD.MM.'
     EN = 'ddd DD.MM.'
 
+    @property
+    def date_fmt(self):
+        return self.value
+
+
+# A meal in both languages, aligned by date tab and category position:
+# (category key, Meal) for each language, or None if a page has no counterpart
+BilingualMeal = n('BilingualMeal', [l.name for l in Language])
+
+# Per-chat preferences of the bot: canteen key, Language, diet ('vegetarian' or 'vegan'), tuple of excluded
+# ingredients (names of Emojize.NAMES) and the time of the daily plan ('HH:MM', kept for the subscription feature
+# but not settable yet); None/() for the defaults
+Preferences = n('Preferences', ['canteen', 'language', 'diet', 'exclude', 'subscription'],
+                defaults=[None, None, None, (), None])
+
 
 class Location(object):
     def __init__(self, key, nice_name, shortcut, order=None, days_open=10):
@@ -0,0 +1,168 @@
+#! /usr/bin/env python
+
+"""Daemon that keeps the parsed plans of all canteens warm, and the client to query it.
+
+The daemon listens on a unix socket (``settings.SOCKET``). A request is a single line of JSON,
+e.g. ``{"canteen": "giessberg", "date": "2018-08-13", "days": 1, "language": "DE", "filter_meal": null}``,
+and is answered with a single line ``{"plans": [...]}`` (see ``formats.plan_dict``) or ``{"error": "..."}``.
+
+This module is imported by the CLI on every call, so it must not import ``Mensa`` at module level.
+"""
+import datetime
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+
+from mensa_ukon import settings
+from mensa_ukon.constants import CANTEENS, Language, Meal, Plan
+from mensa_ukon.emojize import Emojize
+from mensa_ukon.formats import plan_dict
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_EMOJI = {name: emoji for emoji, name in Emojize.NAMES.items()}
+
+
+class DaemonError(Exception):
+    """Raised when the daemon cannot be started."""
+
+
+def plan_from_dict(d) -> Plan:
+    """Inverse of ``formats.plan_dict``."""
+    meals = OrderedDict((m['category_key'], Meal(m['category'], m['title'], [_EMOJI.get(n, n) for n in m['diet']],
+                                                 m.get('price'), m.get('per_100g', False)))
+                        for m in d['meals'])
+    date = datetime.date.fromisoformat(d['date']) if d['date'] else None
+    return Plan(CANTEENS[d['canteen']], meals or None, date, d.get('stale', False), d.get('status'))
+
+
+def _connect(path, timeout):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(path)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def query(canteen, date, days=1, language=Language.DE, filter_meal=None, path=None, timeout=10.0):
+    """Asks a running daemon for the plans.
+
+    Returns ``None`` if no daemon is running or it could not answer, so that the caller can fall back to
+    retrieving the plans itself.
+    """
+    request = {
+        'canteen': canteen,
+        'date': date.isoformat(),
+        'days': days,
+        'language': language.name,
+        'filter_meal': filter_meal,
+    }
+    try:
+        with _connect(path or settings.SOCKET, timeout) as s:
+            s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with s.makefile('rb') as f:
+                line = f.readline()
+    except OSError as e:
+        logger.debug('No daemon available: %s', e)
+        return None
+    if not line:
+        return None
+
+    response = json.loads(line)
+    if 'error' in response:
+        logger.warning('Daemon could not answer: %s', response['error'])
+        return None
+    return [plan_from_dict(p) for p in response['plans']]
+
+
+class _PlanRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            response = {'plans': [plan_dict(p) for p in self.server.plans(**request)]}
+        except Exception as e:
+            logger.exception('Could not answer request %r', line)
+            response = {'error': '{}: {}'.format(type(e).__name__, e)}
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class PlanServer(socketserver.ThreadingUnixStreamServer):
+    """Serves plans of all canteens from one set of ``Mensa`` instances, refreshing them periodically."""
+    daemon_threads = True
+
+    def __init__(self, path=None, refresh_interval=None):
+        from mensa_ukon.mensa import Mensa
+
+        self.path = path or settings.SOCKET
+        self.refresh_interval = settings.REFRESH_INTERVAL if refresh_interval is None else refresh_interval
+        self.mensas = {canteen: Mensa(canteen) for canteen in CANTEENS}
+        self._stopped = threading.Event()
+        self._refresher = None
+
+        self._remove_stale_socket()
+        super(PlanServer, self).__init__(self.path, _PlanRequestHandler)
+        os.chmod(self.path, 0o600)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            _connect(self.path, 1.0).close()
+        except OSError:
+            logger.info('Removing stale socket %s', self.path)
+            os.unlink(self.path)
+        else:
+            raise DaemonError(f'Daemon already running on {self.path}')
+
+    def plans(self, canteen, date, days=1, language='DE', filter_meal=None):
+        import pendulum
+        day = pendulum.Date.fromisoformat(date)
+        return list(self.mensas[canteen].retrieve_days(day, days, Language[language], filter_meal))
+
+    def refresh(self):
+        """Fetches and parses the pages of all canteens and languages (unchanged pages are not parsed again).
+
+        Stops between canteens once the server is closed.
+        """
+        for canteen, m in self.mensas.items():
+            if self._stopped.is_set():
+                return
+            for language in Language:
+                try:
+                    _, _, days, _ = m._parse_latest(language)
+                    for _ in days:
+                        pass
+                except Exception:
+                    logger.exception('Could not refresh %s (%s)', canteen, language.name)
+
+    def _refresh_loop(self):
+        self.refresh()
+        while not self._stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def serve_forever(self, poll_interval=0.5):
+        self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresher.start()
+        super(PlanServer, self).serve_forever(poll_interval)
+
+    def server_close(self):
+        self._stopped.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        super(PlanServer, self).server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
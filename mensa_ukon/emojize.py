@@ -34,6 +34,23 @@ class Emojize:
         (Emoji.FARMER, 'B')
     ]
 
+    # Stable names of the emoji for machine-readable output formats
+    NAMES = {
+        Emoji.CHEESE: 'vegetarian',
+        Emoji.SEEDLING: 'vegan',
+        Emoji.PIG: 'pork',
+        Emoji.COW: 'beef',
+        Emoji.CHICKEN: 'poultry',
+        Emoji.SHEEP: 'lamb',
+        Emoji.GAME: 'game',
+        Emoji.FISH: 'fish',
+        Emoji.FARMER: 'regional',
+    }
+
+    @classmethod
+    def name(cls, emoji: str) -> str:
+        return cls.NAMES.get(emoji, emoji)
+
     @classmethod
     def replace_type(cls, type: str) -> str:
         for e, css_class in cls.TOKENS:
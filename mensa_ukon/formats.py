@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+
+"""Machine-readable representations of plans.
+
+The field names are part of the output formats and must stay stable:
+every meal has ``canteen``, ``date``, ``category_key``, ``category``, ``title`` and ``diet``
+(the names of its diet icons, see ``Emojize.NAMES``).
+"""
+import json
+
+from mensa_ukon.emojize import Emojize
+
+
+def _date(plan):
+    return None if plan.date is None else plan.date.strftime('%Y-%m-%d')
+
+
+def meal_dict(key, meal) -> dict:
+    category, title, icons = meal[0], meal[1], meal[2]
+    return {
+        'category_key': key,
+        'category': category,
+        'title': title,
+        'diet': [Emojize.name(e) for e in icons],
+        # for students, in cents
+        'price': meal.price,
+        'per_100g': meal.per_100g,
+    }
+
+
+def plan_dict(plan) -> dict:
+    return {
+        'canteen': plan.location.shortcut,
+        'canteen_name': plan.location.nice_name,
+        'date': _date(plan),
+        'meals': [meal_dict(k, m) for k, m in (plan.meals or {}).items()],
+        'stale': plan.stale,
+        # why there are no meals without asking upstream (see opening.py), or None
+        'status': plan.status,
+    }
+
+
+def meal_records(plan):
+    """Yields one flat record per meal of the plan."""
+    canteen, date = plan.location.shortcut, _date(plan)
+    for k, m in (plan.meals or {}).items():
+        record = {'canteen': canteen, 'date': date}
+        record.update(meal_dict(k, m))
+        yield record
+
+
+def to_json(plan) -> str:
+    return json.dumps(plan_dict(plan), ensure_ascii=False)
+
+
+def to_ndjson(plan) -> str:
+    """One meal per line; plans without meals produce no lines."""
+    return '\n'.join(json.dumps(r, ensure_ascii=False) for r in meal_records(plan))
+
+
+def to_msgpack(plan) -> bytes:
+    """The plan as in ``to_json``, encoded as MessagePack (consecutive plans can be read with ``msgpack.Unpacker``)."""
+    # msgpack is only needed for this format (it is installed as dependency of CacheControl anyway)
+    import msgpack
+    return msgpack.packb(plan_dict(plan), use_bin_type=True)
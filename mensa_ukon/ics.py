@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+
+"""iCalendar feed of the plans, with one all-day event per canteen and day.
+
+The feed is updated incrementally: the content hash of each day (see ``changes``) and its rendered event are kept in
+a state file next to the feed (``<path>.state``). Only days whose meals changed are rendered again, with an
+incremented ``SEQUENCE``, and the feed is only rewritten if any event changed. It is replaced atomically, so that it
+can be served as a static file: its modification time, and the ETag derived from its content, stay the same as long
+as the plans do.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from mensa_ukon import changes
+from mensa_ukon.constants import Language
+from mensa_ukon.emojize import Emojize
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+PRODID = '-//mensa_ukon//Canteen plans//EN'
+# events of past days are kept in the feed for this many days
+KEEP_DAYS = 28
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line: str) -> str:
+    """Folds the content line into lines of at most 75 octets (RFC 5545, 3.1), without splitting characters."""
+    parts, part, size = [], '', 0
+    for c in line:
+        n = len(c.encode('utf-8'))
+        if size + n > 75:
+            parts.append(part)
+            # continuation lines start with a space
+            part, size = ' ', 1
+        part += c
+        size += n
+    parts.append(part)
+    return '\r\n'.join(parts)
+
+
+def uid(plan, language=Language.DE) -> str:
+    return '{}-{}-{}@mensa-ukon'.format(plan.location.shortcut, plan.date.strftime('%Y%m%d'), language.name.lower())
+
+
+def event(plan, language=Language.DE, sequence=0, stamp=None) -> list:
+    """The content lines of the all-day event of the plan, which must have meals."""
+    stamp = stamp or datetime.datetime.now(datetime.timezone.utc)
+    end = plan.date + datetime.timedelta(days=1)
+    description = '\n'.join('{}: {}{}'.format(m[0], m[1], Emojize.as_str(m[2])) for m in plan.meals.values())
+    return [
+        'BEGIN:VEVENT',
+        f'UID:{uid(plan, language)}',
+        'DTSTAMP:' + stamp.strftime('%Y%m%dT%H%M%SZ'),
+        'DTSTART;VALUE=DATE:' + plan.date.strftime('%Y%m%d'),
+        'DTEND;VALUE=DATE:' + end.strftime('%Y%m%d'),
+        f'SEQUENCE:{sequence}',
+        'SUMMARY:' + _escape(plan.location.nice_name),
+        'DESCRIPTION:' + _escape(description),
+        'CATEGORIES:' + ','.join(_escape(m[0]) for m in plan.meals.values()),
+        'TRANSP:TRANSPARENT',
+        'END:VEVENT',
+    ]
+
+
+def calendar(events, name='Mensa') -> bytes:
+    """The calendar of the events (lists of content lines)."""
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN',
+             'X-WR-CALNAME:' + _escape(name)]
+    for e in events:
+        lines.extend(e)
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(l) + '\r\n' for l in lines).encode('utf-8')
+
+
+def etag(content: bytes) -> str:
+    return '"{}"'.format(hashlib.sha256(content).hexdigest()[:32])
+
+
+def write_atomic(path, data: bytes):
+    """Replaces the file with the data, so that readers see either the old or the new content."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Feed(object):
+
+    def __init__(self, path, name='Mensa', keep_days=KEEP_DAYS):
+        self.path = path
+        self.name = name
+        self.keep_days = keep_days
+        self.state_path = path + '.state'
+        # uid -> {'date', 'hash', 'sequence', 'lines'}
+        self.events = {}
+        self.etag = None
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.events, self.etag = state['events'], state['etag']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            logger.warning(f'Ignoring invalid feed state {self.state_path}: {e}')
+
+    def update(self, plans, language=Language.DE, today=None) -> bool:
+        """Updates the events of the days of the plans and rewrites the feed if any changed.
+
+        Days without meals lose their event; stale plans are ignored. Returns whether the feed was rewritten.
+        """
+        changed = False
+        for plan in plans:
+            if plan.stale:
+                continue
+            key = uid(plan, language)
+            previous = self.events.get(key)
+            if not plan.meals:
+                changed |= self.events.pop(key, None) is not None
+                continue
+            content = changes.day_hash(plan.meals)
+            if previous is not None and previous['hash'] == content:
+                continue
+            sequence = 0 if previous is None else previous['sequence'] + 1
+            self.events[key] = {'date': plan.date.strftime('%Y-%m-%d'), 'hash': content, 'sequence': sequence,
+                                'lines': event(plan, language, sequence)}
+            changed = True
+
+        oldest = ((today or datetime.date.today()) - datetime.timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+        for key in [k for k, e in self.events.items() if e['date'] < oldest]:
+            del self.events[key]
+            changed = True
+
+        if not changed and self.etag is not None and os.path.exists(self.path):
+            return False
+        self.write()
+        return True
+
+    def write(self):
+        ordered = sorted(self.events.items(), key=lambda item: (item[1]['date'], item[0]))
+        content = calendar((e['lines'] for _, e in ordered), self.name)
+        write_atomic(self.path, content)
+        self.etag = etag(content)
+        state = {'etag': self.etag, 'events': self.events}
+        write_atomic(self.state_path, json.dumps(state, ensure_ascii=False).encode('utf-8'))
+        logger.info(f'Wrote {len(self.events)} events to {self.path}')
@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+
+"""Size-aware LRU caches and a report of the memory they use.
+
+Every in-process cache of the library is an ``LRUCache`` with a byte budget: when an entry would exceed the budget,
+the least recently used entries are evicted until it fits. Sizes are estimates of the objects' deep size
+(``sizeof``), computed once when an entry is stored.
+
+``report`` lists the entries and estimated bytes of all live caches, the peak RSS of the process and, if
+``tracemalloc`` is tracing (e.g. started with ``PYTHONTRACEMALLOC=1``), the lines that allocated most memory.
+It is shown by ``mensa diagnostics`` and the bot's ``/diagnostics`` command.
+"""
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from enum import Enum
+
+_caches = weakref.WeakSet()
+_caches_lock = threading.Lock()
+
+
+def sizeof(obj, _seen=None) -> int:
+    """Estimated deep size of the object in bytes; shared objects are counted once."""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    # classes and enum members are shared by everything, so they are not counted into the entries
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type, Enum)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        size += sizeof(vars(obj), seen)
+    return size
+
+
+class LRUCache(object):
+    """Thread-safe mapping that evicts the least recently used entries to stay within a byte budget."""
+
+    def __init__(self, name, max_bytes=None, max_entries=None, sizeof=sizeof):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.sizeof = sizeof
+        # key -> (value, size), least recently used first
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        with _caches_lock:
+            _caches.add(self)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(key) + self.sizeof(value)
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # would evict everything else and still not fit
+                self.evictions += 1
+                return
+            self._data[key] = (value, size)
+            self.bytes += size
+            while ((self.max_bytes is not None and self.bytes > self.max_bytes)
+                   or (self.max_entries is not None and len(self._data) > self.max_entries)):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    __setitem__ = set
+
+    def _discard(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+        return entry
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._discard(key)
+        return default if entry is None else entry[0]
+
+    def pop_if(self, key, value) -> bool:
+        """Removes the entry only if its value still is ``value`` (not just equal), e.g. the one seen to be expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] is not value:
+                return False
+            self._discard(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {'name': self.name, 'entries': len(self), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions}
+
+
+def stats() -> list:
+    """Statistics of all live caches, sorted by name."""
+    with _caches_lock:
+        caches = list(_caches)
+    return sorted((c.stats() for c in caches), key=lambda s: s['name'])
+
+
+def _mib(n):
+    return '{:.1f} MiB'.format(n / 2 ** 20)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the process in bytes, or 0 if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def report(top=10) -> str:
+    """Human readable report of the caches, the peak RSS and the top allocators."""
+    import tracemalloc
+
+    lines = ['{:<28} {:>8} {:>12} {:>12} {:>9}'.format('cache', 'entries', 'bytes', 'budget', 'evicted')]
+    total = 0
+    for s in stats():
+        total += s['bytes']
+        lines.append('{name:<28} {entries:>8} {bytes:>12} {budget:>12} {evictions:>9}'.format(
+            budget='-' if s['max_bytes'] is None else s['max_bytes'], **s))
+    lines.append('')
+    lines.append(f'caches total: {_mib(total)}')
+    lines.append(f'peak RSS:     {_mib(peak_rss())}')
+
+    if not tracemalloc.is_tracing():
+        lines.append('tracemalloc is not tracing (set PYTHONTRACEMALLOC=1 to see the top allocators)')
+        return '\n'.join(lines)
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f'traced:       {_mib(current)} (peak {_mib(peak)})')
+    lines.append('')
+    lines.append(f'top {top} allocators:')
+    for stat in tracemalloc.take_snapshot().statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        lines.append('{:>10} {:>8}  {}:{}'.format(_mib(stat.size), stat.count, frame.filename, frame.lineno))
+    return '\n'.join(lines)
@@ -1,40 +1,66 @@
 #! /usr/bin/env python
 
 """Mensa class"""
+import json
 import logging
 import re
-from collections import OrderedDict, namedtuple
+import time
+from collections import OrderedDict
 
 import pendulum
-from bs4 import BeautifulSoup
 from cachecontrol import CacheControlAdapter
+from cachecontrol.cache import BaseCache
 from cachecontrol.heuristics import ExpiresAfter
 from requests_html import HTMLSession
 
-from mensa_ukon.constants import CANTEENS, Language
+from mensa_ukon import changes, memory, opening, parsers, settings, sources, upstream
+from mensa_ukon.constants import CANTEENS, Language, Meal, Plan
+from mensa_ukon.cache import CacheError
 from mensa_ukon.emojize import Emojize
+from mensa_ukon.formats import plan_dict
 from mensa_ukon.settings import TIMEZONE
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# "1,20 €", "5,90 Euro" (and the occasional "Eruo")
+_PRICE = re.compile(r'(\d+),(\d{2})\s*(?:€|EUR|E[ru]{2}o)')
+_STUDENT_PRICE = re.compile(_PRICE.pattern + r'\s*(?:Studierende|Students)')
+_PRICE_PER_100G = re.compile(r'100\s*g\s*/\s*' + _PRICE.pattern)
 
 
-# Location, dict
-Plan = namedtuple('Plan', ['location', 'meals'])
+class HttpCache(BaseCache):
+    """Storage of CacheControl in a size-bounded LRU (instead of its unbounded dict)."""
+
+    def __init__(self, name, max_bytes):
+        self.lru = memory.LRUCache(name, max_bytes)
+
+    def get(self, key):
+        return self.lru.get(key)
+
+    def set(self, key, value, expires=None):
+        self.lru.set(key, value)
+
+    def delete(self, key):
+        self.lru.pop(key)
+
 
 class MensaBase(object):
 
-    def __init__(self, endpoints, location):
+    def __init__(self, endpoints, location, source=None):
         """Constructor."""
         self.location = location
         # dict of language specific endpoints
         # { Language : url-string }
         self.endpoints = endpoints
+        # where the meals come from (default: settings.SOURCE), see mensa_ukon/sources.py
+        self.source = sources.get(source)(self)
 
-        adapter = CacheControlAdapter(heuristic=ExpiresAfter(days=1))
+        adapter = CacheControlAdapter(cache=HttpCache(f'http:{location.shortcut}', settings.HTTP_CACHE_BYTES),
+                                      heuristic=ExpiresAfter(days=1))
         self.session = HTMLSession()
         self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def retrieve(self, datum=None, language=None, meals=None, emojize=None) -> Plan:
         # overwrite this
@@ -42,16 +68,11 @@ class MensaBase(object):
         # In Java terms: abstract class -> two implementation classes
         pass
 
-    # Helper method to make a language-specific request
+    # Helper method to make a language-specific request, raises upstream.UpstreamError if it fails
     def do_request(self, language=Language.DE):
         url = self.endpoints[language.name]
         logger.debug(f'Retrieving url: {url}')
-        resp = self.session.get(url)
-        code = resp.status_code
-        if code != 200:
-            logger.warning(f'Non-200 status: {code}')
-        logger.debug(f'Status Code: {code}')
-        return resp.html
+        return upstream.request(self.session, 'GET', url).html
 
     @staticmethod
     def _normalize_key(k: str) -> str:
@@ -77,20 +98,51 @@ class MensaBase(object):
     def _text_replace(text: str) -> str:
         return re.sub('Züricher', "Zürcher", text)
 
+    @staticmethod
+    def _parse_price(prices, title):
+        """The price for students in cents and whether it is per 100g, or ``(None, False)``.
+
+        The price comes from the prices of the meal (``3,10 € Studierende | 3,80 € Schüler | ...``). Meals without
+        them may name a price in the title instead: per 100g (``100g / 1,20 Euro``) or one for everyone (``5,90 Euro``).
+        """
+        if prices:
+            match = _STUDENT_PRICE.search(prices) or _PRICE.search(prices)
+            if match:
+                return int(match.group(1)) * 100 + int(match.group(2)), False
+        for pattern, per_100g in ((_PRICE_PER_100G, True), (_PRICE, False)):
+            match = pattern.search(title)
+            if match:
+                return int(match.group(1)) * 100 + int(match.group(2)), per_100g
+        return None, False
+
 class Mensa(MensaBase):
 
-    def __init__(self, location):
+    def __init__(self, location, parser=None, source=None, cache=None):
         logger.info(f'Canteen is {location}')
         location = CANTEENS[location]
 
-        endpoints = { Language.DE.name : 'https://www.seezeit.com/essen/speiseplaene/{}/'.format(location.key),
-                      Language.EN.name : 'https://www.seezeit.com/en/food/menus/{}/'.format(location.key.replace('mensa-', '') + '-canteen')
+        base = settings.SEEZEIT_URL
+        endpoints = { Language.DE.name : '{}/essen/speiseplaene/{}/'.format(base, location.key),
+                      Language.EN.name : '{}/en/food/menus/{}/'.format(base, location.key.replace('mensa-', '') + '-canteen')
                     }
 
-        super(Mensa, self).__init__(endpoints, location)
+        super(Mensa, self).__init__(endpoints, location, source)
+
+        # HTML parser backend (default: settings.PARSER)
+        self.parser = parsers.get(parser)
+
+        # Parsing is the expensive part of a lookup, so the result for the last page of each language is kept.
+        # language name -> (page html, date tab labels, parsed days)
+        self._parsed = memory.LRUCache(f'parsed:{location.shortcut}', settings.PARSED_CACHE_BYTES)
+        # called with the language and the list of DayDiffs when a page changed since it was parsed last
+        self.change_listeners = []
+        # cache of parsed plans shared with other processes (see mensa_ukon/cache.py), or None
+        self.cache = cache
+        # days known to have no plan, learned from the date tabs of the pages as long as plans are cached
+        self.calendar = opening.OpeningCalendar(location, settings.CACHE_TTL)
 
     @staticmethod
-    def _get_requested_day_index(date_tabs, datum, language):
+    def _get_requested_day_index(date_labels, datum, language):
         # Locale is unused until the English website stops using the German date format...
         # TODO: revisit this issue
         # locale =  language
@@ -99,8 +151,7 @@ class Mensa(MensaBase):
         for locale in [Language.DE, Language.EN]:
             datum_fmt = datum.format(language.date_fmt, locale=locale.name)
             logger.debug('Datum format: %s', datum_fmt)
-            for i, t in enumerate(date_tabs):
-                text = str(t.full_text).strip()
+            for i, text in enumerate(date_labels):
                 if text == datum_fmt:
                     return i
         logger.debug('Day not found.')
@@ -112,55 +163,122 @@ class Mensa(MensaBase):
         if not html:
             html = self.do_request(language).html
 
-        tabs = list(Mensa._tabs(html))
-        num_tabs = len(tabs)
+        days = list(self._iter_plan(html))
+        num_tabs = len(days)
         # one tab for each day open
         if num_tabs != self.location.days_open:
             logger.error(f"Could not find {self.location.days_open} tabs: {num_tabs}")
-
-        days = []
-        for t in tabs:
-            days.append(self._meals(t))
         return days
 
+    def _iter_plan(self, html):
+        """Yields the meals of each day tab as soon as the tab is parsed."""
+        return self._iter_days(self.parser.document(html))
+
+    def _iter_days(self, document):
+        for t in self.parser.tabs(document):
+            yield self._meals(t)
+
+    # The extraction helpers take the parser backend the elements come from (default: settings.PARSER)
+
+    @staticmethod
+    def _tabs(html, parser=None):
+        parser = parsers.get(parser)
+        return parser.tabs(parser.document(html))
+
     @staticmethod
-    def _tabs(html):
-        soup = BeautifulSoup(html, 'html5lib')
-        for tab in soup.find_all('div', id=re.compile("^tab\d+")):
-            yield tab
+    def _meal_title(meal, parser=None):
+        return MensaBase._strip_additives(parsers.get(parser).meal_title(meal))
 
     @staticmethod
-    def _meal_title(meal):
-        return MensaBase._strip_additives(meal.find('div', class_='title').text)
+    def _meal_category(meal, parser=None):
+        return parsers.get(parser).meal_category(meal)
 
     @staticmethod
-    def _meal_category(meal):
-        return meal.find('div', class_='category').text
+    def _meal_price(meal, title, parser=None):
+        return MensaBase._parse_price(parsers.get(parser).meal_price(meal), title)
 
     @staticmethod
-    def _meal_icons(meal):
+    def _meal_icons(meal, parser=None):
         emoji = []
-        icons = meal.find_all('div', class_='speiseplanTagKatIcon')
-        for icon in icons:
-            for i in icon.get('class', []):
-                if i != 'speiseplanTagKatIcon':
-                    e = Emojize.replace_type(i.strip())
-                    if e != '':
-                        emoji.append(e)
+        for i in parsers.get(parser).meal_icon_classes(meal):
+            if i != 'speiseplanTagKatIcon':
+                e = Emojize.replace_type(i.strip())
+                if e != '':
+                    emoji.append(e)
         return emoji
 
     def _meals(self, tab):
-        meals = tab.find_all('div', class_='speiseplanTagKat')
-        day = OrderedDict()
+        meals = self.parser.meals(tab)
+        day = []
         for m in meals:
-            title = Mensa._meal_title(m)
-            category = Mensa._meal_category(m)
-            icons = Mensa._meal_icons(m)
+            title = Mensa._meal_title(m, self.parser)
+            category = Mensa._meal_category(m, self.parser)
+            icons = Mensa._meal_icons(m, self.parser)
+            price, per_100g = Mensa._meal_price(m, title, self.parser)
 
             normalized_category = self._normalize_key(category)
             clean_text = self._text_replace(self._clean_text(title.strip()))
-            day[normalized_category] = (category, clean_text, icons)
-        return day
+            day.append((normalized_category, Meal(category, clean_text, icons, price, per_100g)))
+        return changes.Day(day)
+
+    @staticmethod
+    def _date_labels(html, parser=None):
+        parser = parsers.get(parser)
+        return parser.date_labels(parser.document(html))
+
+    def _parse_page(self, html, language):
+        """Returns the date labels and an iterator over the parsed days of the page.
+
+        If the page did not change since it was parsed last (e.g. it came from the HTTP cache), the previous
+        result is reused. Otherwise the days are parsed while they are iterated, and remembered once all are parsed.
+        """
+        text = html.html
+        cached = self._parsed.get(language.name)
+        if cached is not None and cached[0] == text:
+            return cached[1], iter(cached[2])
+        document = self.parser.document(text)
+        labels = self.parser.date_labels(document)
+        return labels, self._parse_days(text, document, labels, language)
+
+    def _parse_latest(self, language):
+        """Requests and parses the page like ``_parse_page``; returns the page text, labels, days and staleness.
+
+        If upstream fails, the last good parse of the page is returned as stale (or the error raised if there is none).
+        """
+        try:
+            html = self.do_request(language)
+        except upstream.UpstreamError as e:
+            cached = self._parsed.get(language.name)
+            if cached is None:
+                raise
+            logger.warning(f'Serving stale plan of {self.location} ({language.name}): {e}')
+            return cached[0], cached[1], iter(cached[2]), True
+        labels, days = self._parse_page(html, language)
+        self.calendar.saw(labels)
+        return html.html, labels, days, False
+
+    def _parse_days(self, text, document, labels, language):
+        days = []
+        for day in self._iter_days(document):
+            days.append(day)
+            yield day
+        # one tab for each day open
+        if len(days) != self.location.days_open:
+            logger.error(f"Could not find {self.location.days_open} tabs: {len(days)}")
+        previous = self._parsed.get(language.name)
+        self._parsed[language.name] = (text, labels, days)
+        if previous is not None:
+            diffs = changes.diff(previous[1], previous[2], labels, days)
+            if diffs:
+                logger.info(f'Plan of {self.location} ({language.name}) changed: {diffs}')
+                for listener in self.change_listeners:
+                    listener(language, diffs)
+
+    def _filter_meals(self, meals, filter_meal):
+        if meals and filter_meal:
+            filter_meal_key = self._normalize_key(filter_meal)
+            meals = { k:v for k,v in  meals.items() if filter_meal_key in k }
+        return meals if meals else None
 
     # how to specify tz for pendulum.today?
     def _retrieve(self, html, datum, language, filter_meal, emojize) -> Plan:
@@ -172,29 +290,95 @@ class Mensa(MensaBase):
         # current and next week
         # [Mo-Fr/Sa] [Mo-Fr/Sa]
 
-        # TODO convert to BS4
-        date_tabs = html.xpath('//div[@class="tx-speiseplan"]/div[@class="tabs"]/a')
+        date_labels, days = self._parse_page(html, language)
 
-        day_idx = self._get_requested_day_index(date_tabs, datum, language)
+        day_idx = self._get_requested_day_index(date_labels, datum, language)
 
         if day_idx is None:
             # no meals for specified day
             logger.debug('No meal for specified day')
-            return Plan(self.location, None)
+            return Plan(self.location, None, datum)
 
         logger.debug('Meals for date {}'.format(datum))
 
-        meals = self._retrieve_plan(html=html.html, emojize=emojize)[day_idx]
+        meals = list(days)[day_idx]
 
-        if filter_meal:
-            filter_meal_key = self._normalize_key(filter_meal)
-            meals = { k:v for k,v in  meals.items() if filter_meal_key in k }
-
-        return Plan(self.location, meals if len(meals) > 0 else None)
+        return Plan(self.location, self._filter_meals(meals, filter_meal), datum)
 
     def retrieve(self, datum=None, language=Language.DE, filter_meal=None, emojize=True) -> Plan:
         if not datum:
             datum = pendulum.today(tz=TIMEZONE)
             logger.debug('No explicit date given, using today.')
-        html = self.do_request(language)
-        return self._retrieve(html, datum, language, filter_meal, emojize)
+        return next(self.retrieve_days(datum, 1, language, filter_meal))
+
+    def retrieve_days(self, datum=None, days=1, language=Language.DE, filter_meal=None):
+        """Yields the plans for ``days`` consecutive days starting at ``datum``.
+
+        Each plan is yielded as soon as its day is parsed; how much is requested up front depends on the source.
+        """
+        if not datum:
+            datum = pendulum.today(tz=TIMEZONE)
+        # answered without upstream if no requested day can have a plan (e.g. a sunday, or beyond the published weeks)
+        statuses = [self.calendar.status(datum.add(days=offset)) for offset in range(days)]
+        if all(statuses):
+            logger.debug(f'No plans for {days} days from {datum} at {self.location}: {statuses}')
+            for offset, status in enumerate(statuses):
+                yield Plan(self.location, None, datum.add(days=offset), status=status)
+            return
+        if self.cache is not None:
+            plans = self._cached_plans(datum, days, language)
+            if plans is not None:
+                for plan in plans:
+                    yield plan._replace(meals=self._filter_meals(plan.meals, filter_meal))
+                return
+        for day, meals, stale in self.source.days(datum, days, language):
+            yield Plan(self.location, self._filter_meals(meals, filter_meal), day, stale)
+
+    def _plan_key(self, day, language):
+        return 'mensa:plan:{}:{}:{}'.format(self.location.shortcut, language.name, day.strftime('%Y-%m-%d'))
+
+    def _cached_plans(self, datum, days, language):
+        """Returns the (unfiltered) plans from the shared cache, refreshing them from upstream if any is missing.
+
+        Only one process refreshes the plans of a canteen and language at a time, the others wait for the result.
+        Returns ``None`` if the cache cannot be used.
+        """
+        from mensa_ukon.daemon import plan_from_dict
+        dates = [datum.add(days=offset) for offset in range(days)]
+        keys = [self._plan_key(d, language) for d in dates]
+        lock = 'mensa:lock:{}:{}'.format(self.location.shortcut, language.name)
+        deadline = time.monotonic() + settings.DEADLINE
+
+        def cached():
+            values = self.cache.get_many(keys)
+            if None not in values:
+                return [plan_from_dict(json.loads(v))._replace(date=d) for d, v in zip(dates, values)]
+
+        try:
+            while time.monotonic() < deadline:
+                plans = cached()
+                if plans is not None:
+                    return plans
+                token = self.cache.acquire(lock, settings.DEADLINE)
+                if token is not None:
+                    try:
+                        # another process may have refreshed them since the lookup above
+                        return cached() or self._refresh_cache(datum, days, language)
+                    finally:
+                        self.cache.release(lock, token)
+                time.sleep(0.05)
+            logger.warning(f'Gave up waiting for the plans of {self.location} to be refreshed')
+        except CacheError as e:
+            logger.warning(f'Cache unavailable: {e}')
+        return None
+
+    def _refresh_cache(self, datum, days, language):
+        # retrieving a page gives more days than requested, so all of them are cached
+        lead, total = self.source.span(datum, days)
+        plans = [Plan(self.location, meals, day, stale)
+                 for day, meals, stale in self.source.days(datum.subtract(days=lead), total, language)]
+        items = {self._plan_key(p.date, language): json.dumps(plan_dict(p)).encode('utf-8')
+                 for p in plans if not p.stale}
+        if items:
+            self.cache.set_many(items, settings.CACHE_TTL)
+        return plans[lead:lead + days]
@@ -9,12 +9,15 @@ import telegram
 from telegram import ChatAction, Update
 from telegram.error import (ChatMigrated, Conflict, InvalidToken, NetworkError,
                             TelegramError, TimedOut, Unauthorized)
-from telegram.ext import (CallbackContext, CommandHandler, Filters,
+from telegram.ext import (CallbackContext, CommandHandler, DispatcherHandlerStop, Filters,
                           MessageHandler, Updater)
 
-from mensa_ukon import Mensa, settings
-from mensa_ukon.constants import Language
+from mensa_ukon import Mensa, memory, opening, preferences, profiling, settings
+from mensa_ukon.admission import Admission
+from mensa_ukon.cache import CacheError, open_cache
+from mensa_ukon.constants import CANTEENS, Language, Preferences
 from mensa_ukon.emojize import Emojize
+from mensa_ukon.upstream import UpstreamError
 
 
 class BotError(Exception):
@@ -45,8 +48,11 @@ class BotConfigurationError(BotError):
         super(BotConfigurationError, self).__init__('Error configuring bot: \'{}\'.'.format(msg))
 
 
-class MensaBot(telegram.Bot):
+class MensaReplies(object):
+    """Commands and reply texts of the bot, independent of how updates are received and answered.
 
+    Shared by the threaded ``MensaBot`` and the asyncio ``AsyncMensaBot`` (see ``mensa_ukon/aiobot.py``).
+    """
 
     CMDShortcut = namedtuple('CMDShortcut', ['command', 'meal', 'location', 'short_help'])
     SHORTCUTS = [
@@ -61,6 +67,16 @@ class MensaBot(telegram.Bot):
         CMDShortcut('wok', 'wok', 'giessberg', 'Show wok'),
     ]
 
+    # shed first when the bot is busy
+    LOW_PRIORITY = ('start', 'help', 'news')
+
+    # why a day has no plan (see mensa_ukon/opening.py): German and English reply, followed by the date
+    NO_PLAN = {
+        opening.CLOSED: ('Die Mensa ist geschlossen am', 'The canteen is closed on'),
+        opening.UNPUBLISHED: ('Noch kein Speiseplan veröffentlicht für', 'No plan published yet for'),
+        opening.EXPIRED: ('Kein Speiseplan mehr verfügbar für', 'No plan available anymore for'),
+    }
+
     GREETING = ('🤖Hello, human!\n'
                 'I am a bot to retrieve the culinary offerings of Uni Konstanz\' canteen. '
                 'I can understand several date formats like \'today\', \'tomorrow\' and ones '
@@ -74,6 +90,22 @@ class MensaBot(telegram.Bot):
     DATE_HELP = '\[<date>] get what offerings are waiting for you at the specified date ' \
                 'formatted like \'YYYY-MM-DD\'.'
 
+    SINGLE_DATE = 'Give me a single date to fetch meals for.'
+    UNKNOWN_DATE = 'Sorry, I do not understand the date you gave me: {}'
+    USAGE = '\n*Usage:* /mensa [<date>]\ne.g. /mensa 2017-01-01'
+    UNREACHABLE = 'Sorry, the canteen plan is currently unreachable. Please try again later.'
+    UNKNOWN_COMMAND = 'Sorry, I do not understand this command.'
+    ERROR = 'Unfortunately, there was an error 😵. Please try again later or file an Issue on GitHub.'
+
+    SETTINGS_HELP = '[<setting> <value>] show or change your defaults for this chat.'
+    SETTINGS_USAGE = ('*Usage:*\n'
+                      '/settings canteen {}|default\n'
+                      '/settings language de|en|default\n'
+                      '/settings diet {}|none\n'
+                      '/settings exclude <{}>…|none\n'
+                      '/settings reset').format('|'.join(CANTEENS), '|'.join(preferences.DIETS),
+                                                '|'.join(preferences.INGREDIENTS))
+
     EXAMPLES = ' \n\n' \
                '*Examples:*\n' \
                '/mensa tomorrow\n' \
@@ -85,17 +117,221 @@ class MensaBot(telegram.Bot):
             raise BotConfigurationError('Missing bot token.')
         return settings.TOKEN
 
-    def __init__(self):
-        # TODO fix settings module needing import before MensaBot init...
-        super(MensaBot, self).__init__(MensaBot._token())
+    def _setup(self):
         self.logger = logging.getLogger(__name__)
         self.logger.debug('Setting up bot...')
 
         # remember commands for easy help text
         self.my_commands = []
-        self.mensa = Mensa(location=settings.CANTEEN)
+        # plans and replies are cached in a backend that all processes of the bot can share
+        self.cache = open_cache(settings.CACHE)
+        self.mensa = Mensa(location=settings.CANTEEN, source=settings.BOT_SOURCE, cache=self.cache)
+        # further canteens are set up when a chat asks for them
+        self._mensas = {settings.CANTEEN: self.mensa}
+        self.preferences = preferences.PreferenceStore()
+        self.admission = Admission(settings.DUPLICATE_WINDOW, settings.SHED_BACKLOG, self.LOW_PRIORITY)
+
+        # A missing news file should not bring the bot to a crash
+        # so if there are no news, the command is not present.
+        # This might also happen if we run a script directly, so that the working directory is not
+        # as expected.
+        self._news_content = None
+        try:
+            with open('news.md') as f:
+                self._news_content = f.read()
+        except IOError as e:
+            self.logger.warning(e)
+
+
+    @staticmethod
+    def _format_date_relative(date, language=Language.DE):
+        is_de = language == Language.DE
+        today = pendulum.today(tz=settings.TIMEZONE)
+        if date == today:
+            return 'Heute' if is_de else 'Today'
+        elif date.diff(today).in_days() == 1:
+            return 'Morgen' if is_de else 'Tomorrow'
+        else:
+            loc = 'de' if is_de else 'en'
+            return date.diff_for_humans(locale=loc)
+
+
+    @staticmethod
+    def _parse_datum(date_string : str, fallback_func=None) -> pendulum.date:
+        d = date_string.lower().strip()
+        if d in ['today', 'heute']:
+            return pendulum.today(tz=settings.TIMEZONE)
+        if d in ['tomorrow', 'morgen']:
+            return pendulum.tomorrow(tz=settings.TIMEZONE)
+
+        # the fallback function is only used when it's defined and parsing fails
+        # its resulting value will still be "validated" later
+        try:
+            date = pendulum.parse(date_string, tz=settings.TIMEZONE)
+        except pendulum.parsing.exceptions.ParserError as e:
+            if fallback_func:
+                date = fallback_func(tz=settings.TIMEZONE)
+            else:
+                raise e
+
+        # we currently do not support lookup for past dates in bot query parameters
+        today = pendulum.today(tz=settings.TIMEZONE)
+        if today > date:
+            raise pendulum.parsing.exceptions.ParserError('No past dates allowed.')
+        return date
+
+
+    def _mensa_for(self, canteen):
+        if canteen not in self._mensas:
+            self._mensas[canteen] = Mensa(location=canteen, source=settings.BOT_SOURCE, cache=self.cache)
+        return self._mensas[canteen]
+
+
+    @staticmethod
+    def _changed_preferences(prefs: Preferences, args) -> Preferences:
+        """Applies a /settings command to the preferences; raises ``ArgumentError`` for invalid ones."""
+        if args == ['reset']:
+            return Preferences()
+        if len(args) < 2:
+            raise ArgumentError(' '.join(args))
+        name, values = args[0].lower(), [v.lower() for v in args[1:]]
+        value = values[0]
+        if name == 'canteen' and len(values) == 1 and (value in CANTEENS or value == 'default'):
+            return prefs._replace(canteen=None if value == 'default' else value)
+        if name == 'language' and len(values) == 1 and value in ('de', 'en', 'default'):
+            return prefs._replace(language=None if value == 'default' else Language[value.upper()])
+        if name == 'diet' and len(values) == 1 and (value in preferences.DIETS or value == 'none'):
+            return prefs._replace(diet=None if value == 'none' else value)
+        if name == 'exclude' and (values == ['none'] or set(values) <= set(preferences.INGREDIENTS)):
+            return prefs._replace(exclude=() if values == ['none'] else tuple(sorted(set(values))))
+        raise ArgumentError(' '.join(args))
+
+
+    def _settings_text(self, chat_id, args):
+        prefs = self.preferences.get(chat_id)
+        if args:
+            try:
+                prefs = self._changed_preferences(prefs, args)
+            except ArgumentError as e:
+                self.logger.info(e)
+                return self.SETTINGS_USAGE
+            self.preferences.set(chat_id, prefs)
+        canteen = CANTEENS[prefs.canteen or settings.CANTEEN]
+        return ('⚙️ *Settings of this chat*\n'
+                f'Canteen: {canteen.nice_name} ({canteen.shortcut})\n'
+                f'Language: {prefs.language.name if prefs.language else "default"}\n'
+                f'Diet: {prefs.diet or "none"}\n'
+                f'Excluded: {", ".join(prefs.exclude) or "none"}\n\n' + self.SETTINGS_USAGE)
+
+
+    def _profiled(self, func, name):
+        """The function, with the fraction ``PTB_PROFILE_SAMPLE_RATE`` of its calls profiled."""
+        return profiling.sampled(func, settings.PROFILE_SAMPLE_RATE, settings.PROFILE_DIR, settings.PROFILE_FORMAT,
+                                 name)
+
+
+    def _diagnostics_text(self, chat_id):
+        """The memory report for the chats of the maintainers (``PTB_NOTIFY_CHAT_IDS``), ``None`` for others."""
+        if chat_id not in settings.NOTIFY_CHATS:
+            return None
+        admission = self.admission.stats()
+        return ('```\n' + memory.report() + '\n\n'
+                'commands pending: {backlog}, duplicates: {duplicate}, shed: {shed}'.format(**admission) + '\n```')
+
+
+    def _without_upstream(self, date, canteen=None):
+        """Whether the day is known to have no plan, so that the reply is ready without asking upstream."""
+        return self._mensa_for(canteen or settings.CANTEEN).calendar.status(date) is not None
+
+
+    def _plan_request(self, args, language):
+        """The date and language a plan command asks for; raises ``ParserError`` for unknown dates."""
+        if len(args) == 0:
+            return pendulum.today(settings.TIMEZONE), language
+        self.logger.debug(args)
+        date = self._parse_datum(args[0])
+        # experimental feature: overwrite language when given english instructions
+        if args[0].lower() in ['today', 'tomorrow']:
+            language = Language.EN
+        return date, language
+
+
+    @staticmethod
+    def _str_for_single_meal(bot, meals: dict, meal: str) -> str:
+        try:
+            return '*{0}:* {1}'.format(*meals[Mensa._normalize_key(meal)])
+        except KeyError:
+            # meal not present
+            bot.logger.error(meal)
+            bot.logger.error(meals)
+            pass
+        raise NoMealError(meal)
+
+
+    def _print_commands(self):
+        # we want to print both commands for the bot, as well as commands to get meals
+        return "\n".join(map(lambda c: '/' + c[0] + ' ' + c[1], self.my_commands)) \
+               + '\n' \
+               + "\n".join(map(lambda c: '/' + c.command + ' ' + c.short_help, [short for short in self.SHORTCUTS if settings.CANTEEN == short.location]))
+
+
+    def _msg_text_for_meals(self, date, plan, language=Language.DE):
+        msg_text = f'🍴 {plan.location.nice_name} – 🕛 *' + MensaBot._format_date_relative(date, language).title() + '*\n\n'
+        self.logger.debug('Preparing menu...')
+        if plan.meals is not None:
+            msg_text += ''.join(['*{0}{1}:* {2}\n'.format(l[0], Emojize.as_str(l[2]), l[1]) for l in plan.meals.values()]) + '\n'
+        elif plan.status in self.NO_PLAN:
+            date_str = date.format('dddd, DD. MMMM YYYY', locale=language.name)
+            msg_text += self.NO_PLAN[plan.status][0 if language == Language.DE else 1] + f' {date_str}.\n'
+        else:
+            # TODO full localization
+            date_str = date.format('dddd, DD. MMMM YYYY', locale=language.name)
+            msg_text += ('Keine Speisen gefunden für' if language == Language.DE else 'No meals found for') \
+                        + f' {date_str} 😭\n'
+        if plan.stale:
+            msg_text += '_' + ('Der Speiseplan ist gerade nicht erreichbar, die Angaben sind eventuell veraltet.'
+                               if language == Language.DE else
+                               'The canteen plan is currently unreachable, this information may be outdated.') + '_\n'
+        return msg_text
+
+
+    def _reply_text(self, date, language, filter_meal, canteen=None, prefs=Preferences()):
+        canteen = canteen or settings.CANTEEN
+        # the reply mentions today/tomorrow, so it also depends on the current day
+        key = 'mensa:reply:{}:{}:{}:{}:{}:{}:{}'.format(canteen, language.name, date.to_date_string(), filter_meal or '',
+                                                        prefs.diet or '', ','.join(prefs.exclude),
+                                                        pendulum.today(settings.TIMEZONE).to_date_string())
+        try:
+            cached = self.cache.get(key)
+        except CacheError as e:
+            self.logger.warning(e)
+            cached = None
+        if cached is not None:
+            return cached.decode('utf-8')
+
+        # dict of meals
+        plan = self._mensa_for(canteen).retrieve(date, language=language, filter_meal=filter_meal)
+        self.logger.debug('Retrieved meal plan.')
+        plan = plan._replace(meals=preferences.filter_meals(plan.meals, prefs.diet, prefs.exclude))
+        msg_text = self._msg_text_for_meals(date, plan, language=language)
+        if not plan.stale:
+            try:
+                self.cache.set(key, msg_text.encode('utf-8'), settings.CACHE_TTL)
+            except CacheError as e:
+                self.logger.warning(e)
+        return msg_text
+
+
+class MensaBot(MensaReplies, telegram.Bot):
 
-        self.updater = Updater(settings.TOKEN, workers=settings.WORKERS, use_context=True)
+    def __init__(self):
+        # TODO fix settings module needing import before MensaBot init...
+        super(MensaBot, self).__init__(MensaBot._token(), base_url=settings.BASE_URL)
+        self._setup()
+        # profiles cover the whole lookup, including the requests to Telegram
+        self._mensa_plan = self._profiled(self._mensa_plan, 'mensa_plan')
+
+        self.updater = Updater(settings.TOKEN, base_url=settings.BASE_URL, workers=settings.WORKERS, use_context=True)
         self.dp = self.updater.dispatcher
 
         #self.dp.add_handler(CommandHandler('inline', self._inline_test))
@@ -104,24 +340,22 @@ class MensaBot(telegram.Bot):
         # self.dp.add_handler(InlineQueryHandler(self._inlinequery))
 
         # Custom command handlers
+        # decides on every command before it is handed to the workers
+        self.dp.add_handler(MessageHandler(Filters.command, self._admit), group=-1)
+
         self._add_bot_command('start', self._start, 'start bot')
         self._add_bot_command('help', self._bot_help, 'display help message')
 
-        # A missing news file should not bring the bot to a crash
-        # so if there are no news, the command is not present.
-        # This might also happen if we run a script directly, so that the working directory is not
-        # as expected.
-        try:
-            with open('news.md') as f:
-                self._news_content = f.read()
-                self._add_bot_command('news', self._news, 'display bot news')
-        except IOError as e:
-            self.logger.warning(e)
+        if self._news_content is not None:
+            self._add_bot_command('news', self._news, 'display bot news')
 
         self._add_bot_command('mensa', lambda update, context: self._mensa_plan(update, args=context.args),
                               self.DATE_HELP, pass_args=True)
         self._add_bot_command('mensaEN', lambda update, context: self._mensa_plan(update, language=Language.EN, args=context.args),
                               self.DATE_HELP, pass_args=True)
+        self._add_bot_command('settings', self._settings, self.SETTINGS_HELP, pass_args=True)
+        # not listed in the help, only answered for the maintainers
+        self.dp.add_handler(CommandHandler('diagnostics', self._handled(self._diagnostics), run_async=True))
 
         # shortcuts to direct offers for configured locations
         for cmd in self.SHORTCUTS:
@@ -129,7 +363,7 @@ class MensaBot(telegram.Bot):
                 self._add_meal_command(cmd)
 
         self.dp.add_error_handler(MensaBot._error)
-        self.dp.add_handler(MessageHandler(Filters.command, self._unknown_command))
+        self.dp.add_handler(MessageHandler(Filters.command, self._handled(self._unknown_command)))
 
     @staticmethod
     def _error(update: Update, context: CallbackContext):
@@ -157,13 +391,32 @@ class MensaBot(telegram.Bot):
             update.effective_message.reply_text('Unfortunately, Telegram does not allow me to do that!', quote=True)
         except Exception as e:
             context.bot.logger.error("Some other error (%s) occurred: %s", type(e), e)
-            update.effective_message.reply_text('Unfortunately, there was an error 😵. Please try again later or file an Issue on GitHub.', quote=True)
+            update.effective_message.reply_text(MensaBot.ERROR, quote=True)
             raise e
 
 
+    def _admit(self, update: Update, context: CallbackContext):
+        """Stops the handling of duplicate commands, and of low-priority ones while the workers are busy."""
+        words = update.effective_message.text.split()
+        command = words[0][1:].partition('@')[0]
+        if self.admission.admit(update.effective_chat.id, command, words[1:]) is not None:
+            raise DispatcherHandlerStop()
+
+
+    def _handled(self, callback):
+        """The callback, telling the admission when the command was handled."""
+        # every command that passes _admit reaches exactly one callback, at least the one for unknown commands
+        def handle(update: Update, context: CallbackContext):
+            try:
+                return callback(update, context)
+            finally:
+                self.admission.done()
+        return handle
+
+
     def _unknown_command(self, update: Update, context: CallbackContext):
         self.logger.info('Received unknown command: %s', update.effective_message.text)
-        update.effective_message.reply_text('Sorry, I do not understand this command.', quote=True)
+        update.effective_message.reply_text(self.UNKNOWN_COMMAND, quote=True)
 
 
     def run(self):
@@ -171,6 +424,7 @@ class MensaBot(telegram.Bot):
             self.logger.info('Bot running with polling enabled.')
             self.updater.start_polling()
             self.updater.idle()
+            self.preferences.close()
         else:
             if settings.IS_HEROKU:
                 # https://github.com/python-telegram-bot/python-telegram-bot/wiki/Webhooks#heroku
@@ -194,6 +448,7 @@ class MensaBot(telegram.Bot):
             # don't leak token into logs
             self.logger.info('Bot running with webhook on %s', webhook_url.replace(settings.TOKEN, '***TOKEN_OMITTED***'))
             self.updater.idle()
+            self.preferences.close()
 
 
     def _add_bot_command(self, command_text, command, help_info, pass_args=False):
@@ -201,63 +456,29 @@ class MensaBot(telegram.Bot):
         # so we will add both variants internally bot not report them in the help menu
         # command = lambda bot, update, args: command(update, args=args)
         for c_text in [command_text, command_text.capitalize()]:
-            self.dp.add_handler(CommandHandler(c_text, command, run_async=True, pass_args=pass_args))
+            self.dp.add_handler(CommandHandler(c_text, self._handled(command), run_async=True, pass_args=pass_args))
         self.my_commands.append((command_text, help_info))
 
 
     def _add_meal_command(self, cmd_shortcut):
         for s in [cmd_shortcut.command, cmd_shortcut.command.capitalize()]:
-            self.dp.add_handler(CommandHandler(s, lambda update, context: self._mensa_plan(update, filter_meal=cmd_shortcut.meal, args=context.args), run_async=True))
-
-
-    @staticmethod
-    def _format_date_relative(date, language=Language.DE):
-        is_de = language == Language.DE
-        today = pendulum.today(tz=settings.TIMEZONE)
-        if date == today:
-            return 'Heute' if is_de else 'Today'
-        elif date.diff(today).in_days() == 1:
-            return 'Morgen' if is_de else 'Tomorrow'
-        else:
-            loc = 'de' if is_de else 'en'
-            return date.diff_for_humans(locale=loc)
+            self.dp.add_handler(CommandHandler(s, self._handled(lambda update, context: self._mensa_plan(update, filter_meal=cmd_shortcut.meal, canteen=cmd_shortcut.location, args=context.args)), run_async=True))
 
 
-    @staticmethod
-    def _parse_datum(date_string : str, fallback_func=None) -> pendulum.date:
-        d = date_string.lower().strip()
-        if d in ['today', 'heute']:
-            return pendulum.today(tz=settings.TIMEZONE)
-        if d in ['tomorrow', 'morgen']:
-            return pendulum.tomorrow(tz=settings.TIMEZONE)
+    def _settings(self, update: Update, context: CallbackContext):
+        """Shows or changes the preferences of the chat."""
+        self.logger.debug('Received /settings command')
+        update.effective_message.reply_markdown(text=self._settings_text(update.effective_chat.id, context.args))
 
-        # the fallback function is only used when it's defined and parsing fails
-        # its resulting value will still be "validated" later
-        try:
-            date = pendulum.parse(date_string, tz=settings.TIMEZONE)
-        except pendulum.parsing.exceptions.ParserError as e:
-            if fallback_func:
-                date = fallback_func(tz=settings.TIMEZONE)
-            else:
-                raise e
 
-        # we currently do not support lookup for past dates in bot query parameters
-        today = pendulum.today(tz=settings.TIMEZONE)
-        if today > date:
-            raise pendulum.parsing.exceptions.ParserError('No past dates allowed.')
-        return date
-
-
-    @staticmethod
-    def _str_for_single_meal(bot, meals: dict, meal: str) -> str:
-        try:
-            return '*{0}:* {1}'.format(*meals[Mensa._normalize_key(meal)])
-        except KeyError:
-            # meal not present
-            bot.logger.error(meal)
-            bot.logger.error(meals)
-            pass
-        raise NoMealError(meal)
+    def _diagnostics(self, update: Update, context: CallbackContext):
+        """Prints the memory report."""
+        self.logger.debug('Received /diagnostics command')
+        text = self._diagnostics_text(update.effective_chat.id)
+        if text is None:
+            self._unknown_command(update, context)
+        else:
+            update.effective_message.reply_markdown(text=text)
 
 
     def _news(self, update: Update, context: CallbackContext):
@@ -266,13 +487,6 @@ class MensaBot(telegram.Bot):
         update.effective_message.reply_markdown(text=self._news_content)
 
 
-    def _print_commands(self):
-        # we want to print both commands for the bot, as well as commands to get meals
-        return "\n".join(map(lambda c: '/' + c[0] + ' ' + c[1], self.my_commands)) \
-               + '\n' \
-               + "\n".join(map(lambda c: '/' + c.command + ' ' + c.short_help, [short for short in MensaBot.SHORTCUTS if settings.CANTEEN == short.location]))
-
-
     def _start(self, update: Update, context: CallbackContext):
         self.logger.debug('Received /start command')
         update.effective_message.reply_markdown(
@@ -352,62 +566,38 @@ class MensaBot(telegram.Bot):
     #         ))
     #     update.inline_query.answer(results)
 
-    def _msg_text_for_meals(self, date, plan, language=Language.DE):
-        msg_text = f'🍴 {plan.location.nice_name} – 🕛 *' + MensaBot._format_date_relative(date, language).title() + '*\n\n'
-        self.logger.debug('Preparing menu...')
-        if plan.meals is not None:
-            msg_text += ''.join(['*{0}{1}:* {2}\n'.format(l[0], Emojize.as_str(l[2]), l[1]) for l in plan.meals.values()]) + '\n'
-        else:
-            # TODO full localization
-            date_str = date.format('dddd, DD. MMMM YYYY', locale=language.name)
-            msg_text += ('Keine Speisen gefunden für' if language == Language.DE else 'No meals found for') \
-                        + f' {date_str} 😭\n'
-        return msg_text
-
-
-    def _mensa_plan(self, update, language=Language.DE, filter_meal=None, args=None):
+    def _mensa_plan(self, update, language=None, filter_meal=None, canteen=None, args=None):
         # TODO simplify method...
         # /mensa [today|tomorrow|date]
         # currently, we only support dates* in the args parameter
+        # what the command leaves open is taken from the chat's preferences
+        prefs = self.preferences.get(update.effective_chat.id)
 
         if len(args) > 1:
             update.effective_message.reply_markdown(
-                text='Give me a single date to fetch meals for.',
+                text=self.SINGLE_DATE,
                 disable_web_page_preview=True
             )
             return
 
-        self.sendChatAction(chat_id=update.effective_message.chat_id, action=ChatAction.TYPING)
+        try:
+            date, language = self._plan_request(args, language or prefs.language or Language.DE)
+        except pendulum.parsing.exceptions.ParserError as pe:
+            self.logger.info('Got unknown date or date format: %s', args[0])
+            update.effective_message.reply_markdown(
+                text=self.UNKNOWN_DATE.format(args[0]),
+                disable_web_page_preview=True
+            )
+            return
 
-        if len(args) > 0:
-            self.logger.debug(args)
-            try:
-                date = MensaBot._parse_datum(args[0])
-            except pendulum.parsing.exceptions.ParserError as pe:
-                self.logger.info('Got unknown date or date format: %s', args[0])
-                update.effective_message.reply_markdown(
-                    text='Sorry, I do not understand the date you gave me: {}'.format(args[0]),
-                    disable_web_page_preview=True
-                )
-                return
-        else:
-            date = pendulum.today(settings.TIMEZONE)
+        if not self._without_upstream(date, canteen or prefs.canteen):
+            self.sendChatAction(chat_id=update.effective_message.chat_id, action=ChatAction.TYPING)
 
         try:
             if filter_meal:
                 self.logger.debug('Filter for: %s', filter_meal)
 
-            # experimental feature: overwrite language when given english instructions
-            if len(args) > 0:
-                date_string = args[0].lower()
-                if date_string in ['today', 'tomorrow']:
-                    language = Language.EN
-
-            # dict of meals
-            plan = self.mensa.retrieve(date, language=language, filter_meal=filter_meal)
-            self.logger.debug('Retrieved meal plan.')
-
-            msg_text = self._msg_text_for_meals(date, plan, language=language)
+            msg_text = self._reply_text(date, language, filter_meal, canteen or prefs.canteen, prefs)
             try:
                 update.effective_message.reply_markdown(
                     text=msg_text,
@@ -417,7 +607,7 @@ class MensaBot(telegram.Bot):
                 self.logger.exception(e)
         except (ValueError, ArgumentError) as e:
             update.effective_message.reply_markdown(
-                text='\n*Usage:* /mensa [<date>]\ne.g. /mensa 2017-01-01',
+                text=self.USAGE,
                 disable_web_page_preview=True
             )
         except NoMealError as nme:
@@ -426,3 +616,9 @@ class MensaBot(telegram.Bot):
                 text=nme.message,
                 disable_web_page_preview=True
             )
+        except UpstreamError as ue:
+            self.logger.error(ue)
+            update.effective_message.reply_markdown(
+                text=self.UNREACHABLE,
+                disable_web_page_preview=True
+            )
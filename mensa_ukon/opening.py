@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+"""Opening calendar of a canteen: which days are known to have no plan, without asking upstream.
+
+A day is known to have no plan if
+
+- the last successful parse of the page (less than ``ttl`` seconds ago) has no tab for it: ``CLOSED`` if it lies
+  between the first and the last tab, ``UNPUBLISHED`` if it comes after them, ``EXPIRED`` if before
+- without such a parse: if it is not one of the canteen's weekdays or a public holiday in Baden-Württemberg (``CLOSED``)
+
+The tabs take precedence over the weekday pattern and the holidays, so a canteen that opens on a holiday is
+answered from upstream.
+"""
+import datetime
+import re
+import threading
+import time
+
+CLOSED = 'closed'
+UNPUBLISHED = 'unpublished'
+EXPIRED = 'expired'
+
+# weekday, day and month of a date tab label (``Mo. 13.08.``, ``Mon. 13.08.``)
+_LABEL = re.compile(r'^\s*(\w\w)\w*\.?\s*(\d{1,2})\.(\d{1,2})\.')
+# the first two letters of the German and English weekday names
+_WEEKDAYS = {'mo': 0, 'di': 1, 'tu': 1, 'mi': 2, 'we': 2, 'do': 3, 'th': 3, 'fr': 4, 'sa': 5, 'so': 6, 'su': 6}
+
+
+def easter(year) -> datetime.date:
+    """Easter Sunday of the (Gregorian) year."""
+    # anonymous Gregorian algorithm (Meeus/Jones/Butcher)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def holidays(year) -> dict:
+    """The public holidays of Baden-Württemberg in the year, as date -> name."""
+    e = easter(year)
+    movable = {-2: 'Karfreitag', 1: 'Ostermontag', 39: 'Christi Himmelfahrt', 50: 'Pfingstmontag',
+               60: 'Fronleichnam'}
+    days = {datetime.date(year, 1, 1): 'Neujahr',
+            datetime.date(year, 1, 6): 'Heilige Drei Könige',
+            datetime.date(year, 5, 1): 'Tag der Arbeit',
+            datetime.date(year, 10, 3): 'Tag der Deutschen Einheit',
+            datetime.date(year, 11, 1): 'Allerheiligen',
+            datetime.date(year, 12, 25): '1. Weihnachtstag',
+            datetime.date(year, 12, 26): '2. Weihnachtstag'}
+    days.update({e + datetime.timedelta(days=offset): name for offset, name in movable.items()})
+    return days
+
+
+def _date(d) -> datetime.date:
+    return datetime.date(d.year, d.month, d.day)
+
+
+def _near(month, day, reference, weekday=None) -> datetime.date:
+    """The date with the month and day closest to the reference date, preferably on the weekday."""
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(datetime.date(year, month, day))
+        except ValueError:
+            # 29.02.
+            pass
+    matching = [d for d in candidates if d.weekday() == weekday]
+    return min(matching or candidates, key=lambda d: abs(d - reference))
+
+
+class OpeningCalendar(object):
+
+    def __init__(self, location, ttl=600):
+        # the plans show the same weekdays every week, Monday first (e.g. 12 days in two weeks: Monday to Saturday)
+        self.weekdays = frozenset(range(location.days_open // 2))
+        self.ttl = ttl
+        self._holidays = {}
+        # (month, day, weekday) of each date tab of the last successful parse and when it was seen
+        self._tabs = None
+        self._lock = threading.Lock()
+
+    def _is_holiday(self, day):
+        if day.year not in self._holidays:
+            self._holidays[day.year] = holidays(day.year)
+        return day in self._holidays[day.year]
+
+    def saw(self, labels):
+        """Records the date tabs (labels like ``Mo. 13.08.``) of a successfully retrieved page."""
+        tabs = []
+        for label in labels:
+            match = _LABEL.search(label)
+            if match:
+                weekday, day, month = match.groups()
+                tabs.append((int(month), int(day), _WEEKDAYS.get(weekday.lower())))
+        with self._lock:
+            self._tabs = (tabs, time.monotonic()) if tabs else None
+
+    def _tab_dates(self, reference):
+        # the labels have no year: the first tab is placed in the year around the requested day in which it falls on
+        # its weekday, and the others (at most two weeks) follow it
+        with self._lock:
+            tabs = self._tabs
+        if tabs is None or time.monotonic() - tabs[1] >= self.ttl:
+            return None
+        month, day, weekday = tabs[0][0]
+        dates = [_near(month, day, reference, weekday)]
+        for month, day, _ in tabs[0][1:]:
+            dates.append(_near(month, day, dates[-1]))
+        return dates
+
+    def status(self, day):
+        """``CLOSED``, ``UNPUBLISHED`` or ``EXPIRED`` if the day is known to have no plan, otherwise ``None``."""
+        day = _date(day)
+        dates = self._tab_dates(day)
+        if dates is not None:
+            if day in dates:
+                return None
+            if day < dates[0]:
+                return EXPIRED
+            return UNPUBLISHED if day > dates[-1] else CLOSED
+        if day.weekday() not in self.weekdays or self._is_holiday(day):
+            return CLOSED
+        return None
@@ -0,0 +1,191 @@
+#! /usr/bin/env python
+
+"""HTML parser backends that extract the raw plan data from a menu page.
+
+A backend only finds elements and returns their text and classes; cleaning the texts and mapping the icons
+is done by ``Mensa`` for all backends alike. ``html5lib`` is the reference for odd markup, ``lxml`` and
+``selectolax`` are considerably faster. The backend is selected with ``settings.PARSER``; all backends must
+produce identical plans on the fixture pages (see ``tests/test_parsers.py``).
+
+The HTML libraries are only imported once a backend parses its first page.
+"""
+import re
+
+from mensa_ukon import settings
+
+REFERENCE = 'html5lib'
+
+_TAB_ID = re.compile(r'^tab\d+')
+
+
+class Parser(object):
+    """Interface of a parser backend."""
+    name = None
+
+    def document(self, html: str):
+        """Parses the page."""
+        raise NotImplementedError
+
+    def date_labels(self, document) -> list:
+        """Texts of the date tabs, in order."""
+        raise NotImplementedError
+
+    def tabs(self, document):
+        """The content element of each date tab, in order."""
+        raise NotImplementedError
+
+    def meals(self, tab):
+        """The meal elements of a tab."""
+        raise NotImplementedError
+
+    def meal_title(self, meal) -> str:
+        raise NotImplementedError
+
+    def meal_category(self, meal) -> str:
+        raise NotImplementedError
+
+    def meal_icon_classes(self, meal) -> list:
+        """The CSS classes of all icons of the meal, in order."""
+        raise NotImplementedError
+
+    def meal_price(self, meal):
+        """The text of the prices of the meal (``3,10 € Studierende | 3,80 € Schüler | ...``), or ``None``."""
+        raise NotImplementedError
+
+
+class Html5libParser(Parser):
+    name = 'html5lib'
+
+    def document(self, html):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(html, 'html5lib')
+
+    def date_labels(self, document):
+        return [a.get_text().strip() for a in document.select('div[class="tx-speiseplan"] > div[class="tabs"] > a')]
+
+    def tabs(self, document):
+        return document.find_all('div', id=_TAB_ID)
+
+    def meals(self, tab):
+        return tab.find_all('div', class_='speiseplanTagKat')
+
+    def meal_title(self, meal):
+        return meal.find('div', class_='title').text
+
+    def meal_category(self, meal):
+        return meal.find('div', class_='category').text
+
+    def meal_icon_classes(self, meal):
+        return [c for icon in meal.find_all('div', class_='speiseplanTagKatIcon') for c in icon.get('class', [])]
+
+    def meal_price(self, meal):
+        prices = meal.find('div', class_='preise')
+        return None if prices is None else prices.text
+
+
+def _has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+class LxmlParser(Parser):
+    name = 'lxml'
+
+    def __init__(self):
+        self._xpaths = None
+
+    def _compile(self):
+        from lxml import etree, html
+        self._parser = html.HTMLParser(encoding='utf-8')
+        self._document_fromstring = html.document_fromstring
+        self._xpaths = {
+            'labels': etree.XPath('//div[@class="tx-speiseplan"]/div[@class="tabs"]/a'),
+            'tabs': etree.XPath('//div[starts-with(@id, "tab")]'),
+            'meals': etree.XPath(f'.//div[{_has_class("speiseplanTagKat")}]'),
+            'title': etree.XPath(f'.//div[{_has_class("title")}]'),
+            'category': etree.XPath(f'.//div[{_has_class("category")}]'),
+            'icons': etree.XPath(f'.//div[{_has_class("speiseplanTagKatIcon")}]'),
+            'prices': etree.XPath(f'.//div[{_has_class("preise")}]'),
+        }
+
+    def document(self, html):
+        if self._xpaths is None:
+            self._compile()
+        # parse bytes, so that an encoding declaration in the page does not get in the way
+        return self._document_fromstring(html.encode('utf-8'), parser=self._parser)
+
+    def date_labels(self, document):
+        return [a.text_content().strip() for a in self._xpaths['labels'](document)]
+
+    def tabs(self, document):
+        return [t for t in self._xpaths['tabs'](document) if _TAB_ID.match(t.get('id'))]
+
+    def meals(self, tab):
+        return self._xpaths['meals'](tab)
+
+    def meal_title(self, meal):
+        return self._xpaths['title'](meal)[0].text_content()
+
+    def meal_category(self, meal):
+        return self._xpaths['category'](meal)[0].text_content()
+
+    def meal_icon_classes(self, meal):
+        return [c for icon in self._xpaths['icons'](meal) for c in icon.get('class', '').split()]
+
+    def meal_price(self, meal):
+        prices = self._xpaths['prices'](meal)
+        return prices[0].text_content() if prices else None
+
+
+class SelectolaxParser(Parser):
+    name = 'selectolax'
+
+    def document(self, html):
+        # the Modest backend was removed in selectolax 1.0
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(html)
+
+    def date_labels(self, document):
+        return [a.text().strip() for a in document.css('div[class="tx-speiseplan"] > div[class="tabs"] > a')]
+
+    def tabs(self, document):
+        return [t for t in document.css('div[id^="tab"]') if _TAB_ID.match(t.attributes.get('id') or '')]
+
+    def meals(self, tab):
+        return tab.css('div.speiseplanTagKat')
+
+    def meal_title(self, meal):
+        return meal.css_first('div.title').text()
+
+    def meal_category(self, meal):
+        return meal.css_first('div.category').text()
+
+    def meal_icon_classes(self, meal):
+        return [c for icon in meal.css('div.speiseplanTagKatIcon') for c in (icon.attributes.get('class') or '').split()]
+
+    def meal_price(self, meal):
+        prices = meal.css_first('div.preise')
+        return None if prices is None else prices.text()
+
+
+# the backends are named after the library they need
+PARSERS = {p.name: p for p in (Html5libParser, LxmlParser, SelectolaxParser)}
+
+_instances = {}
+
+
+def get(parser=None) -> Parser:
+    """Returns the backend with the given name (default: ``settings.PARSER``); backend instances are passed through."""
+    if isinstance(parser, Parser):
+        return parser
+    name = parser or settings.PARSER
+    if name not in PARSERS:
+        raise ValueError('Unknown parser {!r}, choose one of: {}'.format(name, ', '.join(PARSERS)))
+    if name not in _instances:
+        _instances[name] = PARSERS[name]()
+    return _instances[name]
+
+
+def available():
+    """Names of the backends whose library is installed."""
+    import importlib.util
+    return [name for name in PARSERS if importlib.util.find_spec(name) is not None]
@@ -0,0 +1,161 @@
+#! /usr/bin/env python
+
+"""Per-chat preferences of the bot (``/settings``), stored in SQLite.
+
+Lookups are answered from a bounded in-memory LRU, which also remembers chats without preferences, so only the
+first lookup of a chat reads the database. Changes are written by a background thread in batches, at the latest
+``flush_interval`` seconds after they were made.
+"""
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from mensa_ukon import memory, settings
+from mensa_ukon.constants import Language, Preferences
+from mensa_ukon.emojize import Emojize
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+DIETS = ('vegetarian', 'vegan')
+# icons of meals that can be excluded
+INGREDIENTS = ('pork', 'beef', 'poultry', 'lamb', 'game', 'fish')
+
+
+def suits(meal, diet=None, exclude=()) -> bool:
+    """Whether the (emojized) meal fits the diet and has none of the excluded ingredients."""
+    names = {Emojize.name(e) for e in meal[2]}
+    if diet == 'vegan' and 'vegan' not in names:
+        return False
+    if diet == 'vegetarian' and not names & set(DIETS):
+        return False
+    return not names & set(exclude)
+
+
+def filter_meals(meals, diet=None, exclude=()):
+    """The meals that fit the diet and exclusions, or ``None`` if there are none."""
+    if not meals or not (diet or exclude):
+        return meals
+    return OrderedDict((k, m) for k, m in meals.items() if suits(m, diet, exclude)) or None
+
+
+class PreferenceStore(object):
+
+    def __init__(self, path=None, capacity=None, flush_interval=None):
+        self.path = settings.PREFERENCES if path is None else path
+        self.capacity = settings.PREFERENCES_CACHE if capacity is None else capacity
+        self.flush_interval = settings.PREFERENCES_FLUSH if flush_interval is None else flush_interval
+        # the database is only used on cache misses and by the writer, so one connection is enough
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection as c:
+            c.execute('CREATE TABLE IF NOT EXISTS preferences (chat_id INTEGER PRIMARY KEY, canteen TEXT, '
+                      'language TEXT, diet TEXT, exclude TEXT, subscription TEXT)')
+        self._db_lock = threading.Lock()
+        # chat id -> Preferences; chats are small and of equal size, so the number of them is bounded
+        self._lru = memory.LRUCache('preferences', max_entries=self.capacity)
+        # chat id -> Preferences not written yet
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closing = threading.Event()
+        # lookups that had to read the database
+        self.loads = 0
+        self._writer = threading.Thread(target=self._write_loop, name='preferences-writer', daemon=True)
+        self._writer.start()
+
+    def __len__(self):
+        return len(self._lru)
+
+    @staticmethod
+    def _row(chat_id, p):
+        return (chat_id, p.canteen, p.language.name if p.language else None, p.diet, ','.join(p.exclude) or None,
+                p.subscription)
+
+    @staticmethod
+    def _from_row(row):
+        canteen, language, diet, exclude, subscription = row
+        return Preferences(canteen, Language[language] if language else None, diet,
+                           tuple(exclude.split(',')) if exclude else (), subscription)
+
+    def _remember(self, chat_id, prefs):
+        self._lru.set(chat_id, prefs)
+
+    def _load(self, chat_id):
+        with self._db_lock:
+            self.loads += 1
+            row = self._connection.execute('SELECT canteen, language, diet, exclude, subscription FROM preferences '
+                                           'WHERE chat_id = ?', (chat_id,)).fetchone()
+        return Preferences() if row is None else self._from_row(row)
+
+    def cached(self, chat_id):
+        """The preferences of the chat if they are known without reading the database, otherwise ``None``."""
+        with self._lock:
+            return self._lru.get(chat_id) or self._pending.get(chat_id)
+
+    def get(self, chat_id) -> Preferences:
+        with self._lock:
+            prefs = self._lru.get(chat_id)
+            if prefs is not None:
+                return prefs
+            prefs = self._pending.get(chat_id)
+        if prefs is None:
+            try:
+                prefs = self._load(chat_id)
+            except sqlite3.Error as e:
+                # not remembered, so that the next lookup tries again
+                logger.error(f'Could not load preferences of chat {chat_id}: {e}')
+                return Preferences()
+        with self._lock:
+            # a change made while loading wins
+            prefs = self._lru.get(chat_id) or self._pending.get(chat_id) or prefs
+            self._remember(chat_id, prefs)
+        return prefs
+
+    def set(self, chat_id, prefs: Preferences):
+        with self._lock:
+            self._remember(chat_id, prefs)
+            self._pending[chat_id] = prefs
+            self._changed.notify()
+
+    def flush(self):
+        """Writes the pending changes in one transaction."""
+        # loads wait for the write, so that they cannot miss changes that are neither pending nor written
+        with self._db_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                with self._connection as c:
+                    c.executemany('INSERT OR REPLACE INTO preferences VALUES (?, ?, ?, ?, ?, ?)',
+                                  [self._row(k, p) for k, p in batch.items()])
+            except sqlite3.Error as e:
+                logger.error(f'Could not write preferences of {len(batch)} chats: {e}')
+                with self._lock:
+                    for k, p in batch.items():
+                        self._pending.setdefault(k, p)
+                raise
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                self._changed.wait_for(lambda: self._pending or self._closing.is_set())
+                if not self._pending:
+                    return
+            # changes made in the meantime are written in the same batch
+            self._closing.wait(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error:
+                if self._closing.is_set():
+                    return
+
+    def close(self):
+        """Writes the pending changes and closes the database."""
+        with self._lock:
+            self._closing.set()
+            self._changed.notify()
+        self._writer.join()
+        self.flush()
+        self._connection.close()
@@ -0,0 +1,130 @@
+#! /usr/bin/env python
+
+"""Per-request profiles, written to a directory for later inspection.
+
+Two formats are supported:
+
+- ``pstats``: a deterministic ``cProfile`` profile (``<name>-<time>-<pid>-<n>.prof``), to be read with ``pstats``
+  or e.g. snakeviz
+- ``collapsed``: the stacks of the profiled thread, sampled every ``interval`` seconds, one ``frame;frame;... count``
+  line each (``.collapsed``), to be rendered with flamegraph.pl or speedscope
+
+Profiling is opt-in per call site with ``sampled``; with a rate of 0 nothing is wrapped, so there is no overhead.
+"""
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+FORMATS = ('pstats', 'collapsed')
+# seconds between two samples of the collapsed format
+INTERVAL = 0.001
+
+_counter = itertools.count()
+
+
+class _Sampler(threading.Thread):
+    """Counts the stacks of another thread."""
+
+    def __init__(self, thread_id, interval):
+        super(_Sampler, self).__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Profile(object):
+    """Profiles the current thread within the context and writes the result to the directory.
+
+    Failing to profile or to write the result is logged, but never fails the profiled code.
+    """
+
+    def __init__(self, name, directory, format='pstats', interval=INTERVAL):
+        if format not in FORMATS:
+            raise ValueError(f'Unknown profile format: {format}')
+        self.name = name
+        self.directory = directory
+        self.format = format
+        self.interval = interval
+        # path of the written result, if any
+        self.path = None
+        self._profiler = None
+
+    def __enter__(self):
+        try:
+            if self.format == 'pstats':
+                self._profiler = cProfile.Profile()
+                self._profiler.enable()
+            else:
+                self._profiler = _Sampler(threading.get_ident(), self.interval)
+                self._profiler.start()
+        except (ValueError, RuntimeError) as e:
+            # e.g. another profiler is active
+            logger.warning(f'Could not profile {self.name}: {e}')
+            self._profiler = None
+        return self
+
+    def __exit__(self, *exc):
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return False
+        # stopped before anything can fail, so that no profile hook or sampler thread outlives the context
+        if self.format == 'pstats':
+            profiler.disable()
+        else:
+            profiler.stop()
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        path = os.path.join(self.directory, f'{self.name}-{stamp}-{os.getpid()}-{next(_counter)}')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.format == 'pstats':
+                self.path = path + '.prof'
+                profiler.dump_stats(self.path)
+            else:
+                self.path = path + '.collapsed'
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.writelines(f'{stack} {count}\n' for stack, count in profiler.stacks.items())
+            logger.info(f'Wrote profile of {self.name} to {self.path}')
+        except OSError as e:
+            logger.warning(f'Could not write profile of {self.name}: {e}')
+        return False
+
+
+def sampled(func, rate, directory, format='pstats', name=None):
+    """Wraps the function so that the fraction ``rate`` of its calls is profiled; returns it unchanged for rate 0."""
+    if not rate or rate <= 0:
+        return func
+    name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if random.random() >= rate:
+            return func(*args, **kwargs)
+        with Profile(name, directory, format):
+            return func(*args, **kwargs)
+    return wrapper
@@ -11,11 +11,81 @@ NOTIFY_CHATS = list(filter(lambda i : i is not None,
 TIMEZONE = os.environ.get('PTB_TIMEZONE', default='Europe/Berlin')
 
 CANTEEN = os.environ.get('PTB_CANTEEN', default='giessberg')
+# The bot answers in both languages, so by default it fetches both pages at once and merges them (see MENSA_SOURCE)
+BOT_SOURCE = os.environ.get('PTB_SOURCE', default='bilingual')
+
+# Upstream servers, can be pointed to local stand-ins (see benchmarks/loadgen.py)
+SEEZEIT_URL = os.environ.get('MENSA_SEEZEIT_URL', default='https://www.seezeit.com')
+# Upstream requests: connect/read timeouts, retries (with jittered exponential backoff) within a total deadline,
+# and the circuit breaker that stops requesting a host after repeated failures (all times in seconds)
+CONNECT_TIMEOUT = float(os.environ.get('MENSA_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('MENSA_READ_TIMEOUT', 10))
+RETRIES = int(os.environ.get('MENSA_RETRIES', 2))
+RETRY_BACKOFF = float(os.environ.get('MENSA_RETRY_BACKOFF', 0.5))
+DEADLINE = float(os.environ.get('MENSA_DEADLINE', 15))
+BREAKER_THRESHOLD = int(os.environ.get('MENSA_BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.environ.get('MENSA_BREAKER_RESET', 60))
+
+# Cache of parsed plans and bot replies, shared by the bot's processes: memory, sqlite:///<path> or
+# redis://<host>:<port>/<db> (see mensa_ukon/cache.py), and how long entries are kept (seconds)
+CACHE = os.environ.get('MENSA_CACHE', default='memory')
+CACHE_TTL = int(os.environ.get('MENSA_CACHE_TTL', 600))
+
+# Memory budgets of the in-process caches in bytes (see mensa_ukon/memory.py and `mensa diagnostics`): the memory
+# backend of MENSA_CACHE, the HTTP cache and the parsed pages (each per canteen), and the responses of the JSON API
+CACHE_BYTES = int(os.environ.get('MENSA_CACHE_BYTES', 32 * 2 ** 20))
+HTTP_CACHE_BYTES = int(os.environ.get('MENSA_HTTP_CACHE_BYTES', 2 ** 20))
+PARSED_CACHE_BYTES = int(os.environ.get('MENSA_PARSED_CACHE_BYTES', 2 * 2 ** 20))
+API_CACHE_BYTES = int(os.environ.get('MENSA_API_CACHE_BYTES', 16 * 2 ** 20))
+
+# Where the meals are retrieved from: the menu page on seezeit.com (page) or the per-day AJAX endpoint on
+# max-manager.de (fragment), see mensa_ukon/sources.py
+SOURCE = os.environ.get('MENSA_SOURCE', default='page')
+MAX_MANAGER_URL = os.environ.get('MENSA_MAX_MANAGER_URL', default='https://www.max-manager.de')
+# HTML parser backend for the menu pages: html5lib (reference), lxml or selectolax (see mensa_ukon/parsers.py)
+PARSER = os.environ.get('MENSA_PARSER', default='html5lib')
+# Telegram Bot API base url, the token is appended to it (default: https://api.telegram.org/bot)
+BASE_URL = os.environ.get('PTB_BASE_URL')
+
+# Daemon (`mensa serve`): unix socket and how often the plans are refreshed (seconds)
+SOCKET = os.environ.get('MENSA_SOCKET', default=os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR', '/tmp'), 'mensa_ukon-{}.sock'.format(os.getuid())))
+REFRESH_INTERVAL = int(os.environ.get('MENSA_REFRESH_INTERVAL', 600))
+
+# HTTP JSON API (`mensa_api`): where it listens and how long clients may cache responses (seconds)
+API_HOST = os.environ.get('MENSA_API_HOST', default='127.0.0.1')
+API_PORT = int(os.environ.get('MENSA_API_PORT', 8000))
+API_MAX_AGE = int(os.environ.get('MENSA_API_MAX_AGE', 300))
+
+# Profiling (see mensa_ukon/profiling.py): directory and format (pstats or collapsed) of the profiles written by
+# `mensa --profile` and the bot, and the fraction of the bot's plan lookups that are profiled (0: off)
+PROFILE_DIR = os.environ.get('MENSA_PROFILE_DIR', default='profiles')
+PROFILE_FORMAT = os.environ.get('MENSA_PROFILE_FORMAT', default='pstats')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PTB_PROFILE_SAMPLE_RATE', 0))
+
+# Analytics (see mensa_ukon/analytics.py): SQLite archive that `mensa collect` records the plans in
+ARCHIVE = os.environ.get('MENSA_ARCHIVE', default='plans.db')
 
 # Polling
 USE_POLLING = os.environ.get('PTB_USE_POLLING', 'True') == 'True'
 WORKERS = int(os.environ.get('PTB_WORKERS', 2))
 
+# Asyncio mode (see mensa_ukon/aiobot.py): updates are handled by coroutines, plans are retrieved on PTB_WORKERS
+# threads and at most PTB_MAX_UPDATES updates are processed at the same time
+ASYNCIO = os.environ.get('PTB_ASYNCIO', 'False') == 'True'
+MAX_UPDATES = int(os.environ.get('PTB_MAX_UPDATES', 500))
+
+# Per-chat preferences (/settings): SQLite database, how many chats are kept in memory and how often changes are
+# written (seconds), see mensa_ukon/preferences.py
+PREFERENCES = os.environ.get('PTB_PREFERENCES', default='preferences.db')
+PREFERENCES_CACHE = int(os.environ.get('PTB_PREFERENCES_CACHE', 10000))
+PREFERENCES_FLUSH = float(os.environ.get('PTB_PREFERENCES_FLUSH', 1))
+
+# Admission of commands (see mensa_ukon/admission.py): repeated commands of a chat within PTB_DUPLICATE_WINDOW seconds
+# are answered once, and /help, /start and /news are shed while more than PTB_SHED_BACKLOG commands are pending
+DUPLICATE_WINDOW = float(os.environ.get('PTB_DUPLICATE_WINDOW', 3))
+SHED_BACKLOG = int(os.environ.get('PTB_SHED_BACKLOG', 16))
+
 # Webhook for own deployment
 URL = os.environ.get('PTB_WEBHOOK_URL')
 LISTEN_IP = os.environ.get('PTB_WEBHOOK_LISTEN_IP', '0.0.0.0')
@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+
+"""Data sources a ``Mensa`` retrieves the meals from.
+
+- ``page``: the menu page on seezeit.com, which shows all days of the current and the next week
+- ``fragment``: the AJAX endpoint on max-manager.de behind the old canteen website (see ``endpoint.txt``),
+  which answers with the meals of a single day
+- ``bilingual``: the menu pages of all languages, requested concurrently and merged into one plan
+
+The source is selected with ``settings.SOURCE``. While upstream fails, the page sources serve the last good parse
+of a page and the fragment source the last good meals of a day (marked as stale). Other packages can provide sources through the
+``mensa_ukon.sources`` entry point group, naming a ``Source`` subclass.
+"""
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from mensa_ukon import memory, settings, upstream
+from mensa_ukon.constants import HEADERS, BilingualMeal, Language
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+ENTRY_POINT_GROUP = 'mensa_ukon.sources'
+
+FRAGMENT_PATH = '/daten-extern/seezeit/html/inc/ajax-php_konnektor.inc.php'
+
+_MISSING = object()
+
+
+class Source(object):
+    """Retrieves the meals of the canteen of a ``Mensa``, using its session and parser."""
+    name = None
+
+    def __init__(self, mensa):
+        self.mensa = mensa
+
+    def days(self, datum, days, language):
+        """Yields ``(date, meals, stale)`` for ``days`` consecutive days starting at ``datum``.
+
+        ``meals`` is the ordered dict of the day's meals (by normalized category), or ``None`` if there are none.
+        ``stale`` tells whether they come from an earlier request because upstream failed.
+        """
+        raise NotImplementedError
+
+    def span(self, datum, days):
+        """The days worth retrieving at once for a request, as number of days before ``datum`` and in total."""
+        return 0, days
+
+
+def _page_span(datum, days):
+    # the page shows the current and the next week, starting on monday
+    lead = datum.weekday()
+    return lead, max(14, lead + days)
+
+
+class PageSource(Source):
+    """Requests the page once and parses it up to the last requested day."""
+    name = 'page'
+
+    def span(self, datum, days):
+        return _page_span(datum, days)
+
+    def days(self, datum, days, language):
+        m = self.mensa
+        _, date_labels, parsed_days, stale = m._parse_latest(language)
+        tabs = enumerate(parsed_days)
+
+        for offset in range(days):
+            day = datum.add(days=offset)
+            day_idx = m._get_requested_day_index(date_labels, day, language)
+            meals = None
+            if day_idx is not None:
+                # tabs are ordered by date, so we only ever have to look ahead
+                for i, tab_meals in tabs:
+                    if i == day_idx:
+                        meals = tab_meals
+                        break
+            if offset == days - 1:
+                # parse the remaining tabs, so that the page is remembered as parsed (see Mensa._parse_page)
+                for _ in tabs:
+                    pass
+            yield day, meals, stale
+
+
+class FragmentSource(Source):
+    """Requests and parses only the fragment of each requested day."""
+    name = 'fragment'
+
+    def __init__(self, mensa):
+        super(FragmentSource, self).__init__(mensa)
+        # (language name, date) -> the meals of the last good fragment of the day
+        self._last_good = memory.LRUCache(f'fragments:{mensa.location.shortcut}', settings.PARSED_CACHE_BYTES)
+
+    @property
+    def url(self):
+        return settings.MAX_MANAGER_URL + FRAGMENT_PATH
+
+    def request(self, day, language) -> str:
+        m = self.mensa
+        data = {
+            'func': 'make_spl',
+            'loc': m.location.key.replace('-', '_'),
+            'lang': language.name.lower(),
+            'date': day.strftime('%Y-%m-%d'),
+        }
+        logger.debug(f'Retrieving fragment: {data}')
+        return upstream.request(m.session, 'POST', self.url, data=data, headers=HEADERS).text
+
+    def days(self, datum, days, language):
+        m = self.mensa
+        for offset in range(days):
+            day = datum.add(days=offset)
+            key = (language.name, day.isoformat())
+            try:
+                text = self.request(day, language)
+            except upstream.UpstreamError as e:
+                # closed days are remembered as None
+                meals = self._last_good.get(key, _MISSING)
+                if meals is _MISSING:
+                    raise
+                logger.warning(f'Serving stale plan of {m.location} ({language.name}, {day}): {e}')
+                yield day, meals, True
+                continue
+            # the fragment has the same markup as a tab of the page
+            meals = (m._meals(m.parser.document(text)) if text.strip() else None) or None
+            self._last_good[key] = meals
+            yield day, meals, False
+
+
+def _label_date(label):
+    # 'Mo. 13.08.' and 'Mon 13.08.' both end with the date
+    return label.split()[-1] if label else None
+
+
+def _bilingual(meals):
+    meals = dict(meals)
+    return BilingualMeal(**{l.name: meals.get(l.name) for l in Language})
+
+
+def align(labels, days):
+    """Merges the parsed days of the languages (``{language name: [...]}``) into days of ``BilingualMeal``.
+
+    Days are aligned by date tab and meals by category position. Days whose dates or number of meals differ
+    between the languages cannot be aligned; their meals are kept separately for each language. Languages that are
+    not given are ``None`` in every meal.
+    """
+    merged = []
+    for i in range(max(len(d) for d in days.values())):
+        day = {name: list(d[i].items()) if i < len(d) else [] for name, d in days.items()}
+        dates = {_label_date(l[i]) if i < len(l) else None for l in labels.values()}
+        if len(dates) == 1 and len({len(meals) for meals in day.values()}) == 1:
+            merged.append([_bilingual(zip(day, meals)) for meals in zip(*day.values())])
+        else:
+            logger.warning(f'Could not align the languages of tab {i}')
+            merged.append([_bilingual([(name, meal)]) for name, meals in day.items() for meal in meals])
+    return merged
+
+
+class BilingualSource(Source):
+    """Requests the pages of all languages concurrently and serves each language from one merged plan.
+
+    The merged plan is kept until one of the pages changes.
+    """
+    name = 'bilingual'
+
+    def __init__(self, mensa):
+        super(BilingualSource, self).__init__(mensa)
+        # (page texts, {language name: date labels}, merged days)
+        self._merged = None
+
+    def span(self, datum, days):
+        return _page_span(datum, days)
+
+    def _page(self, language):
+        text, labels, days, stale = self.mensa._parse_latest(language)
+        return text, labels, list(days), stale
+
+    def plan(self, language=None):
+        """Returns the date labels of each language, the merged days and whether any page is stale.
+
+        A page that cannot be served (upstream fails and it was never parsed) is left out of the plan, so that the
+        other languages are still served; its ``UpstreamError`` is only raised if it is the page of ``language``
+        (default: if no page can be served).
+        """
+        with ThreadPoolExecutor(max_workers=len(Language)) as pool:
+            futures = {l.name: pool.submit(self._page, l) for l in Language}
+        pages, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                pages[name] = future.result()
+            except upstream.UpstreamError as e:
+                errors[name] = e
+        error = errors.get(language.name) if language is not None else None if pages else next(iter(errors.values()))
+        if error is not None:
+            raise error
+        labels = {name: page[1] for name, page in pages.items()}
+        stale = any(page[3] for page in pages.values())
+        if errors:
+            logger.warning(f'Serving {self.mensa.location} without the {", ".join(errors)} page')
+            return labels, align(labels, {name: page[2] for name, page in pages.items()}), stale
+        texts = tuple(page[0] for page in pages.values())
+        merged = self._merged
+        if merged is None or merged[0] != texts:
+            merged = self._merged = (texts, labels, align(labels, {name: page[2] for name, page in pages.items()}))
+        return merged[1], merged[2], stale
+
+    @staticmethod
+    def meals(day, language):
+        """The meals of a merged day in the given language."""
+        return OrderedDict(getattr(meal, language.name) for meal in day if getattr(meal, language.name))
+
+    def days(self, datum, days, language):
+        labels, merged, stale = self.plan(language)
+        for offset in range(days):
+            day = datum.add(days=offset)
+            day_idx = self.mensa._get_requested_day_index(labels[language.name], day, language)
+            meals = None
+            if day_idx is not None and day_idx < len(merged):
+                meals = self.meals(merged[day_idx], language) or None
+            yield day, meals, stale
+
+
+SOURCES = {s.name: s for s in (PageSource, FragmentSource, BilingualSource)}
+
+
+def get(source=None) -> type:
+    """Returns the source class with the given name (default: ``settings.SOURCE``)."""
+    name = source or settings.SOURCE
+    if name in SOURCES:
+        return SOURCES[name]
+    from importlib.metadata import entry_points
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        if entry_point.name == name:
+            return entry_point.load()
+    raise ValueError('Unknown source {!r}, choose one of: {}'.format(name, ', '.join(SOURCES)))
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+
+"""Requests to the upstream servers, with timeouts, jittered retries within a deadline and a circuit breaker.
+
+Every upstream host has one ``CircuitBreaker``. After ``settings.BREAKER_THRESHOLD`` failed attempts in a row
+it opens, and requests to the host fail immediately with ``CircuitOpenError`` for ``settings.BREAKER_RESET``
+seconds. Then a single trial request is let through, which closes the breaker again if it succeeds.
+"""
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from mensa_ukon import settings
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class UpstreamError(Exception):
+    """Raised when upstream could not be reached or did not answer with the requested page."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised instead of requesting a host that failed repeatedly."""
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, host, threshold=None, reset_timeout=None):
+        self.host = host
+        self.threshold = settings.BREAKER_THRESHOLD if threshold is None else threshold
+        self.reset_timeout = settings.BREAKER_RESET if reset_timeout is None else reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def open(self):
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a request may be sent; once the reset timeout passed, only one trial request is allowed."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f'Closing circuit for {self.host}')
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                logger.warning(f'Opening circuit for {self.host} after {self.failures} failures')
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(url) -> CircuitBreaker:
+    """The circuit breaker of the url's host."""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def request(session, method, url, **kwargs):
+    """Sends the request with the configured timeouts, retrying server errors and connection problems.
+
+    Returns the response if its status is 200; raises ``UpstreamError`` otherwise. Client errors (4xx) are not
+    retried, and no attempt is started after ``settings.DEADLINE`` seconds.
+    """
+    # imported here, so that the CLI can catch UpstreamError without importing requests
+    import requests
+
+    b = breaker(url)
+    deadline = time.monotonic() + settings.DEADLINE
+    attempt = 0
+    while True:
+        if not b.allow():
+            raise CircuitOpenError(f'Circuit for {b.host} is open')
+        remaining = deadline - time.monotonic()
+        timeout = (min(settings.CONNECT_TIMEOUT, remaining), min(settings.READ_TIMEOUT, remaining))
+        try:
+            resp = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            error = e
+        except BaseException:
+            # anything else (e.g. a parse error in the HTTP cache) fails the attempt too, so that a half-open
+            # circuit does not wait for the result of its trial forever
+            b.failure()
+            raise
+        else:
+            if resp.status_code < 500:
+                b.success()
+                if resp.status_code != 200:
+                    raise UpstreamError(f'Status {resp.status_code} for {url}')
+                return resp
+            error = f'status {resp.status_code}'
+        b.failure()
+        attempt += 1
+        # exponential backoff with full jitter, so that retries of concurrent requests spread out
+        delay = random.uniform(0, settings.RETRY_BACKOFF * 2 ** (attempt - 1))
+        if attempt > settings.RETRIES or time.monotonic() + delay >= deadline:
+            raise UpstreamError(f'{method} {url} failed after {attempt} attempt(s): {error}')
+        logger.info(f'Retrying {url} in {delay:.2f}s ({error})')
+        time.sleep(delay)
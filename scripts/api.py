@@ -0,0 +1,29 @@
+import logging
+
+import click
+
+from mensa_ukon import version, setup_logging, settings
+
+
+@click.command()
+@click.option('-h', '--host', default=settings.API_HOST, help='address to listen on')
+@click.option('-p', '--port', type=int, default=settings.API_PORT, help='port to listen on')
+@click.option('-v', '--verbosity', count=True)
+@click.version_option(version=version.__version__)
+def run_api(host, port, verbosity):
+    """Serves the canteen plans as read-only JSON API."""
+    from mensa_ukon.api import ApiServer
+
+    setup_logging(verbosity)
+    server = ApiServer((host, port))
+    logging.getLogger(__name__).info('Serving API on http://%s:%s', host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    run_api()
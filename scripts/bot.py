@@ -3,17 +3,25 @@ import logging.config
 
 import click
 
-from mensa_ukon import version, setup_logging, Verbosity
+from mensa_ukon import version, settings, setup_logging, Verbosity
 from mensa_ukon.constants import Verbosity
-from mensa_ukon.mensabot import MensaBot, BotError
 
 @click.command()
 @click.option('-v', '--verbosity', count=True)
+@click.option('--asyncio/--threaded', 'use_asyncio', default=settings.ASYNCIO,
+              help='handle updates with coroutines on an event loop (default: PTB_ASYNCIO)')
 @click.version_option(version=version.__version__)
-def run_bot(verbosity):
+def run_bot(verbosity, use_asyncio):
+    # telegram is only imported when the bot actually runs, not for --help/--version
+    from mensa_ukon.mensabot import MensaBot, BotError
+
     setup_logging(verbosity)
     try:
-        bot = MensaBot()
+        if use_asyncio:
+            from mensa_ukon.aiobot import AsyncMensaBot
+            bot = AsyncMensaBot()
+        else:
+            bot = MensaBot()
         bot.logger.info('Starting bot from CLI script...')
         bot.run()
     except BotError as e:
@@ -1,15 +1,18 @@
 #! /usr/bin/env python
 
 
+import contextlib
+import datetime
 import sys
-import pendulum
 
 import click
 from click_datetime import Datetime
 from mensa_ukon import version
-from mensa_ukon import setup_logging
+from mensa_ukon import opening, setup_logging
 from mensa_ukon.constants import Language, Format, FORMATTERS, Canteen
-from mensa_ukon.mensa import Mensa
+
+# Heavy dependencies (pendulum, and requests_html etc. through mensa_ukon.mensa) are imported
+# inside the commands, so that --help and --version are answered without loading them.
 
 import logging
 logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -28,40 +31,291 @@ def _setup_logging(verbosity):
 
 logger = logging.getLogger(__name__)
 
-@click.command()
-@click.option('-d', '--date', type=Datetime(format='%Y-%m-%d'), default=pendulum.today,
+
+class DefaultGroup(click.Group):
+    """Group that runs its default command when no sub-command is given, so `mensa -d ...` keeps working."""
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super(DefaultGroup, self).__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] in ('--help', '--version'):
+            return super(DefaultGroup, self).parse_args(ctx, args)
+        if not args or args[0] not in self.commands:
+            args = [self.default_command] + list(args)
+        return super(DefaultGroup, self).parse_args(ctx, args)
+
+    def format_commands(self, ctx, formatter):
+        super(DefaultGroup, self).format_commands(ctx, formatter)
+        formatter.write_paragraph()
+        formatter.write_text(f'Without a command, `{self.default_command}` is run.')
+
+
+@click.group(cls=DefaultGroup, default_command='meals')
+@click.version_option(version=version.__version__)
+def cli():
+    """Access the canteen plans of the University of Konstanz and other Seezeit canteens."""
+
+
+def _format_date(date):
+    return date.strftime('%A %d %B %Y')
+
+
+def _retrieve(canteen, date, days, language, filter_meal, use_daemon):
+    """Yields the plans, preferably from a running daemon, otherwise retrieved in-process."""
+    if use_daemon:
+        from mensa_ukon import daemon
+        plans = daemon.query(canteen, date, days, language, filter_meal)
+        if plans is not None:
+            logger.debug('Got plans from daemon.')
+            yield from plans
+            return
+
+    import pendulum
+    from mensa_ukon.mensa import Mensa
+
+    m = Mensa(canteen)
+    logger.info('Retrieving meals...')
+    yield from m.retrieve_days(pendulum.date(date.year, date.month, date.day), days, language, filter_meal)
+
+
+@cli.command()
+@click.option('-d', '--date', type=Datetime(format='%Y-%m-%d'), default=None,
               help='date for the plan (default: today; format: Y-m-d)')
+@click.option('-n', '--days', type=click.IntRange(min=1), default=1, help='number of days to show, starting at the date')
 @click.option('-l', '--language', type=click.Choice(Language.__members__), default='DE', help='language of the descriptions')
-@click.option('-c', '--canteen', type=click.Choice(Canteen), multiple=False, default='giessberg', help='restrict output to specific canteen')
+@click.option('-c', '--canteen', type=click.Choice(Canteen), multiple=True, default=['giessberg'],
+              help='restrict output to specific canteen (can be given multiple times)')
 @click.option('-f', '--format', type=click.Choice(list(Format)), default=Format.plain, help='output format')
+@click.option('--daemon/--no-daemon', 'use_daemon', default=True, help='use a running `mensa serve` daemon (default: on)')
+@click.option('--profile', 'profile_dir', default=None, metavar='DIR',
+              help='profile the lookup and write the profile to the directory')
+@click.option('--profile-format', type=click.Choice(['pstats', 'collapsed']), default=None,
+              help='pstats (cProfile) or collapsed stacks for flame graphs (default: $MENSA_PROFILE_FORMAT)')
 @click.option('-v', '--verbosity', count=True)
 @click.argument('filter_meal', required=False)
 @click.version_option(version=version.__version__)
-def meals(date, language, canteen, format, verbosity, filter_meal):
+def meals(date, days, language, canteen, format, use_daemon, profile_dir, profile_format, verbosity, filter_meal):
     """This script retrieves specified meals from the canteen plan of the University of Konstanz."""
 
     setup_logging(verbosity)
 
     language = Language.__members__[language]
+    date = datetime.date.today() if date is None else date.date()
 
     logger.debug('Date: {}'.format(date))
+    logger.debug('Days: {}'.format(days))
     logger.debug('Language: {}'.format(language))
     logger.debug('Canteen: {}'.format(canteen))
     logger.debug('Format: {}'.format(format))
     logger.debug('Verbosity: {}'.format(verbosity))
     logger.debug('Meal filter: {}'.format(filter_meal))
 
-    m = Mensa(canteen)
+    from mensa_ukon.upstream import UpstreamError
+    try:
+        with _profile('meals', profile_dir, profile_format):
+            for c in canteen:
+                _echo_plans(_retrieve(c, date, days, language, filter_meal, use_daemon), days, format)
+    except UpstreamError as e:
+        raise click.ClickException(f'Could not retrieve the canteen plan: {e}')
+    sys.exit(0)
 
-    logger.info('Retrieving meals...')
-    plan = m.retrieve(date, language, filter_meal)
 
-    if plan.meals:
-        l = len(plan.meals)
-        logger.debug('Found {0} meal{1}!'.format(l, '' if l == 1 else 's'))
-        click.echo(FORMATTERS[format](plan))
-        sys.exit(0)
+def _profile(name, directory, format):
+    if directory is None:
+        return contextlib.nullcontext()
+    from mensa_ukon import profiling, settings
+    return profiling.Profile(name, directory, format or settings.PROFILE_FORMAT)
+
+
+# why a day has no plan, if known without asking upstream (see mensa_ukon/opening.py)
+NO_PLAN = {
+    opening.CLOSED: 'The canteen is closed on {0}.',
+    opening.UNPUBLISHED: 'The plan for {0} is not published yet.',
+    opening.EXPIRED: 'The plan for {0} is not available anymore.',
+}
+
+
+def _echo_plans(plans, days, format):
+    # plans are written as soon as they are parsed, so multi-day output is streamed
+    for plan in plans:
+        if plan.stale:
+            click.echo('Upstream is unreachable, showing the last retrieved plan of {}.'.format(_format_date(plan.date)),
+                       err=True)
+        if format != Format.plain:
+            output = FORMATTERS[format](plan)
+            if output:
+                click.echo(output, nl=not isinstance(output, bytes))
+        elif plan.meals:
+            l = len(plan.meals)
+            logger.debug('Found {0} meal{1}!'.format(l, '' if l == 1 else 's'))
+            if days > 1:
+                click.echo(_format_date(plan.date))
+            click.echo(FORMATTERS[format](plan))
+        else:
+            click.echo(NO_PLAN.get(plan.status, 'No meals found for date {0}.').format(_format_date(plan.date)))
+
+
+@cli.command()
+@click.option('-s', '--socket', 'path', default=None, help='unix socket to listen on (default: $MENSA_SOCKET)')
+@click.option('-r', '--refresh', type=click.IntRange(min=1), default=None,
+              help='seconds between refreshes of the plans (default: $MENSA_REFRESH_INTERVAL)')
+@click.option('-v', '--verbosity', count=True)
+def serve(path, refresh, verbosity):
+    """Runs a daemon that keeps the plans of all canteens warm for `mensa`."""
+    from mensa_ukon.daemon import DaemonError, PlanServer
+
+    setup_logging(verbosity)
+    try:
+        server = PlanServer(path, refresh)
+    except DaemonError as e:
+        raise click.ClickException(str(e))
+
+    logger.info('Listening on %s', server.path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@cli.command()
+@click.argument('queries', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=8, show_default=True,
+              help='number of pages retrieved at the same time')
+@click.option('-v', '--verbosity', count=True)
+def batch(queries, workers, verbosity):
+    """Answers the queries in QUERIES (default: stdin) as NDJSON, one line per query in the same order.
+
+    Each line of QUERIES is a JSON object with the optional fields date (Y-m-d, today or tomorrow),
+    canteen, language and filter, e.g. {"date": "2018-08-13", "canteen": "htwg", "filter": "wok"}.
+    Each page is requested and parsed once, however many queries need it.
+    """
+    import json
+    from mensa_ukon import batch as batches
+
+    setup_logging(verbosity)
+    for answer in batches.run(queries, workers):
+        click.echo(json.dumps(answer, ensure_ascii=False))
+
+
+@cli.command()
+@click.option('-o', '--output', 'path', default='mensa.ics', show_default=True, help='file to write the feed to')
+@click.option('-l', '--language', type=click.Choice(Language.__members__), default='DE', help='language of the descriptions')
+@click.option('-c', '--canteen', type=click.Choice(Canteen), multiple=True, default=['giessberg'],
+              help='canteens to include (can be given multiple times)')
+@click.option('-k', '--keep', type=click.IntRange(min=0), default=None,
+              help='days that past events are kept in the feed (default: 28)')
+@click.option('--daemon/--no-daemon', 'use_daemon', default=True, help='use a running `mensa serve` daemon (default: on)')
+@click.option('-v', '--verbosity', count=True)
+def ics(path, language, canteen, keep, use_daemon, verbosity):
+    """Updates an iCalendar feed with one event per canteen and day of the current and the next week.
+
+    The feed is only rewritten if a day changed, so it can be regenerated often (e.g. by cron) and served as a
+    static file.
+    """
+    from mensa_ukon import ics as feeds
+    from mensa_ukon.constants import CANTEENS
+    from mensa_ukon.upstream import UpstreamError
+
+    setup_logging(verbosity)
+    language = Language.__members__[language]
+    today = datetime.date.today()
+    # the page shows the current and the next week
+    monday = today - datetime.timedelta(days=today.weekday())
+    name = 'Mensa ' + ', '.join(CANTEENS[c].nice_name for c in canteen)
+    feed = feeds.Feed(path, name, feeds.KEEP_DAYS if keep is None else keep)
+    try:
+        plans = [p for c in canteen for p in _retrieve(c, monday, 14, language, None, use_daemon)]
+    except UpstreamError as e:
+        raise click.ClickException(f'Could not retrieve the canteen plan: {e}')
+    if feed.update(plans, language, today):
+        click.echo(f'Wrote {path} (ETag {feed.etag})')
     else:
-        print(date)
-        click.echo('No meals found for date {0}.'.format(date.format('dddd DD MMMM YYYY')))
-        sys.exit(0)
+        click.echo(f'{path} is up to date (ETag {feed.etag})')
+
+
+@cli.command()
+@click.option('-a', '--archive', 'path', default=None, help='SQLite archive to record in (default: $MENSA_ARCHIVE)')
+@click.option('-c', '--canteen', type=click.Choice(Canteen), multiple=True, default=list(Canteen),
+              help='canteens to record (can be given multiple times; default: all)')
+@click.option('-i', '--interval', type=click.IntRange(min=1), default=None,
+              help='keep running and record again every INTERVAL seconds')
+@click.option('-v', '--verbosity', count=True)
+def collect(path, canteen, interval, verbosity):
+    """Records the current and the next week of the canteens in both languages in the archive."""
+    import time
+    from mensa_ukon import analytics, settings
+
+    setup_logging(verbosity)
+    archive = analytics.Archive(path or settings.ARCHIVE)
+    try:
+        while True:
+            click.echo(f'Recorded {analytics.collect(archive, canteen)} days in {archive.path}')
+            if interval is None:
+                break
+            time.sleep(interval)
+    finally:
+        archive.close()
+
+
+@cli.command()
+@click.option('-a', '--archive', 'path', default=None, help='SQLite archive to export (default: $MENSA_ARCHIVE)')
+@click.option('-o', '--output', required=True, help='file to write: .parquet, .arrow (need pyarrow) or .npz (needs numpy)')
+@click.option('-v', '--verbosity', count=True)
+def export(path, output, verbosity):
+    """Exports the meals recorded by `mensa collect` as columns, one row per meal."""
+    import os
+    from mensa_ukon import analytics, settings
+
+    setup_logging(verbosity)
+    path = path or settings.ARCHIVE
+    if not os.path.exists(path):
+        raise click.ClickException(f'No archive at {path}, see `mensa collect`')
+    archive = analytics.Archive(path)
+    try:
+        columns = archive.columns()
+    finally:
+        archive.close()
+    try:
+        columns.write(output)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    except ImportError as e:
+        raise click.ClickException(f'Exporting to {os.path.basename(output)} needs {e.name}: pip install {e.name}')
+    click.echo(f'Wrote {len(columns)} meals to {output}')
+
+
+@cli.command()
+@click.option('-c', '--canteen', type=click.Choice(Canteen), multiple=True, default=list(Canteen),
+              help='canteen to load before reporting (can be given multiple times; default: all)')
+@click.option('-t', '--top', type=click.IntRange(min=0), default=10, help='number of top allocators to show')
+@click.option('-v', '--verbosity', count=True)
+def diagnostics(canteen, top, verbosity):
+    """Loads the plans of the canteens in both languages and reports the memory used by the caches."""
+    import tracemalloc
+
+    setup_logging(verbosity)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    from mensa_ukon import memory
+    from mensa_ukon.mensa import Mensa
+    from mensa_ukon.upstream import UpstreamError
+
+    mensas = []
+    for c in canteen:
+        m = Mensa(c)
+        # kept alive, so that their caches are part of the report
+        mensas.append(m)
+        for language in Language:
+            try:
+                m.retrieve(language=language)
+            except UpstreamError as e:
+                click.echo(f'Could not retrieve the {language.name} plan of {c}: {e}', err=True)
+    click.echo(memory.report(top))
+    if started:
+        tracemalloc.stop()
@@ -24,15 +24,20 @@ with codecs.open('README.md', 'r', 'utf-8') as readme_f, \
           url='https://github.com/enplotz/mensa_ukon',
           keywords='python canteen api wrapper bot',
           python_requires='>=3.10',
-          packages=find_packages(exclude=['tests*']),
+          packages=find_packages(exclude=['tests*', 'benchmarks*']),
           py_modules=['mensa', 'bot', 'settings'],
-          # TODO structure canteen data source as plugins
-          # see https://setuptools.readthedocs.io/en/latest/setuptools.html#dynamic-discovery-of-services-and-plugins
           entry_points={
               'console_scripts': [
-                  'mensa = scripts.mensa_cli:meals',
+                  'mensa = scripts.mensa_cli:cli',
                   'mensa_bot = scripts.bot:run_bot',
-              ]
+                  'mensa_api = scripts.api:run_api',
+              ],
+              # canteen data sources, selected by name with MENSA_SOURCE (see mensa_ukon/sources.py)
+              'mensa_ukon.sources': [
+                  'page = mensa_ukon.sources:PageSource',
+                  'fragment = mensa_ukon.sources:FragmentSource',
+                  'bilingual = mensa_ukon.sources:BilingualSource',
+              ],
           },
           setup_requires=pytest_runner,
           tests_require=['pytest', 'requests-file'],
@@ -44,8 +49,7 @@ with codecs.open('README.md', 'r', 'utf-8') as readme_f, \
                             'click',
                             'click-datetime',
                             'click-log',
-                            'pendulum',
-                            'aenum'],
+                            'pendulum'],
           include_package_data=True,
           classifiers=[
               'Intended Audience :: Developers',
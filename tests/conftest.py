@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.fixtures import reference_plans
+from mensa_ukon import Mensa
+from mensa_ukon.changes import Day
+from mensa_ukon.constants import CANTEENS
+
+
+@pytest.fixture
+def plan():
+    """Returns the plan of a day of the reference page (``tests/giessberg.html``), optionally changed.
+
+    ``title`` replaces the title of the first meal, ``canteen`` the location, ``filter_meal`` keeps only the matching
+    meals (as ``mensa`` does) and ``stale`` marks the plan as stale.
+    """
+    def plan(date, title=None, canteen='giessberg', filter_meal=None, stale=False):
+        p = reference_plans()[date]
+        meals = list(p.meals.items())
+        if title is not None:
+            meals[0] = (meals[0][0], meals[0][1]._replace(title=title))
+        if filter_meal is not None:
+            meals = [(k, m) for k, m in meals if Mensa._normalize_key(filter_meal) in k]
+        return p._replace(location=CANTEENS[canteen], meals=Day(meals) if meals else None, stale=stale)
+    return plan
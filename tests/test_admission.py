@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from benchmarks import loadgen
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import settings
+from mensa_ukon.admission import DUPLICATE, SHED, Admission
+
+
+class TestAdmission:
+
+    def test_duplicates(self):
+        admission = Admission(window=0.1, max_backlog=10)
+        assert admission.admit(1, 'mensa', ['tomorrow']) is None
+        assert DUPLICATE == admission.admit(1, 'Mensa', ['tomorrow'])
+        assert admission.admit(1, 'mensa') is None
+        assert admission.admit(2, 'mensa', ['tomorrow']) is None
+        time.sleep(0.15)
+        assert admission.admit(1, 'mensa', ['tomorrow']) is None
+        assert {'backlog': 4, 'duplicate': 1, 'shed': 0} == admission.stats()
+
+    def test_sheds_low_priority_commands(self):
+        admission = Admission(window=0, max_backlog=2, low_priority=['help'])
+        assert admission.admit(1, 'help') is None
+        assert admission.admit(2, 'mensa') is None
+        assert SHED == admission.admit(3, 'help')
+        assert admission.admit(4, 'mensa') is None
+        admission.done()
+        admission.done()
+        assert admission.admit(3, 'help') is None
+        assert {'backlog': 2, 'duplicate': 0, 'shed': 1} == admission.stats()
+
+
+@pytest.fixture(params=[False, True], ids=['threaded', 'asyncio'])
+def bot(request, monkeypatch):
+    seezeit, telegram = SeezeitServer(latency=0.3).start(), FakeTelegram().start()
+    monkeypatch.setattr(settings, 'SHED_BACKLOG', 1)
+    bot, previous = loadgen._make_bot(seezeit, telegram, workers=2, use_asyncio=request.param)
+    if request.param:
+        thread = loadgen._start_async(bot)
+    else:
+        bot.updater.start_polling(poll_interval=0.0, timeout=1)
+    yield bot, telegram
+    if request.param:
+        bot.stop()
+        thread.join()
+    else:
+        bot.updater.stop()
+    seezeit.shutdown()
+    telegram.shutdown()
+    for k, v in previous.items():
+        setattr(settings, k, v)
+
+
+def test_bots(bot):
+    bot, telegram = bot
+    for _ in range(3):
+        telegram.push(telegram.make_update(1, '/teller'))
+    # shed while the lookup of chat 1 is pending
+    telegram.push(telegram.make_update(2, '/help'))
+    assert telegram.wait_for_replies([1], 10)
+    time.sleep(0.5)
+    assert 1 == len(telegram.sent[1])
+    assert not telegram.sent.get(2)
+    assert {'backlog': 0, 'duplicate': 2, 'shed': 1} == bot.admission.stats()
+
+    telegram.push(telegram.make_update(2, '/help'))
+    assert telegram.wait_for_replies([2], 10)
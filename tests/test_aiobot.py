@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks import loadgen
+from benchmarks.fake_telegram import FakeTelegram
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import settings
+from mensa_ukon.emojize import Emoji
+from mensa_ukon.mensabot import MensaReplies
+
+
+@pytest.fixture
+def servers():
+    seezeit = SeezeitServer(latency=0.5).start()
+    telegram = FakeTelegram().start()
+    yield seezeit, telegram
+    seezeit.shutdown()
+    telegram.shutdown()
+
+
+@pytest.fixture
+def bot(servers):
+    bot, previous = loadgen._make_bot(*servers, workers=1, use_asyncio=True)
+    thread = loadgen._start_async(bot)
+    yield bot
+    bot.stop()
+    thread.join()
+    for k, v in previous.items():
+        setattr(settings, k, v)
+
+
+def send(telegram, chat_id, text):
+    """Sends the command and returns the reply."""
+    before = len(telegram.sent.get(chat_id, []))
+    telegram.push(telegram.make_update(chat_id, text))
+    deadline = time.monotonic() + 10
+    while len(telegram.sent.get(chat_id, [])) == before:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return telegram.sent[chat_id][-1][1]
+
+
+class TestAsyncMensaBot:
+
+    def test_commands(self, bot, servers):
+        _, telegram = servers
+        assert MensaReplies.SINGLE_DATE == send(telegram, 1, '/mensa today tomorrow')
+        assert MensaReplies.UNKNOWN_DATE.format('2000-01-01') == send(telegram, 2, '/mensa 2000-01-01')
+        assert MensaReplies.UNKNOWN_COMMAND == send(telegram, 3, '/nothing')
+        assert send(telegram, 4, '/Help').startswith(MensaReplies.INTRO_HELP)
+        assert '/teller' in send(telegram, 5, '/help@' + bot.username)
+
+    def test_ignores_commands_for_other_bots(self, bot, servers):
+        _, telegram = servers
+        telegram.push(telegram.make_update(1, '/help@other_bot'))
+        assert not telegram.wait_for_replies([1], 0.5)
+
+    def test_concurrent_updates(self, bot, servers):
+        seezeit, telegram = servers
+        chat_ids = list(range(1, 101))
+        start = time.monotonic()
+        for c in chat_ids:
+            telegram.push(telegram.make_update(c, '/mensa' if c % 2 else '/teller'))
+        assert telegram.wait_for_replies(chat_ids, 10)
+        # with a single worker thread, the lookups of all updates share one retrieval of both pages
+        assert time.monotonic() - start < 3
+        assert 2 == seezeit.requests
+        assert 100 == telegram.chat_actions
+
+    def test_settings(self, bot, servers):
+        _, telegram = servers
+        assert MensaReplies.SETTINGS_USAGE == send(telegram, 1, '/settings diet carnivore')
+        # there is no daily plan to schedule yet
+        assert MensaReplies.SETTINGS_USAGE == send(telegram, 1, '/settings time 11:30')
+        assert 'Canteen: HTWG' in send(telegram, 2, '/settings canteen htwg')
+        assert 'htwg' == bot.preferences.get(2).canteen
+
+        everything = [l for l in send(telegram, 3, '/mensa').splitlines() if l.startswith('*')]
+        assert 'Diet: vegan' in send(telegram, 4, '/settings diet vegan')
+        vegan = [l for l in send(telegram, 4, '/mensa').splitlines() if l.startswith('*')]
+        assert len(vegan) < len(everything)
+        assert all(Emoji.SEEDLING in l for l in vegan)
+
+    def test_preferences_are_loaded_off_the_loop(self, bot, servers, monkeypatch):
+        _, telegram = servers
+        threads = []
+        load = bot.preferences._load
+        monkeypatch.setattr(bot.preferences, '_load',
+                            lambda chat_id: threads.append(threading.current_thread().name) or load(chat_id))
+        send(telegram, 1, '/mensa')
+        send(telegram, 2, '/settings')
+        assert 2 == len(threads)
+        assert all(t.startswith('mensa-bot-store') for t in threads)
+
+    def test_diagnostics(self, bot, servers, monkeypatch):
+        _, telegram = servers
+        monkeypatch.setattr(settings, 'NOTIFY_CHATS', [1])
+        assert 'peak RSS' in send(telegram, 1, '/diagnostics')
+        assert MensaReplies.UNKNOWN_COMMAND == send(telegram, 2, '/diagnostics')
+        assert '/diagnostics' not in send(telegram, 1, '/help')
@@ -0,0 +1,123 @@
+import datetime
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from benchmarks.fixtures import MONDAY
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import analytics, settings
+from mensa_ukon.constants import Language
+from scripts.mensa_cli import cli
+
+TUESDAY = MONDAY + datetime.timedelta(days=1)
+# the meals of the reference page's monday: Seezeit-Teller, hin&weg, KombinierBar, Beilagen, Eintopf, Wok, Bioessen,
+# Grill and the closed Al stuDente, Gießberghütte and Abendessen
+MONDAY_PRICES = [310, 285, 160, 75, 230, 120, 120, 740, -1, -1, 250]
+MONDAY_PER_100G = [0, 0, 0, 0, 0, 1, 1, 0, 0, 0, 0]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = analytics.Archive(str(tmp_path / 'plans.db'))
+    yield archive
+    archive.close()
+
+
+def test_diet_mask():
+    assert 0b11 == analytics.diet_mask(['vegetarian', 'vegan', 'unknown'])
+
+
+def test_columns(archive, plan):
+    assert 3 == archive.record([plan(MONDAY), plan(TUESDAY), plan(MONDAY, canteen='htwg'),
+                                plan(TUESDAY + datetime.timedelta(days=1), stale=True)])
+    # recording a day again replaces it
+    assert 1 == archive.record([plan(TUESDAY, title='Gemüsecurry')])
+    columns = archive.columns()
+
+    assert 33 == len(columns)
+    assert [17756] * 22 + [17757] * 11 == list(columns.date)
+    assert ['giessberg', 'htwg'] == columns.dictionaries['canteen']
+    assert [0] * 11 + [1] * 11 + [0] * 11 == list(columns.codes['canteen'])
+    assert ['DE'] == columns.dictionaries['language']
+    assert 'Seezeit-Teller' == columns.dictionaries['category'][0]
+    assert 'Gemüsecurry' == columns.dictionaries['title'][columns.codes['title'][22]]
+    # Currywurst
+    assert 1 << analytics.DIETS.index('pork') | 1 << analytics.DIETS.index('beef') == columns.diet[0]
+    assert MONDAY_PRICES * 2 == list(columns.price[:22])
+    assert MONDAY_PER_100G * 2 == list(columns.per_100g[:22])
+
+
+def test_older_archive_gets_new_columns(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'plans.db')
+    with sqlite3.connect(path) as c:
+        c.execute('CREATE TABLE meals (canteen TEXT, language TEXT, date TEXT, position INTEGER, category_key TEXT, '
+                  'category TEXT, title TEXT, diet TEXT, PRIMARY KEY (canteen, language, date, position))')
+        c.execute("INSERT INTO meals VALUES ('giessberg', 'DE', '2018-08-13', 0, 'wok', 'Wok', 'Curry', 'poultry')")
+    archive = analytics.Archive(path)
+    columns = archive.columns()
+    archive.close()
+    assert [-1] == list(columns.price)
+    assert [0] == list(columns.per_100g)
+
+
+def test_to_numpy(archive, plan):
+    np = pytest.importorskip('numpy')
+    archive.record([plan(MONDAY), plan(TUESDAY)])
+    archive.record([plan(MONDAY)], Language.EN)
+    columns = archive.columns().to_numpy()
+
+    assert np.datetime64('2018-08-13') == columns['date'][0]
+    assert ['DE', 'EN'] == list(columns['language_values'])
+    assert MONDAY_PRICES == list(columns['price'][:11])
+    portions = columns['price'][(columns['price'] >= 0) & ~columns['per_100g']]
+    assert 0 < portions.min() and portions.max() < 1000
+
+
+def test_to_arrow(archive, plan, tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    pq = pytest.importorskip('pyarrow.parquet')
+    archive.record([plan(MONDAY), plan(TUESDAY)])
+    path = str(tmp_path / 'plans.parquet')
+    archive.columns().write(path)
+    table = pq.read_table(path)
+
+    assert 22 == table.num_rows
+    assert pa.types.is_dictionary(table.schema.field('title').type)
+    assert datetime.date(2018, 8, 14) == table.column('date')[21].as_py()
+    assert MONDAY_PRICES == table.column('price').to_pylist()[:11]
+    assert [bool(p) for p in MONDAY_PER_100G] == table.column('per_100g').to_pylist()[:11]
+
+
+def test_collect_and_export(monkeypatch, tmp_path):
+    server = SeezeitServer(shift_dates=False).start()
+    monkeypatch.setattr(settings, 'SEEZEIT_URL', server.url)
+    path = str(tmp_path / 'plans.db')
+    try:
+        archive = analytics.Archive(path)
+        # two weeks of giessberg in both languages, the weekends without meals
+        assert 28 == analytics.collect(archive, ['giessberg'], start=MONDAY)
+        columns = archive.columns()
+        archive.close()
+    finally:
+        server.shutdown()
+    assert {'DE', 'EN'} == set(columns.dictionaries['language'])
+    title = columns.dictionaries['title'].index('Hähnchen-Ananas-Curry | Wokgemüse | Basmatireis | 100g / 1,20 Euro')
+    wok = list(columns.codes['title']).index(title)
+    assert (120, 1) == (columns.price[wok], columns.per_100g[wok])
+    assert MONDAY_PRICES == list(columns.price[:11])
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ['export', '-a', path, '-o', str(tmp_path / 'plans.csv')])
+    assert 1 == result.exit_code
+    assert 'Unknown export format' in result.output
+    output = str(tmp_path / 'plans.npz')
+    result = runner.invoke(cli, ['export', '-a', path, '-o', output])
+    try:
+        import numpy
+    except ImportError:
+        assert 'needs numpy' in result.output
+    else:
+        assert 0 == result.exit_code, result.output
+        assert os.path.exists(output)
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import threading
+import types
+import urllib.error
+import urllib.request
+
+import pytest
+from requests_html import HTML
+
+from mensa_ukon.api import ApiServer
+from mensa_ukon.constants import CANTEENS, Language
+from mensa_ukon.mensa import MensaBase
+
+
+@pytest.fixture
+def server(monkeypatch):
+    path = os.path.sep.join((os.path.dirname(os.path.abspath(__file__)), 'giessberg.html'))
+    with open(path, encoding='utf-8') as f:
+        page = HTML(html=f.read())
+    requests = []
+    monkeypatch.setattr(MensaBase, 'do_request', lambda self, language=Language.DE: requests.append(language) or page)
+    server = ApiServer(('127.0.0.1', 0), max_age=60)
+    server.upstream_requests = requests
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path, headers=None):
+    req = urllib.request.Request('http://127.0.0.1:{}{}'.format(server.server_address[1], path), headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+class TestApi:
+
+    def test_canteens(self, server):
+        status, _, body = get(server, '/canteens')
+        assert 200 == status
+        assert list(CANTEENS) == [c['canteen'] for c in json.loads(body)]
+
+    def test_plan(self, server):
+        status, headers, body = get(server, '/plans/giessberg/2018-08-13?filter=wok')
+        assert 200 == status
+        plan = json.loads(body)
+        assert '2018-08-13' == plan['date']
+        assert ['wok'] == [m['category_key'] for m in plan['meals']]
+        assert headers['ETag'].startswith('"')
+        assert 'max-age=60' in headers['Cache-Control']
+
+    def test_range(self, server):
+        status, _, body = get(server, '/plans/giessberg?from=2018-08-16&to=2018-08-20')
+        plans = json.loads(body)['plans']
+        assert ['2018-08-16', '2018-08-17', '2018-08-18', '2018-08-19', '2018-08-20'] == [p['date'] for p in plans]
+        assert [11, 11, 0, 0, 11] == [len(p['meals']) for p in plans]
+
+    def test_etag_and_gzip(self, server):
+        _, headers, body = get(server, '/plans/giessberg/2018-08-13')
+        status, _, _ = get(server, '/plans/giessberg/2018-08-13', {'If-None-Match': headers['ETag']})
+        assert 304 == status
+        status, zipped_headers, zipped = get(server, '/plans/giessberg/2018-08-13', {'Accept-Encoding': 'gzip'})
+        assert 'gzip' == zipped_headers['Content-Encoding']
+        assert body == gzip.decompress(zipped)
+
+        # each representation has its own ETag, and only matches its own encoding
+        assert headers['ETag'] != zipped_headers['ETag']
+        assert 200 == get(server, '/plans/giessberg/2018-08-13', {'If-None-Match': headers['ETag'],
+                                                                  'Accept-Encoding': 'gzip'})[0]
+        assert 304 == get(server, '/plans/giessberg/2018-08-13', {'If-None-Match': zipped_headers['ETag'],
+                                                                  'Accept-Encoding': 'gzip'})[0]
+        assert 200 == get(server, '/plans/giessberg/2018-08-13', {'If-None-Match': zipped_headers['ETag']})[0]
+
+    def test_responses_are_cached(self, server):
+        for _ in range(3):
+            get(server, '/plans/giessberg/2018-08-13')
+        assert 1 == len(server.upstream_requests)
+
+    def test_today_after_midnight(self, server, monkeypatch):
+        import datetime
+        from mensa_ukon import api
+
+        class Date(datetime.date):
+            today_value = datetime.date(2018, 8, 13)
+
+            @classmethod
+            def today(cls):
+                return cls.today_value
+
+        monkeypatch.setattr(api, 'datetime', types.SimpleNamespace(date=Date, timedelta=datetime.timedelta))
+        assert '2018-08-13' == json.loads(get(server, '/plans/giessberg/today')[2])['date']
+        Date.today_value = datetime.date(2018, 8, 14)
+        assert '2018-08-14' == json.loads(get(server, '/plans/giessberg/today')[2])['date']
+
+    def test_errors(self, server):
+        assert 404 == get(server, '/plans/nowhere/2018-08-13')[0]
+        assert 400 == get(server, '/plans/giessberg/2018-13-45')[0]
+        assert 400 == get(server, '/plans/giessberg?from=2018-08-20&to=2018-08-13')[0]
+        assert 404 == get(server, '/')[0]
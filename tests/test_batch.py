@@ -0,0 +1,117 @@
+import datetime
+import json
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import batch, settings
+from mensa_ukon.constants import Language
+from scripts.mensa_cli import cli
+
+MONDAY = datetime.date(2018, 8, 13)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = SeezeitServer(shift_dates=False).start()
+    monkeypatch.setattr(settings, 'SEEZEIT_URL', server.url)
+    yield server
+    server.shutdown()
+
+
+def test_parse_query():
+    assert batch.Query('giessberg', MONDAY, Language.DE, None) == batch.parse_query('{}', today=MONDAY)
+    assert batch.Query('htwg', MONDAY + datetime.timedelta(days=1), Language.EN, 'wok') == \
+        batch.parse_query('{"canteen": "htwg", "date": "tomorrow", "language": "EN", "filter": "wok"}', today=MONDAY)
+    for line in ['[]', 'nope', '{"canteen": "moon"}', '{"date": "13.08.2018"}', '{"language": "FR"}', '{"x": 1}',
+                 '{"canteen": ["x"]}', '{"language": {}}', '{"date": 20180813}', '{"filter": 5}']:
+        with pytest.raises(batch.QueryError):
+            batch.parse_query(line)
+
+
+def test_run(server):
+    server.latency = 0.3
+    lines = []
+    for offset in range(10):
+        day = (MONDAY + datetime.timedelta(days=offset)).isoformat()
+        lines.append(json.dumps({'date': day}))
+        lines.append(json.dumps({'date': day, 'language': 'EN', 'filter': 'wok'}))
+    lines.insert(3, '{"canteen": "moon"}')
+    lines.insert(5, '')
+
+    start = time.monotonic()
+    answers = list(batch.run(lines))
+    # both pages are requested once, at the same time
+    assert time.monotonic() - start < 1.5
+    assert 2 == server.requests
+
+    assert 21 == len(answers)
+    assert {'error': "Unknown canteen: 'moon'", 'query': '{"canteen": "moon"}'} == answers[3]
+    del answers[3]
+    assert [(MONDAY + datetime.timedelta(days=o)).isoformat() for o in range(10) for _ in range(2)] == \
+        [a['date'] for a in answers]
+    assert any(m['title'].startswith('Hähnchen-Ananas-Curry') for m in answers[0]['meals'])
+    assert ['wok'] == [m['category_key'] for m in answers[1]['meals']]
+    assert 'EN' == answers[1]['language']
+    # sunday
+    assert [] == answers[12]['meals']
+
+
+def test_upstream_errors(server, monkeypatch):
+    monkeypatch.setattr(settings, 'RETRIES', 0)
+    server.error_rate = 1.0
+    [answer] = batch.run(['{}'])
+    assert answer['error'].startswith('Could not retrieve the canteen plan')
+
+
+def test_broken_group(server, monkeypatch):
+    retrieve = batch._retrieve_group
+
+    def broken(mensa, language, dates):
+        if mensa.location.shortcut == 'htwg':
+            raise ValueError('cannot parse')
+        return retrieve(mensa, language, dates)
+    monkeypatch.setattr(batch, '_retrieve_group', broken)
+    lines = ['{"canteen": "htwg", "date": "2018-08-13"}', '{"filter": 5}', '{"date": "2018-08-13"}']
+    broken_answer, invalid, answer = batch.run(lines)
+    assert {'error': 'Could not answer the query: cannot parse', 'query': lines[0]} == broken_answer
+    assert {'error': 'filter must be a string: 5', 'query': lines[1]} == invalid
+    assert '2018-08-13' == answer['date']
+
+
+def test_runs_of_days(server, monkeypatch):
+    assert [[MONDAY, MONDAY + datetime.timedelta(days=1)], [MONDAY + datetime.timedelta(days=11)]] == \
+        batch._runs({MONDAY + datetime.timedelta(days=11), MONDAY + datetime.timedelta(days=1), MONDAY})
+    # with fragments, the days between the runs are not requested
+    monkeypatch.setattr(settings, 'SOURCE', 'fragment')
+    monkeypatch.setattr(settings, 'MAX_MANAGER_URL', server.url)
+    lines = [json.dumps({'date': (MONDAY + datetime.timedelta(days=o)).isoformat()}) for o in (11, 0, 1)]
+    answers = list(batch.run(lines))
+    assert ['2018-08-24', '2018-08-13', '2018-08-14'] == [a['date'] for a in answers]
+    assert all(a['meals'] for a in answers)
+    assert 3 == server.requests
+
+
+def test_input_is_read_in_chunks(server, monkeypatch):
+    monkeypatch.setattr(batch, 'CHUNK', 2)
+    read = []
+
+    def lines():
+        for offset in range(5):
+            read.append(offset)
+            yield json.dumps({'date': (MONDAY + datetime.timedelta(days=offset)).isoformat()})
+    answers = batch.run(lines())
+    assert '2018-08-13' == next(answers)['date']
+    assert [0, 1] == read
+    assert ['2018-08-14', '2018-08-15', '2018-08-16', '2018-08-17'] == [a['date'] for a in answers]
+    # the later chunks reuse the page of the first one
+    assert 1 == server.requests
+
+
+def test_cli(server):
+    result = CliRunner().invoke(cli, ['batch'], input='{"date": "2018-08-13"}\n{"date": "2018-08-14"}\n')
+    assert 0 == result.exit_code, result.output
+    answers = [json.loads(l) for l in result.output.splitlines() if l.startswith('{')]
+    assert ['2018-08-13', '2018-08-14'] == [a['date'] for a in answers]
@@ -0,0 +1,33 @@
+from benchmarks import bench_mensa, fixtures
+from mensa_ukon import Mensa
+from mensa_ukon.constants import Language
+
+
+class TestBenchmarks:
+
+    def test_english_page_is_relabeled(self):
+        html = fixtures.page('giessberg', Language.EN)
+        assert '<span> Mon 13.08.</span>' in html
+        assert '<span> Mo. 13.08.</span>' not in html
+
+    def test_large_page(self):
+        days = Mensa(location='giessberg')._retrieve_plan(html=fixtures.large_page(factor=2))
+        assert 20 == len(days)
+        for day in days:
+            assert 11 == len(day.keys())
+
+    def test_compare_flags_regressions(self):
+        results = {'a': 2.0, 'b': 1.0, 'c': 1.0}
+        baseline = {'a': 1.0, 'b': 1.0}
+        compared = {name: regressed for name, _, _, _, regressed in bench_mensa.compare(results, baseline, 1.5)}
+        assert compared == {'a': True, 'b': False, 'c': False}
+
+    def test_run_single_benchmark(self):
+        results = bench_mensa.run(['clean_text'], repeat=1, number=1)
+        assert ['clean_text'] == list(results)
+        assert results['clean_text'] > 0
+
+    def test_run_all_benchmarks(self):
+        # every registered benchmark has to keep working against the current code
+        results = bench_mensa.run(repeat=1, number=1)
+        assert list(bench_mensa.BENCHMARKS) == list(results)
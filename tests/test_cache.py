@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pendulum
+import pytest
+
+from benchmarks.fake_redis import FakeRedis
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, settings
+from mensa_ukon.cache import CacheError, MemoryCache, RedisCache, SqliteCache, open_cache
+
+MONDAY = pendulum.date(2018, 8, 13)
+
+
+@pytest.fixture
+def redis():
+    server = FakeRedis().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def open_backend(request, tmp_path):
+    """Returns a function opening another handle to the same cache, as another process would."""
+    if request.param == 'memory':
+        shared = MemoryCache()
+        return lambda: shared
+    if request.param == 'sqlite':
+        return lambda: open_cache(f'sqlite:///{tmp_path}/cache.db')
+    redis = request.getfixturevalue('redis')
+    return lambda: open_cache(redis.url)
+
+
+class TestBackends:
+
+    def test_get_set(self, open_backend):
+        cache = open_backend()
+        assert [None, None] == cache.get_many(['a', 'b'])
+        cache.set_many({'a': b'1', 'b': b'\x00\xff'}, ttl=10)
+        assert [b'1', b'\x00\xff'] == open_backend().get_many(['a', 'b'])
+
+    def test_expiry(self, open_backend):
+        cache = open_backend()
+        cache.set('a', b'1', ttl=0.05)
+        time.sleep(0.1)
+        assert cache.get('a') is None
+
+    def test_lock(self, open_backend):
+        cache, other = open_backend(), open_backend()
+        token = cache.acquire('lock', ttl=10)
+        assert token is not None
+        assert other.acquire('lock', ttl=10) is None
+        assert other.locked('lock')
+        # only the holder can release it
+        other.release('lock', b'not the token')
+        assert cache.locked('lock')
+        cache.release('lock', token)
+        assert other.acquire('lock', ttl=10) is not None
+
+    def test_expired_lock_can_be_taken(self, open_backend):
+        cache = open_backend()
+        assert cache.acquire('lock', ttl=0.05) is not None
+        time.sleep(0.1)
+        assert open_backend().acquire('lock', ttl=10) is not None
+
+    def test_sqlite_purges_expired_rows(self, tmp_path):
+        cache = SqliteCache(str(tmp_path / 'cache.db'), purge_every=3)
+        cache.set_many({'a': b'1', 'b': b'2'}, ttl=0.05)
+        time.sleep(0.1)
+        cache.set('c', b'3', ttl=10)
+        rows = lambda: cache._connection().execute('SELECT key FROM cache ORDER BY key').fetchall()
+        assert 3 == len(rows())
+        # the third write purges
+        cache.set('d', b'4', ttl=10)
+        assert [('c',), ('d',)] == rows()
+        cache.set('e', b'5', ttl=0.05)
+        time.sleep(0.1)
+        # and so does opening the database
+        SqliteCache(cache.path)
+        assert [('c',), ('d',)] == rows()
+
+    def test_unreachable_redis(self):
+        with pytest.raises(CacheError):
+            RedisCache(port=1).get('a')
+
+
+class TestSharedPlans:
+
+    def setup_method(self):
+        self.server = SeezeitServer(shift_dates=False, latency=0.2).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    def test_workers_share_one_fetch(self, open_backend, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        # one Mensa (and HTTP session) per worker, as in separate processes
+        workers = [Mensa('giessberg', cache=open_backend()) for _ in range(4)]
+        results = [None] * len(workers)
+
+        def work(i):
+            results[i] = list(workers[i].retrieve_days(MONDAY.add(days=i), 2))
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(len(workers))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert 1 == self.server.requests
+        expected = list(Mensa('giessberg').retrieve_days(MONDAY, 5))
+        for i, plans in enumerate(results):
+            assert expected[i:i + 2] == plans
+
+    def test_filter_on_cached_plans(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        cache = MemoryCache()
+        Mensa('giessberg', cache=cache).retrieve(MONDAY)
+        plan = Mensa('giessberg', cache=cache).retrieve(MONDAY, filter_meal='teller')
+        assert ['seezeit-teller'] == list(plan.meals)
+        assert 1 == self.server.requests
+
+    def test_unreachable_cache_falls_back(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        plan = Mensa('giessberg', cache=RedisCache(port=1)).retrieve(MONDAY)
+        assert plan.meals
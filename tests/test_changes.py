@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+from requests_html import HTML
+
+from benchmarks import fixtures
+from mensa_ukon import Mensa, changes
+from mensa_ukon.constants import DayDiff, Language, Meal
+
+
+def _parse(m, html, language=Language.DE):
+    labels, days = m._parse_page(HTML(html=html), language)
+    return labels, list(days)
+
+
+class TestChanges:
+
+    def test_hashes_are_stable(self):
+        html = fixtures.reference_page()
+        _, days = _parse(Mensa('giessberg'), html)
+        _, again = _parse(Mensa('giessberg', parser='lxml'), html)
+        assert [d.hash for d in days] == [d.hash for d in again]
+        assert [d.hashes for d in days] == [d.hashes for d in again]
+        # two weeks with different meals every day
+        assert 10 == len({d.hash for d in days})
+
+    def test_day_equals_dict(self):
+        meal = Meal('Seezeit-Teller', 'Currywurst', [])
+        day = changes.Day([('seezeit-teller', meal)])
+        assert OrderedDict([('seezeit-teller', meal)]) == day
+        assert changes.meal_hash(meal) == day.hashes['seezeit-teller']
+        assert changes.Day([('seezeit-teller', meal._replace(title='Bratwurst'))]).hash != day.hash
+        assert changes.Day([('seezeit-teller', meal._replace(per_100g=True))]).hash != day.hash
+
+    def test_refetch_emits_diff(self):
+        html = fixtures.reference_page()
+        m = Mensa('giessberg')
+        received = []
+        m.change_listeners.append(lambda language, diffs: received.append((language, diffs)))
+        _parse(m, html)
+        # unchanged page
+        _parse(m, html + ' ')
+        assert [] == received
+
+        _parse(m, html.replace('Currywurst', 'Bratwurst', 1))
+        assert [(Language.DE, [DayDiff('Mo. 13.08.', [], [], ['seezeit-teller'])])] == received
+
+    def test_price_change_emits_diff(self):
+        html = fixtures.reference_page()
+        m = Mensa('giessberg')
+        received = []
+        m.change_listeners.append(lambda language, diffs: received.append(diffs))
+        _, days = _parse(m, html)
+        _, changed = _parse(m, html.replace('3,10 € Studierende', '3,30 € Studierende', 1))
+        assert [[DayDiff('Mo. 13.08.', [], [], ['seezeit-teller'])]] == received
+        assert 330 == changed[0]['seezeit-teller'].price
+        assert days[0].hash != changed[0].hash
+        assert [d.hash for d in days[1:]] == [d.hash for d in changed[1:]]
+
+    def test_diff_added_and_removed(self):
+        meal = Meal('Seezeit-Teller', 'Currywurst', [])
+        old = [changes.Day([('a', meal), ('b', meal)])]
+        new = [changes.Day([('a', meal), ('c', meal)]), changes.Day([('a', meal)])]
+        assert [DayDiff('Mo. 13.08.', ['c'], ['b'], []), DayDiff('Di. 14.08.', ['a'], [], [])] == \
+            changes.diff(['Mo. 13.08.'], old, ['Mo. 13.08.', 'Di. 14.08.'], new)
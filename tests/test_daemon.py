@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import pendulum
+import pytest
+from click.testing import CliRunner
+from requests_html import HTML
+
+from mensa_ukon import Mensa, daemon, opening
+from mensa_ukon.constants import Language
+from mensa_ukon.mensa import MensaBase
+from scripts.mensa_cli import cli
+
+
+def html():
+    path = os.path.sep.join((os.path.dirname(os.path.abspath(__file__)), 'giessberg.html'))
+    with open(path, encoding='utf-8') as f:
+        return HTML(html=f.read())
+
+
+@pytest.fixture
+def page(monkeypatch):
+    page = html()
+    monkeypatch.setattr(MensaBase, 'do_request', lambda self, language=Language.DE: page)
+    return page
+
+
+@pytest.fixture
+def socket_path():
+    # unix socket paths are limited in length, so don't use pytest's tmp_path
+    d = tempfile.mkdtemp(prefix='mensa')
+    yield os.path.join(d, 'mensa.sock')
+    shutil.rmtree(d)
+
+
+@pytest.fixture
+def server(page, socket_path):
+    server = daemon.PlanServer(socket_path, refresh_interval=3600)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestDaemon:
+
+    def test_query(self, server):
+        day = pendulum.date(2018, 8, 16)
+        plans = daemon.query('giessberg', day, days=3, path=server.path)
+        expected = list(Mensa('giessberg').retrieve_days(day, 3))
+        assert [p.date for p in expected] == [p.date for p in plans]
+        assert [p.meals for p in expected] == [p.meals for p in plans]
+        assert plans[2].meals is None
+
+    def test_query_errors_fall_back(self, server):
+        assert daemon.query('giessberg', pendulum.date(2018, 8, 13), language=Language.DE,
+                            filter_meal=None, path=server.path + '.missing') is None
+
+    def test_already_running(self, server):
+        with pytest.raises(daemon.DaemonError):
+            daemon.PlanServer(server.path)
+
+    def test_stale_socket(self, page, socket_path):
+        with open(socket_path, 'w'):
+            pass
+        server = daemon.PlanServer(socket_path)
+        server.server_close()
+        assert not os.path.exists(socket_path)
+
+    def test_close_stops_refreshing(self, page, socket_path, monkeypatch):
+        server = daemon.PlanServer(socket_path, refresh_interval=3600)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        server.shutdown()
+        server.server_close()
+        assert not server._refresher.is_alive()
+
+        # a closed server doesn't request any page
+        requested = []
+        monkeypatch.setattr(MensaBase, 'do_request', lambda self, language=Language.DE: requested.append(language))
+        server.refresh()
+        assert not requested
+
+    def test_cli_uses_daemon(self, server, monkeypatch):
+        monkeypatch.setattr(daemon.settings, 'SOCKET', server.path)
+        queried = []
+        original = daemon.query
+        monkeypatch.setattr(daemon, 'query', lambda *args, **kwargs: queried.append(args) or original(*args, **kwargs))
+        result = CliRunner().invoke(cli, ['-d', '2018-08-13', '-f', 'ndjson', 'wok'])
+        assert 0 == result.exit_code
+        assert '"category_key": "wok"' in result.output
+        assert queried
+
+    def test_closed_day(self, server, monkeypatch):
+        # once the page was parsed, the saturday is known to be closed
+        daemon.query('giessberg', pendulum.date(2018, 8, 13), path=server.path)
+        [plan] = daemon.query('giessberg', pendulum.date(2018, 8, 18), path=server.path)
+        assert plan.meals is None
+        assert opening.CLOSED == plan.status
+
+        monkeypatch.setattr(daemon.settings, 'SOCKET', server.path)
+        result = CliRunner().invoke(cli, ['-d', '2018-08-18'])
+        assert 0 == result.exit_code
+        assert 'The canteen is closed on' in result.output
+
+    def test_cli_falls_back(self, page, socket_path, monkeypatch):
+        monkeypatch.setattr(daemon.settings, 'SOCKET', socket_path)
+        result = CliRunner().invoke(cli, ['-d', '2018-08-13', 'wok'])
+        assert 0 == result.exit_code
+        assert 'Hähnchen-Ananas-Curry' in result.output
@@ -0,0 +1,63 @@
+import json
+import os
+
+import msgpack
+import pendulum
+from requests_html import HTML
+
+from benchmarks.fixtures import MONDAY
+from mensa_ukon import Mensa
+from mensa_ukon.constants import FORMATTERS
+from mensa_ukon.formats import meal_records, plan_dict
+
+
+def html():
+    path = os.path.sep.join((os.path.dirname(os.path.abspath(__file__)), 'giessberg.html'))
+    with open(path, encoding='utf-8') as f:
+        return HTML(html=f.read())
+
+
+class TestFormats:
+
+    def test_meal_fields(self, plan):
+        records = list(meal_records(plan(MONDAY, filter_meal='teller')))
+        assert [{
+            'canteen': 'giessberg',
+            'date': '2018-08-13',
+            'category_key': 'seezeit-teller',
+            'category': 'Seezeit-Teller',
+            'title': 'Currywurst | Pommes frites | Salat-Salatsauce mit Kräutern | Stracciatellajoghurt',
+            'diet': ['pork', 'beef'],
+            'price': 310,
+            'per_100g': False,
+        }] == records
+
+    def test_json(self, plan):
+        p = plan(MONDAY)
+        doc = json.loads(FORMATTERS['json'](p))
+        assert doc == plan_dict(p)
+        assert 11 == len(doc['meals'])
+
+    def test_ndjson(self, plan):
+        lines = FORMATTERS['ndjson'](plan(MONDAY)).split('\n')
+        assert 11 == len(lines)
+        assert all('2018-08-13' == json.loads(l)['date'] for l in lines)
+
+    def test_msgpack(self, plan):
+        p = plan(MONDAY)
+        assert plan_dict(p) == msgpack.unpackb(FORMATTERS['msgpack'](p), raw=False)
+
+    def test_empty_plan(self, plan):
+        p = plan(MONDAY, filter_meal='does not exist')
+        assert '' == FORMATTERS['ndjson'](p)
+        assert [] == json.loads(FORMATTERS['json'](p))['meals']
+
+
+class TestRetrieveDays:
+
+    def test_days_in_order(self, monkeypatch):
+        m = Mensa(location='giessberg')
+        monkeypatch.setattr(m, 'do_request', lambda language: html())
+        plans = list(m.retrieve_days(pendulum.date(2018, 8, 16), days=5))
+        assert [16, 17, 18, 19, 20] == [p.date.day for p in plans]
+        assert [True, True, False, False, True] == [p.meals is not None for p in plans]
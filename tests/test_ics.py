@@ -0,0 +1,86 @@
+import datetime
+import os
+
+from click.testing import CliRunner
+
+from benchmarks.fixtures import MONDAY
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import ics, settings
+from mensa_ukon.emojize import Emoji
+from scripts.mensa_cli import cli
+
+TUESDAY = MONDAY + datetime.timedelta(days=1)
+
+
+def events(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        text = f.read().replace('\r\n ', '')
+    return [e.split('END:VEVENT')[0] for e in text.split('BEGIN:VEVENT')[1:]]
+
+
+class TestFeed:
+
+    def test_writes_events(self, tmp_path, plan):
+        path = str(tmp_path / 'mensa.ics')
+        closed = plan(TUESDAY + datetime.timedelta(days=1))._replace(meals=None)
+        monday = plan(MONDAY, title='Currywurst; Pommes')
+        assert ics.Feed(path).update([monday, plan(TUESDAY), closed], today=MONDAY)
+        with open(path, 'rb') as f:
+            content = f.read()
+        assert content.startswith(b'BEGIN:VCALENDAR\r\n') and content.endswith(b'END:VCALENDAR\r\n')
+        assert all(len(l) <= 75 for l in content.split(b'\r\n'))
+        first, second = events(path)
+        assert 'UID:giessberg-20180813-de@mensa-ukon' in first
+        assert 'DTSTART;VALUE=DATE:20180813\r\nDTEND;VALUE=DATE:20180814' in first
+        assert 'Seezeit-Teller: Currywurst\\; Pommes ' + Emoji.PIG + ' ' + Emoji.COW + '\\nhin&weg: Geschlossen' in first
+        assert 'CATEGORIES:Seezeit-Teller,hin&weg,KombinierBar,Beilagen,' in first
+        assert '20180814' in second
+
+    def test_unchanged_days_are_not_rewritten(self, tmp_path, plan):
+        path = str(tmp_path / 'mensa.ics')
+        feed = ics.Feed(path)
+        feed.update([plan(MONDAY), plan(TUESDAY)], today=MONDAY)
+        tag, mtime = feed.etag, os.stat(path).st_mtime_ns
+        before = events(path)
+
+        feed = ics.Feed(path)
+        assert not feed.update([plan(MONDAY), plan(TUESDAY), plan(TUESDAY, 'Tofu', stale=True)], today=MONDAY)
+        assert tag == feed.etag
+        assert mtime == os.stat(path).st_mtime_ns
+
+        assert feed.update([plan(MONDAY), plan(TUESDAY, 'Tofu')], today=MONDAY)
+        assert tag != feed.etag
+        after = events(path)
+        # only the changed day is rendered again
+        assert before[0] == after[0]
+        assert 'SEQUENCE:1' in after[1] and 'Tofu' in after[1]
+
+    def test_closed_and_past_days_are_removed(self, tmp_path, plan):
+        path = str(tmp_path / 'mensa.ics')
+        feed = ics.Feed(path, keep_days=7)
+        feed.update([plan(MONDAY), plan(TUESDAY)], today=MONDAY)
+        assert feed.update([plan(TUESDAY)._replace(meals=None)], today=MONDAY)
+        assert 1 == len(events(path))
+        assert feed.update([], today=MONDAY + datetime.timedelta(days=8))
+        assert [] == events(path)
+
+
+def test_fold_keeps_characters_whole():
+    folded = ics._fold('DESCRIPTION:' + 'ä' * 100)
+    assert all(len(l.encode('utf-8')) <= 75 for l in folded.split('\r\n'))
+    assert 'DESCRIPTION:' + 'ä' * 100 == folded.replace('\r\n ', '')
+
+
+def test_cli(tmp_path, monkeypatch):
+    server = SeezeitServer().start()
+    try:
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', server.url)
+        path = str(tmp_path / 'mensa.ics')
+        result = CliRunner().invoke(cli, ['ics', '-o', path, '--no-daemon'])
+        assert 0 == result.exit_code, result.output
+        assert 'Wrote ' + path in result.output
+        assert events(path)
+        result = CliRunner().invoke(cli, ['ics', '-o', path, '--no-daemon'])
+        assert 'is up to date' in result.output
+    finally:
+        server.shutdown()
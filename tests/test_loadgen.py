@@ -0,0 +1,73 @@
+import datetime
+import urllib.error
+import urllib.request
+
+from benchmarks import fixtures, loadgen
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, settings
+from mensa_ukon.constants import Language
+
+
+class TestSeezeitServer:
+
+    def setup_method(self):
+        self.server = SeezeitServer(shift_dates=False).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    def test_replays_pages(self):
+        url = self.server.url + '/essen/speiseplaene/mensa-giessberg/'
+        with urllib.request.urlopen(url) as resp:
+            assert fixtures.page().encode('utf-8') == resp.read()
+            etag = resp.headers['ETag']
+        req = urllib.request.Request(url, headers={'If-None-Match': etag})
+        try:
+            urllib.request.urlopen(req)
+            assert False, 'expected 304'
+        except urllib.error.HTTPError as e:
+            assert 304 == e.code
+
+    def test_errors(self):
+        self.server.error_rate = 1.0
+        try:
+            urllib.request.urlopen(self.server.url + '/en/food/menus/giessberg-canteen/')
+            assert False, 'expected 503'
+        except urllib.error.HTTPError as e:
+            assert 503 == e.code
+
+    def test_mensa_uses_stand_in(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        m = Mensa(location='giessberg')
+        for language in Language:
+            days = m._retrieve_plan(language=language)
+            assert 10 == len(days)
+
+
+def test_shift_dates():
+    html = fixtures.shift_dates(fixtures.page(), Language.DE, datetime.date(2026, 12, 28))
+    assert '<span> Mo. 28.12.</span>' in html
+    assert '<span> Fr. 08.01.</span>' in html
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert 50 == loadgen.percentile(values, 50)
+    assert 99 == loadgen.percentile(values, 99)
+    assert 100 == loadgen.percentile(values, 100)
+
+
+def test_load_run():
+    token = settings.TOKEN
+    stats = loadgen.run(requests=3, timeout=30)
+    assert stats['completed']
+    assert 3 == stats['replies']
+    assert stats['p50'] <= stats['p99']
+    assert token == settings.TOKEN
+
+
+def test_load_run_asyncio():
+    for webhook in (False, True):
+        stats = loadgen.run(requests=3, timeout=30, webhook=webhook, use_asyncio=True)
+        assert stats['completed']
+        assert 3 == stats['replies']
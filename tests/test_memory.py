@@ -0,0 +1,132 @@
+from click.testing import CliRunner
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, memory, settings
+from mensa_ukon.cache import MemoryCache
+from mensa_ukon.constants import Language
+from scripts.mensa_cli import cli
+
+
+class TestLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        cache = memory.LRUCache('test', max_bytes=3000, sizeof=lambda obj: 1000 if isinstance(obj, str) else 0)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['c'] = 3
+        assert 1 == cache.get('a')
+        cache['d'] = 4
+        assert 'b' not in cache
+        assert ['a', 'c', 'd'] == sorted(cache._data)
+        assert 3000 == cache.bytes
+        assert 1 == cache.evictions
+
+    def test_max_entries(self):
+        cache = memory.LRUCache('test', max_entries=2)
+        for i in range(5):
+            cache[i] = str(i)
+        assert 2 == len(cache)
+        assert '4' == cache.get(4)
+        assert 3 == cache.evictions
+
+    def test_oversized_entries_are_not_stored(self):
+        cache = memory.LRUCache('test', max_bytes=1000)
+        cache['small'] = 'x'
+        cache['large'] = 'x' * 2000
+        assert 'small' in cache
+        assert 'large' not in cache
+        assert 1 == cache.evictions
+
+    def test_pop_and_clear(self):
+        cache = memory.LRUCache('test')
+        cache['a'] = 'x' * 100
+        assert 100 < cache.bytes
+        assert 'x' * 100 == cache.pop('a')
+        assert 0 == cache.bytes
+        cache['b'] = value = ['b']
+        assert not cache.pop_if('b', ['b'])
+        assert cache.pop_if('b', value)
+        assert 'b' not in cache
+        cache['c'] = 1
+        cache.clear()
+        assert 0 == len(cache)
+
+    def test_stats_and_report(self):
+        cache = memory.LRUCache('test:report', max_bytes=10000)
+        cache['a'] = 'x' * 100
+        stats = [s for s in memory.stats() if s['name'] == 'test:report']
+        assert [{'name': 'test:report', 'entries': 1, 'bytes': cache.bytes, 'max_bytes': 10000,
+                 'evictions': 0}] == stats
+        report = memory.report()
+        assert 'test:report' in report
+        assert 'peak RSS' in report
+
+
+def test_sizeof_counts_shared_objects_once():
+    text = 'x' * 1000
+    assert memory.sizeof([text, text]) < 2 * memory.sizeof(text)
+    assert memory.sizeof({'a': [text]}) > 1000
+
+
+def test_memory_cache_is_bounded():
+    cache = MemoryCache(max_bytes=10000)
+    for i in range(100):
+        cache.set(str(i), b'x' * 1000, 60)
+    assert cache._data.bytes <= 10000
+    assert cache.get('99') == b'x' * 1000
+    assert cache.get('0') is None
+    # locks are not evicted
+    token = cache.acquire('lock', 60)
+    cache.set_many({str(i): b'x' * 1000 for i in range(100, 200)}, 60)
+    assert cache.locked('lock')
+    cache.release('lock', token)
+    assert not cache.locked('lock')
+
+
+def test_memory_cache_keeps_entry_set_during_expiry():
+    cache = MemoryCache()
+    cache.set('a', b'old', -1)
+    get = cache._data.get
+
+    def get_then_set(key):
+        # another thread sets the key after this one saw the expired entry
+        entry = get(key)
+        cache.set('a', b'new', 60)
+        return entry
+    cache._data.get = get_then_set
+    assert cache.get('a') is None
+    cache._data.get = get
+    assert b'new' == cache.get('a')
+
+
+class TestBoundedMensa:
+
+    def setup_method(self):
+        self.server = SeezeitServer().start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    def test_caches_stay_within_budget(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        monkeypatch.setattr(settings, 'HTTP_CACHE_BYTES', 100000)
+        # room for one parsed page (~190 KB)
+        monkeypatch.setattr(settings, 'PARSED_CACHE_BYTES', 250000)
+        m = Mensa('giessberg')
+        assert m.retrieve().meals
+        assert m.retrieve(language=Language.EN).meals
+        http, parsed = m.session.get_adapter(self.server.url).cache.lru, m._parsed
+        assert 0 < http.bytes <= 100000
+        assert 1 == len(parsed)
+        assert 1 == parsed.evictions
+        # the evicted page is parsed again
+        assert m.retrieve().meals
+        assert 2 == parsed.evictions
+
+    def test_diagnostics(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        result = CliRunner().invoke(cli, ['diagnostics', '-c', 'giessberg', '--top', '3'])
+        assert 0 == result.exit_code, result.output
+        assert 'http:giessberg' in result.output
+        assert 'parsed:giessberg' in result.output
+        assert 'top 3 allocators' in result.output
@@ -0,0 +1,103 @@
+import datetime
+import logging
+
+import pendulum
+from click.testing import CliRunner
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, opening, settings
+from mensa_ukon.constants import CANTEENS, Language, Plan
+from mensa_ukon.mensabot import MensaReplies
+from scripts.mensa_cli import cli
+
+MONDAY = datetime.date(2018, 8, 13)
+LABELS = ['Mo. 13.08.', 'Di. 14.08.', 'Mi. 15.08.', 'Do. 16.08.', 'Fr. 17.08.',
+          'Mon. 20.08.', 'Tue. 21.08.', 'Wed. 22.08.', 'Thu. 23.08.']
+
+
+def test_holidays():
+    assert datetime.date(2024, 3, 31) == opening.easter(2024)
+    assert datetime.date(2025, 4, 20) == opening.easter(2025)
+    days = opening.holidays(2025)
+    assert 'Karfreitag' == days[datetime.date(2025, 4, 18)]
+    assert 'Fronleichnam' == days[datetime.date(2025, 6, 19)]
+    assert 'Heilige Drei Könige' == days[datetime.date(2025, 1, 6)]
+    assert datetime.date(2025, 8, 15) not in days
+
+
+class TestOpeningCalendar:
+
+    def test_weekdays_and_holidays(self):
+        giessberg = opening.OpeningCalendar(CANTEENS['giessberg'])
+        htwg = opening.OpeningCalendar(CANTEENS['htwg'])
+        saturday = datetime.date(2018, 8, 18)
+        assert giessberg.status(saturday) is None
+        assert opening.CLOSED == htwg.status(saturday)
+        assert opening.CLOSED == giessberg.status(saturday + datetime.timedelta(days=1))
+        assert opening.CLOSED == giessberg.status(datetime.date(2018, 10, 3))
+        assert giessberg.status(MONDAY) is None
+
+    def test_tabs(self):
+        calendar = opening.OpeningCalendar(CANTEENS['giessberg'])
+        calendar.saw(LABELS)
+        assert calendar.status(MONDAY) is None
+        assert calendar.status(pendulum.date(2018, 8, 23)) is None
+        # no tab, although a weekday of giessberg
+        assert opening.CLOSED == calendar.status(datetime.date(2018, 8, 18))
+        assert opening.UNPUBLISHED == calendar.status(datetime.date(2018, 8, 24))
+        assert opening.UNPUBLISHED == calendar.status(datetime.date(2019, 5, 1))
+        assert opening.EXPIRED == calendar.status(datetime.date(2018, 8, 10))
+        assert opening.EXPIRED == calendar.status(datetime.date(2017, 12, 1))
+
+    def test_tabs_expire(self):
+        calendar = opening.OpeningCalendar(CANTEENS['giessberg'], ttl=0)
+        calendar.saw(LABELS)
+        assert calendar.status(datetime.date(2018, 8, 24)) is None
+
+    def test_tabs_across_new_year(self):
+        calendar = opening.OpeningCalendar(CANTEENS['htwg'])
+        calendar.saw(['Mo. 29.12.', 'Di. 30.12.', 'Fr. 02.01.'])
+        assert calendar.status(datetime.date(2015, 1, 2)) is None
+        assert opening.CLOSED == calendar.status(datetime.date(2015, 1, 1))
+        assert opening.UNPUBLISHED == calendar.status(datetime.date(2015, 1, 5))
+
+
+class TestClosedDays:
+
+    def setup_method(self):
+        self.server = SeezeitServer(shift_dates=False).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    def test_answered_without_upstream(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        m = Mensa('giessberg')
+        sunday = pendulum.date(2018, 8, 19)
+        assert opening.CLOSED == m.retrieve(sunday).status
+        assert 0 == self.server.requests
+
+        assert m.retrieve(pendulum.date(2018, 8, 13)).meals
+        assert 1 == self.server.requests
+        # a saturday of giessberg, but without a tab
+        plans = list(m.retrieve_days(pendulum.date(2018, 8, 25), 3))
+        assert [opening.UNPUBLISHED] * 3 == [p.status for p in plans]
+        assert 1 == self.server.requests
+        # together with a day that may have a plan, all days are retrieved
+        friday, saturday = m.retrieve_days(pendulum.date(2018, 8, 17), 2)
+        assert friday.meals and saturday.meals is None
+
+    def test_cli(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        result = CliRunner().invoke(cli, ['-d', '2018-10-03', '--no-daemon'])
+        assert 'The canteen is closed on Wednesday 03 October 2018.' in result.output
+        assert 0 == self.server.requests
+
+
+def test_reply_text():
+    replies = MensaReplies()
+    replies.logger = logging.getLogger(__name__)
+    date = pendulum.date(2018, 8, 19)
+    text = replies._msg_text_for_meals(date, Plan(CANTEENS['giessberg'], None, date, status=opening.CLOSED),
+                                       Language.EN)
+    assert 'The canteen is closed on Sunday, 19. August 2018.' in text
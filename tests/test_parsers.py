@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from benchmarks import fixtures
+from mensa_ukon import Mensa, parsers
+from mensa_ukon.constants import Language
+from mensa_ukon.emojize import Emoji
+
+MEAL_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meal.html')
+
+
+def _pages():
+    for canteen, language, html in fixtures.pages():
+        yield f'{canteen}-{language.name}', canteen, language, html
+    yield 'large', 'giessberg', Language.DE, fixtures.large_page(factor=2)
+
+
+PAGES = list(_pages())
+BACKENDS = [p for p in parsers.PARSERS if p != parsers.REFERENCE]
+
+
+def _backend(name):
+    if name not in parsers.available():
+        pytest.skip(f'{name} is not installed')
+    return parsers.get(name)
+
+
+class TestParsers:
+
+    @pytest.mark.parametrize('backend', BACKENDS)
+    @pytest.mark.parametrize('page', PAGES, ids=[p[0] for p in PAGES])
+    def test_conformance(self, backend, page):
+        _, canteen, language, html = page
+        parser = _backend(backend)
+        expected = Mensa(canteen, parser=parsers.REFERENCE)._retrieve_plan(html=html, language=language)
+        assert expected == Mensa(canteen, parser=parser)._retrieve_plan(html=html, language=language)
+        assert Mensa._date_labels(html, parsers.REFERENCE) == Mensa._date_labels(html, parser)
+
+    @pytest.mark.parametrize('backend', list(parsers.PARSERS))
+    def test_meal_icons(self, backend):
+        parser = _backend(backend)
+        with open(MEAL_PAGE, encoding='utf-8') as f:
+            tab = parser.document(f.read())
+        meal, = parser.meals(tab)
+        assert [Emoji.PIG, Emoji.COW] == Mensa._meal_icons(meal, parser)
+        assert 'Seezeit-Teller' == Mensa._meal_category(meal, parser)
+        assert (310, False) == Mensa._meal_price(meal, Mensa._meal_title(meal, parser), parser)
+
+    def test_prices(self):
+        # the price for students, or the one in the title of meals without prices
+        assert (310, False) == Mensa._parse_price('3,10 € Studierende | 3,80 € Schüler | 4,25 € Mitarbeiter', '')
+        assert (310, False) == Mensa._parse_price('3,80 € Schüler | 3,10 € Students', '')
+        assert (120, True) == Mensa._parse_price(None, 'Hähnchen-Ananas-Curry | Basmatireis | 100g / 1,20 Euro')
+        assert (120, True) == Mensa._parse_price(None, 'Reis | 100g / 1,20 Eruo')
+        assert (490, False) == Mensa._parse_price(None, 'Currysauce | ohne Softdrink 4,90 Euro mit Softdrink 5,40 Euro')
+        assert (None, False) == Mensa._parse_price(None, 'Geschlossen vom 13/08/2018 - 14/09/2018')
+
+    def test_reference_page(self):
+        labels = Mensa._date_labels(fixtures.reference_page())
+        assert 10 == len(labels)
+        assert 'Mo. 13.08.' == labels[0]
+
+    def test_unknown_parser(self):
+        with pytest.raises(ValueError):
+            Mensa('giessberg', parser='regex')
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+from mensa_ukon.constants import Language, Meal, Preferences
+from mensa_ukon.emojize import Emoji
+from mensa_ukon.preferences import PreferenceStore, filter_meals
+
+VEGAN = Preferences(canteen='htwg', language=Language.EN, diet='vegan', exclude=('fish', 'pork'),
+                    subscription='11:30')
+
+
+class TestPreferenceStore:
+
+    def test_defaults(self, tmp_path):
+        store = PreferenceStore(str(tmp_path / 'prefs.db'))
+        assert Preferences() == store.get(1)
+        store.close()
+
+    def test_persists(self, tmp_path):
+        path = str(tmp_path / 'prefs.db')
+        store = PreferenceStore(path)
+        store.set(1, VEGAN)
+        assert VEGAN == store.get(1)
+        store.close()
+        assert VEGAN == PreferenceStore(path).get(1)
+
+    def test_lookups_are_cached(self, tmp_path):
+        store = PreferenceStore(str(tmp_path / 'prefs.db'), capacity=2)
+        for _ in range(3):
+            store.get(1)
+            store.get(2)
+        # chats without preferences are remembered too
+        assert 2 == store.loads
+        store.get(3)
+        assert 2 == len(store)
+        # chat 1 was evicted as least recently used
+        store.get(1)
+        assert 4 == store.loads
+        store.close()
+
+    def test_cached_does_not_load(self, tmp_path):
+        path = str(tmp_path / 'prefs.db')
+        store = PreferenceStore(path)
+        store.set(1, VEGAN)
+        store.close()
+        store = PreferenceStore(path)
+        assert store.cached(1) is None
+        assert 0 == store.loads
+        assert VEGAN == store.get(1)
+        assert VEGAN == store.cached(1)
+        store.close()
+
+    def test_batched_writes(self, tmp_path):
+        path = str(tmp_path / 'prefs.db')
+        store = PreferenceStore(path, capacity=10, flush_interval=0.2)
+        for chat_id in range(100):
+            store.set(chat_id, VEGAN)
+        # evicted, but not written yet
+        assert VEGAN == store.get(0)
+        assert 0 == store.loads
+
+        other = PreferenceStore(path)
+        assert Preferences() == other.get(99)
+        store._writer.join(0.5)
+        assert VEGAN == PreferenceStore(path).get(99)
+        store.close()
+
+    def test_concurrent_sets(self, tmp_path):
+        store = PreferenceStore(str(tmp_path / 'prefs.db'), capacity=10, flush_interval=0.01)
+
+        def work(offset):
+            for chat_id in range(offset, offset + 50):
+                store.set(chat_id, VEGAN._replace(subscription=str(chat_id)))
+                store.get(chat_id - 25)
+
+        threads = [threading.Thread(target=work, args=(i * 50,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        store.close()
+        store = PreferenceStore(store.path)
+        assert all(str(c) == store.get(c).subscription for c in range(200))
+
+
+def test_filter_meals():
+    meals = OrderedDict([
+        ('a', Meal('A', 'Tofu', [Emoji.SEEDLING])),
+        ('b', Meal('B', 'Cheese', [Emoji.CHEESE])),
+        ('c', Meal('C', 'Fish', [Emoji.FISH])),
+        ('d', Meal('D', 'Schnitzel', [Emoji.PIG, Emoji.FARMER])),
+    ])
+    assert ['a'] == list(filter_meals(meals, 'vegan'))
+    assert ['a', 'b'] == list(filter_meals(meals, 'vegetarian'))
+    assert ['a', 'b'] == list(filter_meals(meals, exclude=('fish', 'pork')))
+    assert meals is filter_meals(meals)
+    assert filter_meals(OrderedDict([('c', meals['c'])]), 'vegan') is None
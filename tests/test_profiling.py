@@ -0,0 +1,85 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+import pytest
+
+from click.testing import CliRunner
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import profiling, settings
+from scripts.mensa_cli import cli
+
+
+def busy(seconds=0.05):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+    return 42
+
+
+class TestProfile:
+
+    def test_pstats(self, tmp_path):
+        with profiling.Profile('busy', str(tmp_path)) as profile:
+            busy()
+        assert profile.path.endswith('.prof')
+        stats = pstats.Stats(profile.path)
+        assert any(name == 'busy' for _, _, name in stats.stats)
+
+    def test_collapsed(self, tmp_path):
+        with profiling.Profile('busy', str(tmp_path / 'profiles'), 'collapsed') as profile:
+            busy()
+        with open(profile.path) as f:
+            lines = f.read().splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(' ', 1)
+        assert int(count) > 0
+        assert any('busy (test_profiling.py:' in l.split(';')[-1] for l in lines)
+
+    @pytest.mark.parametrize('format', profiling.FORMATS)
+    def test_write_errors_do_not_fail(self, tmp_path, format):
+        (tmp_path / 'file').write_text('')
+        # the directory cannot be created below a file
+        with profiling.Profile('busy', str(tmp_path / 'file' / 'profiles'), format) as profile:
+            assert 42 == busy(0)
+        assert profile.path is None or not os.path.exists(profile.path)
+        # the profiler is stopped nevertheless
+        assert sys.getprofile() is None
+        assert not any(t.name == 'profile-sampler' for t in threading.enumerate())
+
+    def test_other_profiler_active(self, tmp_path, monkeypatch):
+        class Active(cProfile.Profile):
+            def enable(self):
+                # as cProfile raises since Python 3.12 if another profiler is active
+                raise RuntimeError('Another profiling tool is already active')
+        monkeypatch.setattr(profiling.cProfile, 'Profile', Active)
+        with profiling.Profile('busy', str(tmp_path)) as profile:
+            assert 42 == busy(0)
+        assert profile.path is None
+        assert [] == os.listdir(str(tmp_path))
+
+
+def test_sampled(tmp_path):
+    assert busy is profiling.sampled(busy, 0, str(tmp_path))
+    always = profiling.sampled(busy, 1, str(tmp_path), name='always')
+    assert 42 == always(0)
+    assert 42 == always(0)
+    assert 2 == len([p for p in os.listdir(str(tmp_path)) if p.startswith('always-')])
+
+
+def test_cli(tmp_path, monkeypatch):
+    server = SeezeitServer().start()
+    try:
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', server.url)
+        result = CliRunner().invoke(cli, ['--no-daemon', '--profile', str(tmp_path), '--profile-format', 'collapsed'])
+        assert 0 == result.exit_code, result.output
+        [path] = os.listdir(str(tmp_path))
+        assert path.startswith('meals-') and path.endswith('.collapsed')
+        with open(str(tmp_path / path)) as f:
+            assert 'retrieve_days' in f.read()
+    finally:
+        server.shutdown()
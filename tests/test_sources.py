@@ -0,0 +1,101 @@
+import time
+from collections import OrderedDict
+
+import pendulum
+import pytest
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, settings, sources
+from mensa_ukon.constants import Language, Meal
+from mensa_ukon.upstream import UpstreamError
+
+MONDAY = pendulum.date(2018, 8, 13)
+
+
+class TestSources:
+
+    def setup_method(self):
+        self.server = SeezeitServer(shift_dates=False).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    @pytest.fixture(autouse=True)
+    def stand_in(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        monkeypatch.setattr(settings, 'MAX_MANAGER_URL', self.server.url)
+
+    @pytest.mark.parametrize('language', list(Language))
+    def test_fragments_match_page(self, language):
+        # two weeks, including the weekends without meals
+        expected = list(Mensa('giessberg', source='page').retrieve_days(MONDAY, 14, language))
+        plans = list(Mensa('giessberg', source='fragment').retrieve_days(MONDAY, 14, language))
+        assert expected == plans
+        assert 10 == len([p for p in plans if p.meals])
+
+    def test_single_day_transfers_less(self):
+        Mensa('giessberg', source='page').retrieve(MONDAY)
+        page_bytes, self.server.bytes_sent = self.server.bytes_sent, 0
+        plan = Mensa('giessberg', source='fragment').retrieve(MONDAY, filter_meal='teller')
+        assert ['seezeit-teller'] == list(plan.meals)
+        assert self.server.bytes_sent * 5 < page_bytes
+
+    @pytest.mark.parametrize('language', list(Language))
+    def test_bilingual_matches_page(self, language):
+        expected = list(Mensa('giessberg', source='page').retrieve_days(MONDAY, 14, language, 'teller'))
+        assert expected == list(Mensa('giessberg', source='bilingual').retrieve_days(MONDAY, 14, language, 'teller'))
+
+    def test_bilingual_plan(self):
+        source = Mensa('giessberg', source='bilingual').source
+        labels, days, stale = source.plan()
+        assert not stale
+        assert 'Mo. 13.08.' == labels['DE'][0]
+        assert 'Mon 13.08.' == labels['EN'][0]
+        assert 10 == len(days)
+        assert all(meal.DE and meal.EN for day in days for meal in day)
+        # unchanged pages are served from the merged plan
+        assert days is source.plan()[1]
+
+    def test_bilingual_requests_concurrently(self):
+        self.server.latency = 1.0
+        start = time.monotonic()
+        Mensa('giessberg', source='bilingual').retrieve(MONDAY)
+        # one after the other would take at least 2s, parsing both pages takes a few 100ms more
+        assert time.monotonic() - start < 1.75
+        assert 2 == self.server.requests
+
+    def test_bilingual_serves_without_failing_language(self, monkeypatch):
+        page = self.server.page
+        # the English page is gone and was never parsed
+        monkeypatch.setattr(self.server, 'page', lambda c, l: None if l is Language.EN else page(c, l))
+        m = Mensa('giessberg', source='bilingual')
+        expected = list(Mensa('giessberg', source='page').retrieve_days(MONDAY, 14, Language.DE))
+        assert expected == list(m.retrieve_days(MONDAY, 14, Language.DE))
+        labels, days, stale = m.source.plan(Language.DE)
+        assert ['DE'] == list(labels) and not stale
+        assert all(meal.DE and meal.EN is None for day in days for meal in day)
+        with pytest.raises(UpstreamError):
+            m.retrieve(MONDAY, language=Language.EN)
+
+    def test_default_source(self, monkeypatch):
+        assert isinstance(Mensa('giessberg').source, sources.PageSource)
+        monkeypatch.setattr(settings, 'SOURCE', 'fragment')
+        assert isinstance(Mensa('giessberg').source, sources.FragmentSource)
+
+    def test_unknown_source(self):
+        with pytest.raises(ValueError):
+            Mensa('giessberg', source='carrier-pigeon')
+
+
+def test_align_keeps_unaligned_days():
+    meal = Meal('Seezeit-Teller', 'Käsespätzle', [])
+    labels = {'DE': ['Mo. 13.08.', 'Di. 14.08.'], 'EN': ['Mon 13.08.', 'Tue 14.08.']}
+    days = {
+        'DE': [OrderedDict(a=meal), OrderedDict(a=meal, b=meal)],
+        'EN': [OrderedDict(x=meal), OrderedDict(x=meal)],
+    }
+    aligned, unaligned = sources.align(labels, days)
+    assert [(('a', meal), ('x', meal))] == [tuple(m) for m in aligned]
+    assert 3 == len(unaligned)
+    assert OrderedDict(x=meal) == sources.BilingualSource.meals(unaligned, Language.EN)
+    assert OrderedDict(a=meal, b=meal) == sources.BilingualSource.meals(unaligned, Language.DE)
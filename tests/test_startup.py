@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be loaded just to parse the command line
+HEAVY = ('requests_html', 'bs4', 'html5lib', 'lxml', 'cachecontrol', 'pendulum', 'telegram', 'pyppeteer')
+
+# cumulative import time of the CLI module in microseconds, as reported by -X importtime
+IMPORT_BUDGET_US = 150000
+
+
+def python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def loaded_after(code):
+    out = python('-c', code + '\nimport sys\nprint("loaded:" + ",".join(m for m in %r if m in sys.modules))' % (HEAVY,))
+    return [m for m in out.stdout.rsplit('loaded:', 1)[1].strip().split(',') if m]
+
+
+class TestStartup:
+
+    def test_import_is_lightweight(self):
+        assert [] == loaded_after('import scripts.mensa_cli, scripts.bot, mensa_ukon.daemon')
+
+    def test_help_and_version(self):
+        for script, command in (('scripts.mensa_cli', 'cli'), ('scripts.mensa_cli', 'meals'), ('scripts.bot', 'run_bot')):
+            for flag in ('--help', '--version'):
+                code = (f'from {script} import {command}\n'
+                        f'try:\n    {command}(["{flag}"])\nexcept SystemExit:\n    pass')
+                assert [] == loaded_after(code), (script, flag)
+
+    def test_import_time_budget(self):
+        err = python('-X', 'importtime', '-c', 'import scripts.mensa_cli').stderr
+        line = [l for l in err.splitlines() if l.rstrip().endswith('| scripts.mensa_cli')][-1]
+        cumulative = int(line.split('|')[1])
+        assert cumulative < IMPORT_BUDGET_US
@@ -0,0 +1,109 @@
+import time
+
+import pendulum
+import pytest
+from requests_html import HTMLSession
+
+from benchmarks.seezeit_server import SeezeitServer
+from mensa_ukon import Mensa, settings, upstream
+from mensa_ukon.upstream import CircuitOpenError, UpstreamError
+
+MONDAY = pendulum.date(2018, 8, 13)
+
+
+class TestUpstream:
+
+    def setup_method(self):
+        self.server = SeezeitServer(shift_dates=False).start()
+        self.session = HTMLSession()
+        self.page = self.server.url + '/essen/speiseplaene/mensa-giessberg/'
+
+    def teardown_method(self):
+        self.server.shutdown()
+
+    @pytest.fixture(autouse=True)
+    def fast_settings(self, monkeypatch):
+        monkeypatch.setattr(settings, 'SEEZEIT_URL', self.server.url)
+        monkeypatch.setattr(settings, 'MAX_MANAGER_URL', self.server.url)
+        monkeypatch.setattr(settings, 'RETRIES', 2)
+        monkeypatch.setattr(settings, 'RETRY_BACKOFF', 0.01)
+        monkeypatch.setattr(settings, 'BREAKER_THRESHOLD', 5)
+
+    def test_retries_server_errors(self):
+        self.server.error_rate = 1.0
+        with pytest.raises(UpstreamError):
+            upstream.request(self.session, 'GET', self.page)
+        assert 3 == self.server.requests
+
+    def test_client_errors_are_not_retried(self):
+        with pytest.raises(UpstreamError):
+            upstream.request(self.session, 'GET', self.server.url + '/nothing/')
+        assert 1 == self.server.requests
+        assert 0 == upstream.breaker(self.page).failures
+
+    def test_deadline(self, monkeypatch):
+        monkeypatch.setattr(settings, 'READ_TIMEOUT', 0.1)
+        monkeypatch.setattr(settings, 'DEADLINE', 0.35)
+        monkeypatch.setattr(settings, 'RETRIES', 10)
+        self.server.latency = 1.0
+        start = time.monotonic()
+        with pytest.raises(UpstreamError):
+            upstream.request(self.session, 'GET', self.page)
+        assert time.monotonic() - start < 0.6
+
+    def test_circuit_breaker(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RETRIES', 0)
+        monkeypatch.setattr(settings, 'BREAKER_THRESHOLD', 2)
+        monkeypatch.setattr(settings, 'BREAKER_RESET', 0.1)
+        self.server.error_rate = 1.0
+        for _ in range(2):
+            with pytest.raises(UpstreamError):
+                upstream.request(self.session, 'GET', self.page)
+        with pytest.raises(CircuitOpenError):
+            upstream.request(self.session, 'GET', self.page)
+        assert 2 == self.server.requests
+
+        # after the reset timeout one trial request is sent, which closes the circuit again
+        time.sleep(0.15)
+        self.server.error_rate = 0.0
+        assert 200 == upstream.request(self.session, 'GET', self.page).status_code
+        assert not upstream.breaker(self.page).open
+
+    def test_unexpected_error_ends_trial(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RETRIES', 0)
+        monkeypatch.setattr(settings, 'BREAKER_THRESHOLD', 1)
+        monkeypatch.setattr(settings, 'BREAKER_RESET', 0.1)
+        self.server.error_rate = 1.0
+        with pytest.raises(UpstreamError):
+            upstream.request(self.session, 'GET', self.page)
+        time.sleep(0.15)
+
+        def broken(*args, **kwargs):
+            raise ValueError('broken cache entry')
+        request, self.session.request = self.session.request, broken
+        with pytest.raises(ValueError):
+            upstream.request(self.session, 'GET', self.page)
+        # the failed trial opened the circuit again, and the next trial is allowed after the timeout
+        time.sleep(0.15)
+        self.session.request = request
+        self.server.error_rate = 0.0
+        assert 200 == upstream.request(self.session, 'GET', self.page).status_code
+
+    @pytest.mark.parametrize('source', ['page', 'fragment', 'bilingual'])
+    def test_serves_stale_plan(self, source):
+        m = Mensa('giessberg', source=source)
+        fresh = m.retrieve(MONDAY)
+        assert not fresh.stale
+
+        # as if the page expired from the HTTP cache
+        m.session = HTMLSession()
+        self.server.error_rate = 1.0
+        stale = m.retrieve(MONDAY)
+        assert stale.stale
+        assert fresh.meals == stale.meals
+
+    @pytest.mark.parametrize('source', ['page', 'fragment'])
+    def test_fails_without_stale_plan(self, source):
+        self.server.error_rate = 1.0
+        with pytest.raises(UpstreamError):
+            Mensa('giessberg', source=source).retrieve(MONDAY)